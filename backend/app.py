@@ -1,14 +1,41 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from core.constants import ALLOWED_ORIGINS
+from core.ciphers import cipher_preference
+from core.constants import ALLOWED_ORIGINS, KEY_WRAP_SCHEME
+from core.crypto import key_hierarchy
+from core.executor import crypto_executor
+from core.keywatch import key_watcher
+from core.security import profile_sync
+from repositories import files_repo
 from routes.auth import router as auth_router
 from routes.files import router as files_router
+from routes.keys import router as keys_router
+from routes.metrics import router as metrics_router
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    if KEY_WRAP_SCHEME == "kek":
+        # The only RSA private-key operation needed for KEK-wrapped files.
+        key_hierarchy.load()
+    # Fail now if key material is unusable; afterwards it is re-checked in the
+    # background and requests read it from memory only.
+    key_watcher.start()
+    # Benchmark (in auto mode) before the first upload rather than during it.
+    cipher_preference.select()
+    yield
+    key_watcher.stop()
+    crypto_executor.shutdown()
+    profile_sync.close()
+    files_repo.close()
 
 
-app = FastAPI(title="Secure File Service", version="1.0.0")
+app = FastAPI(title="Secure File Service", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +48,8 @@ app.add_middleware(
 # Register routers (endpoints remain unchanged)
 app.include_router(auth_router)
 app.include_router(files_router)
+app.include_router(keys_router)
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,374 @@
+"""Throughput benchmark suite for the ``encrypt_file`` / ``decrypt_file`` path.
+
+For every input size and mode the suite runs ``encrypt_file`` and
+``decrypt_file`` end to end in a fresh child process (so peak RSS belongs to
+that run alone), then repeats the work through ``encrypt_stream`` /
+``decrypt_stream`` with timed file objects to split it into stages. RSA key
+wrap/unwrap rates are measured once per run. Results are printed as JSON;
+``--baseline`` compares them with an earlier run.
+
+Run from the ``backend`` directory::
+
+    python -m benchmarks.crypto_suite --sizes 1K 1M 100M 1G 4G --output run.json
+    python -m benchmarks.crypto_suite --baseline run.json
+
+Inputs and ciphertext are written to ``--workdir`` (a temporary directory by
+default), so multi-GB sizes need about twice that much free disk.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from secrets import token_bytes
+from typing import Any, BinaryIO, Dict
+
+import cryptography
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from benchmarks.encrypt_memory import BACKEND_DIR, parse_size
+from core.ciphers import CIPHER_AES_256_GCM, CIPHER_CHACHA20_POLY1305
+from core.constants import CRYPTO_SEGMENT_THREADS
+
+DEFAULT_SIZES = ["1K", "1M", "100M", "1G"]
+# name -> (segment threads, compression mode, cipher id)
+MODES = {
+    "segmented": (1, "off", CIPHER_AES_256_GCM),
+    "segmented-parallel": (CRYPTO_SEGMENT_THREADS, "off", CIPHER_AES_256_GCM),
+    "segmented-compressed": (1, "auto", CIPHER_AES_256_GCM),
+    "segmented-chacha": (1, "off", CIPHER_CHACHA20_POLY1305),
+}
+# Small inputs are processed repeatedly until roughly this many bytes have
+# gone through, so their timings are not dominated by noise.
+_MIN_BYTES_PER_RUN = 64 * 1024 * 1024
+_MAX_REPEATS = 1000
+
+
+class _TimedFile:
+    """File wrapper that accumulates the time spent in ``read`` and ``write``."""
+
+    def __init__(self, raw: BinaryIO) -> None:
+        self._raw = raw
+        self.seconds = 0.0
+
+    def read(self, size: int = -1) -> bytes:
+        started = time.perf_counter()
+        data = self._raw.read(size)
+        self.seconds += time.perf_counter() - started
+        return data
+
+    def write(self, data: bytes) -> int:
+        started = time.perf_counter()
+        written = self._raw.write(data)
+        self.seconds += time.perf_counter() - started
+        return written
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._raw.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._raw.tell()
+
+
+def _write_key_pair(directory: Path, bits: int) -> None:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=bits)
+    (directory / "private.pem").write_bytes(
+        private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+    )
+    (directory / "public.pem").write_bytes(
+        private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    )
+
+
+def _write_input(path: Path, size: int, content: str) -> None:
+    if content == "text":
+        line = b"2024-01-01T00:00:00Z INFO request served path=/files status=200 bytes=4096\n"
+        block = line * (1024 * 1024 // len(line) + 1)
+    else:
+        block = os.urandom(1024 * 1024)
+    with path.open("wb") as handle:
+        remaining = size
+        while remaining > 0:
+            handle.write(block[:remaining])
+            remaining -= len(block)
+
+
+def _mb_per_s(size: int, seconds: float) -> float | None:
+    return round(size / (1024**2) / seconds, 2) if seconds else None
+
+
+def _timed(fn: Any, repeats: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - started) / repeats
+
+
+def _stages(
+    input_path: Path,
+    workdir: Path,
+    threads: int,
+    compression: str,
+    cipher_id: int,
+    repeats: int,
+) -> Dict[str, Dict[str, float]]:
+    """Split encryption and decryption time into read / compress / cipher / write.
+
+    The container has no padding step (both AEADs are stream modes), so ``pad`` is
+    always zero; it is kept so results line up with legacy CBC measurements.
+    Decryption reports decompression as part of ``cipher``.
+    """
+
+    from decrypt_file import decrypt_stream
+    from encrypt_file import encrypt_stream
+
+    aes_key = token_bytes(32)
+    output_path = workdir / "stages.enc"
+    encrypt = {"read": 0.0, "pad": 0.0, "compress": 0.0, "cipher": 0.0, "write": 0.0}
+    decrypt = {"read": 0.0, "pad": 0.0, "cipher": 0.0, "write": 0.0}
+
+    for _ in range(repeats):
+        with input_path.open("rb") as raw_source, output_path.open("wb") as raw_sink:
+            source, sink = _TimedFile(raw_source), _TimedFile(raw_sink)
+            started = time.perf_counter()
+            summary = encrypt_stream(
+                source,
+                sink,
+                aes_key,
+                threads=threads,
+                compression=compression,
+                cipher_id=cipher_id,
+            )
+            total = time.perf_counter() - started
+        encrypt["read"] += source.seconds
+        encrypt["write"] += sink.seconds
+        encrypt["compress"] += summary["compress_seconds"]
+        encrypt["cipher"] += total - source.seconds - sink.seconds - summary["compress_seconds"]
+
+        with output_path.open("rb") as raw_source, open(os.devnull, "wb") as raw_sink:
+            source, sink = _TimedFile(raw_source), _TimedFile(raw_sink)
+            started = time.perf_counter()
+            for chunk in decrypt_stream(source, aes_key, threads=threads):
+                sink.write(chunk)
+            total = time.perf_counter() - started
+        decrypt["read"] += source.seconds
+        decrypt["write"] += sink.seconds
+        decrypt["cipher"] += total - source.seconds - sink.seconds
+
+    output_path.unlink()
+    return {
+        "encrypt": {stage: round(seconds / repeats, 6) for stage, seconds in encrypt.items()},
+        "decrypt": {stage: round(seconds / repeats, 6) for stage, seconds in decrypt.items()},
+    }
+
+
+def _run_child(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Benchmark one ``(size, mode)`` pair; runs in its own process."""
+
+    from decrypt_file import decrypt_file
+    from encrypt_file import encrypt_file
+
+    workdir = Path(spec["workdir"])
+    input_path = Path(spec["input"])
+    size = spec["size"]
+    threads, compression, cipher_id = MODES[spec["mode"]]
+    repeats = max(1, min(_MAX_REPEATS, _MIN_BYTES_PER_RUN // max(size, 1)))
+
+    encrypted_path = workdir / "bench.enc"
+    decrypted_path = workdir / "bench.out"
+    public_key = serialization.load_pem_public_key((workdir / "public.pem").read_bytes())
+    private_key = serialization.load_pem_private_key(
+        (workdir / "private.pem").read_bytes(),
+        password=None,
+    )
+
+    summary: Dict[str, Any] = {}
+
+    def _encrypt() -> None:
+        summary.update(
+            encrypt_file(
+                input_path=input_path,
+                output_path=encrypted_path,
+                public_key_path=None,
+                public_key=public_key,
+                threads=threads,
+                compression=compression,
+                cipher_id=cipher_id,
+            )
+        )
+
+    def _decrypt() -> None:
+        decrypt_file(
+            encrypted_file_path=encrypted_path,
+            encrypted_key_path=None,
+            output_path=decrypted_path,
+            private_key_path=None,
+            private_key=private_key,
+            threads=threads,
+        )
+
+    encrypt_seconds = _timed(_encrypt, repeats)
+    decrypt_seconds = _timed(_decrypt, repeats)
+    for path in (encrypted_path, decrypted_path):
+        path.unlink(missing_ok=True)
+
+    stages = _stages(input_path, workdir, threads, compression, cipher_id, repeats)
+
+    # ru_maxrss is reported in KiB on Linux.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {
+        "size_bytes": size,
+        "mode": spec["mode"],
+        "threads": threads,
+        "cipher": summary.get("cipher"),
+        "compression": summary.get("codec"),
+        "stored_bytes": summary.get("stored_size"),
+        "repeats": repeats,
+        "encrypt": {
+            "seconds": round(encrypt_seconds, 6),
+            "mb_per_s": _mb_per_s(size, encrypt_seconds),
+            "stages": stages["encrypt"],
+        },
+        "decrypt": {
+            "seconds": round(decrypt_seconds, 6),
+            "mb_per_s": _mb_per_s(size, decrypt_seconds),
+            "stages": stages["decrypt"],
+        },
+        "peak_rss_bytes": peak_rss,
+    }
+
+
+def _rsa_rates(workdir: Path, iterations: int) -> Dict[str, Any]:
+    from decrypt_file import unwrap_aes_key
+    from encrypt_file import wrap_aes_key
+
+    public_key = serialization.load_pem_public_key((workdir / "public.pem").read_bytes())
+    private_key = serialization.load_pem_private_key(
+        (workdir / "private.pem").read_bytes(),
+        password=None,
+    )
+    aes_key = token_bytes(32)
+    wrapped = wrap_aes_key(aes_key, public_key)
+
+    wrap_seconds = _timed(lambda: wrap_aes_key(aes_key, public_key), iterations)
+    unwrap_seconds = _timed(lambda: unwrap_aes_key(wrapped, private_key), iterations)
+    return {
+        "key_bits": public_key.key_size,
+        "iterations": iterations,
+        "wrap_ops_per_s": round(1 / wrap_seconds, 1),
+        "unwrap_ops_per_s": round(1 / unwrap_seconds, 1),
+    }
+
+
+def _compare(results: Dict[str, Any], baseline_path: Path) -> None:
+    """Print MB/s changes against an earlier run to stderr."""
+
+    baseline = json.loads(baseline_path.read_text())
+    if baseline.get("content") != results["content"]:
+        print(
+            f"warning: baseline used {baseline.get('content')!r} input, this run {results['content']!r}",
+            file=sys.stderr,
+        )
+    previous = {(item["size_bytes"], item["mode"]): item for item in baseline.get("results", [])}
+    for item in results["results"]:
+        before = previous.get((item["size_bytes"], item["mode"]))
+        if before is None:
+            continue
+        changes = []
+        for direction in ("encrypt", "decrypt"):
+            old, new = before[direction]["mb_per_s"], item[direction]["mb_per_s"]
+            if old and new:
+                changes.append(f"{direction} {(new - old) / old * 100:+6.1f}%")
+        print(f"{item['size_bytes']:>14,d} B  {item['mode']:<22s} {'  '.join(changes)}", file=sys.stderr)
+
+    rsa_before, rsa_now = baseline.get("rsa") or {}, results["rsa"]
+    if rsa_before.get("key_bits") == rsa_now["key_bits"]:
+        for rate in ("wrap_ops_per_s", "unwrap_ops_per_s"):
+            old, new = rsa_before.get(rate), rsa_now[rate]
+            if old:
+                print(f"rsa {rate:<17s} {(new - old) / old * 100:+6.1f}%", file=sys.stderr)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=list(MODES))
+    parser.add_argument("--content", choices=["random", "text"], default="random")
+    parser.add_argument("--rsa-bits", type=int, default=2048)
+    parser.add_argument("--rsa-iterations", type=int, default=200)
+    parser.add_argument("--workdir", type=Path, help="Directory for inputs and ciphertext")
+    parser.add_argument("--output", type=Path, help="Also write the JSON results here")
+    parser.add_argument("--baseline", type=Path, help="Earlier JSON results to compare against")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        print(json.dumps(_run_child(json.loads(args.child))))
+        return
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        workdir = Path(tmp)
+        _write_key_pair(workdir, args.rsa_bits)
+        results: Dict[str, Any] = {
+            "benchmark": "crypto_suite",
+            "host": {
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "cryptography": cryptography.__version__,
+                "cpu_count": os.cpu_count(),
+            },
+            "content": args.content,
+            "rsa": _rsa_rates(workdir, args.rsa_iterations),
+            "results": [],
+        }
+
+        for size in (parse_size(value) for value in args.sizes):
+            input_path = workdir / f"input_{size}.bin"
+            _write_input(input_path, size, args.content)
+            for mode in args.modes:
+                spec = {"workdir": str(workdir), "input": str(input_path), "size": size, "mode": mode}
+                completed = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.crypto_suite", "--child", json.dumps(spec)],
+                    cwd=BACKEND_DIR,
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                result = json.loads(completed.stdout.strip().splitlines()[-1])
+                results["results"].append(result)
+                print(
+                    f"{size:>14,d} B  {mode:<22s} "
+                    f"encrypt {result['encrypt']['mb_per_s'] or 0:>9.2f} MB/s  "
+                    f"decrypt {result['decrypt']['mb_per_s'] or 0:>9.2f} MB/s  "
+                    f"peak RSS {result['peak_rss_bytes'] / 1024**2:>7.1f} MiB",
+                    file=sys.stderr,
+                )
+            input_path.unlink()
+
+    if args.baseline is not None:
+        _compare(results, args.baseline)
+
+    output = json.dumps(results, indent=2)
+    if args.output is not None:
+        args.output.write_text(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Peak-RSS benchmark for the streaming ``encrypt_file`` engine.
+
+Each input size is encrypted in a fresh child process so the reported peak RSS
+belongs to that size alone. Inputs are sparse files and ciphertext is written to
+``/dev/null`` by default, so even 10 GB runs need no free disk space.
+
+Run from the ``backend`` directory::
+
+    python -m benchmarks.encrypt_memory --sizes 1M 100M 1G 10G
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_SIZES = ["1M", "100M", "1G", "10G"]
+_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().upper()
+    if value and value[-1] in _UNITS:
+        return int(float(value[:-1]) * _UNITS[value[-1]])
+    return int(value)
+
+
+def _write_public_key(directory: Path) -> Path:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_key_path = directory / "public.pem"
+    public_key_path.write_bytes(
+        private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    )
+    return public_key_path
+
+
+def _run_child(size: int, workdir: Path, public_key_path: Path, keep_output: bool) -> dict:
+    """Encrypt one sparse input of ``size`` bytes and report peak RSS."""
+
+    from encrypt_file import encrypt_file
+
+    input_path = workdir / f"input_{size}.bin"
+    with input_path.open("wb") as handle:
+        handle.truncate(size)
+
+    output_path = workdir / f"input_{size}.enc" if keep_output else Path(os.devnull)
+
+    started = time.perf_counter()
+    encrypt_file(
+        input_path=input_path,
+        output_path=output_path,
+        public_key_path=public_key_path,
+    )
+    elapsed = time.perf_counter() - started
+    input_path.unlink()
+
+    # ru_maxrss is reported in KiB on Linux.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {
+        "size_bytes": size,
+        "seconds": round(elapsed, 4),
+        "mb_per_s": round(size / (1024**2) / elapsed, 2) if elapsed else None,
+        "peak_rss_bytes": peak_rss,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--keep-output", action="store_true", help="Write ciphertext to disk")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        result = _run_child(
+            args.child,
+            args.workdir,
+            args.workdir / "public.pem",
+            args.keep_output,
+        )
+        print(json.dumps(result))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        _write_public_key(workdir)
+        for size in (parse_size(value) for value in args.sizes):
+            command = [
+                sys.executable,
+                "-m",
+                "benchmarks.encrypt_memory",
+                "--child",
+                str(size),
+                "--workdir",
+                str(workdir),
+            ]
+            if args.keep_output:
+                command.append("--keep-output")
+            completed = subprocess.run(
+                command,
+                cwd=BACKEND_DIR,
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(
+                f"{result['size_bytes']:>14,d} B  "
+                f"{result['mb_per_s'] or 0:>9.2f} MB/s  "
+                f"peak RSS {result['peak_rss_bytes'] / 1024**2:>7.1f} MiB",
+                file=sys.stderr,
+            )
+
+    print(json.dumps({"benchmark": "encrypt_memory", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
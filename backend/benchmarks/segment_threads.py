@@ -0,0 +1,108 @@
+"""Throughput of segment-parallel encryption and decryption by thread count.
+
+Encrypts one input with ``encrypt_stream`` and decrypts it with
+``decrypt_stream`` for each requested thread count, and prints MB/s as JSON.
+
+Run from the ``backend`` directory::
+
+    python -m benchmarks.segment_threads --size 1G --threads 1 2 4 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from secrets import token_bytes
+
+from benchmarks.encrypt_memory import parse_size
+from core.container import SEGMENT_SIZE
+from decrypt_file import decrypt_stream
+from encrypt_file import encrypt_stream
+
+
+def _write_input(path: Path, size: int) -> None:
+    block = os.urandom(1024 * 1024)
+    with path.open("wb") as handle:
+        remaining = size
+        while remaining > 0:
+            handle.write(block[:remaining])
+            remaining -= len(block)
+
+
+def _mb_per_s(size: int, seconds: float) -> float:
+    return round(size / (1024**2) / seconds, 2) if seconds else 0.0
+
+
+def run(size: int, thread_counts: list[int], segment_size: int) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = Path(tmp) / "input.bin"
+        output_path = Path(tmp) / "input.enc"
+        _write_input(input_path, size)
+        aes_key = token_bytes(32)
+
+        for threads in thread_counts:
+            started = time.perf_counter()
+            with input_path.open("rb") as source, output_path.open("wb") as sink:
+                encrypt_stream(
+                    source,
+                    sink,
+                    aes_key,
+                    segment_size=segment_size,
+                    threads=threads,
+                    compression="off",
+                )
+            encrypt_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            with output_path.open("rb") as source:
+                for _ in decrypt_stream(source, aes_key, threads=threads):
+                    pass
+            decrypt_seconds = time.perf_counter() - started
+
+            results.append(
+                {
+                    "threads": threads,
+                    "encrypt_mb_per_s": _mb_per_s(size, encrypt_seconds),
+                    "decrypt_mb_per_s": _mb_per_s(size, decrypt_seconds),
+                }
+            )
+            print(
+                f"threads={threads:<3d} encrypt {results[-1]['encrypt_mb_per_s']:>9.2f} MB/s  "
+                f"decrypt {results[-1]['decrypt_mb_per_s']:>9.2f} MB/s",
+                file=sys.stderr,
+            )
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="256M")
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--segment-size", default=str(SEGMENT_SIZE))
+    args = parser.parse_args(argv)
+
+    size = parse_size(args.size)
+    segment_size = parse_size(args.segment_size)
+    results = run(size, args.threads, segment_size)
+    print(
+        json.dumps(
+            {
+                "benchmark": "segment_threads",
+                "size_bytes": size,
+                "segment_size": segment_size,
+                "cpu_count": os.cpu_count(),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
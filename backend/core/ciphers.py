@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+from .constants import CRYPTO_CIPHER
+
+# Cipher ids stored in the container header (see ``core.container``). Both
+# AEADs take a 256-bit key and a 96-bit nonce and produce a 16-byte tag, so
+# they share the container layout.
+CIPHER_AES_256_GCM = 1
+CIPHER_CHACHA20_POLY1305 = 2
+CIPHER_NAMES = {CIPHER_AES_256_GCM: "aes-256-gcm", CIPHER_CHACHA20_POLY1305: "chacha20-poly1305"}
+_CIPHER_IDS = {name: cipher_id for cipher_id, name in CIPHER_NAMES.items()}
+_AEADS = {CIPHER_AES_256_GCM: AESGCM, CIPHER_CHACHA20_POLY1305: ChaCha20Poly1305}
+
+# Plaintext sealed per benchmark call (one container segment) and the time
+# spent measuring each cipher.
+BENCHMARK_CHUNK_SIZE = 64 * 1024
+BENCHMARK_SECONDS = 0.05
+
+
+def aead(cipher_id: int, key: bytes) -> AESGCM | ChaCha20Poly1305:
+    try:
+        return _AEADS[cipher_id](key)
+    except KeyError:
+        raise ValueError(f"Unsupported cipher: {cipher_id}") from None
+
+
+def cipher_id(name: str) -> int:
+    try:
+        return _CIPHER_IDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown cipher {name!r}; expected one of {sorted(_CIPHER_IDS)}") from None
+
+
+def benchmark(seconds: float = BENCHMARK_SECONDS, chunk_size: int = BENCHMARK_CHUNK_SIZE) -> Dict[str, float]:
+    """Measure each cipher's sealing throughput on this host in MB/s."""
+
+    data = bytes(chunk_size)
+    nonce = bytes(12)
+    results: Dict[str, float] = {}
+    for cipher, name in CIPHER_NAMES.items():
+        sealer = aead(cipher, bytes(32))
+        sealer.encrypt(nonce, data, None)  # warm-up
+        sealed = 0
+        started = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < seconds:
+            sealer.encrypt(nonce, data, None)
+            sealed += chunk_size
+            elapsed = time.perf_counter() - started
+        results[name] = round(sealed / elapsed / 1024**2, 1)
+    return results
+
+
+class CipherPreference:
+    """The cipher new files are sealed with on this host.
+
+    ``mode`` is a cipher name or ``"auto"``, in which case a short benchmark
+    picks the faster cipher the first time ``select`` is called (the app does
+    this at startup). Ties go to AES-256-GCM. Existing files are always opened
+    with the cipher recorded in their header.
+    """
+
+    def __init__(self, mode: str = CRYPTO_CIPHER) -> None:
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._selected: int | None = None
+        self._results: Dict[str, float] | None = None
+
+    def select(self) -> int:
+        selected = self._selected
+        if selected is not None:
+            return selected
+
+        with self._lock:
+            if self._selected is None:
+                if self.mode == "auto":
+                    self._results = benchmark()
+                    self._selected = max(CIPHER_NAMES, key=lambda cipher: self._results[CIPHER_NAMES[cipher]])
+                else:
+                    self._selected = cipher_id(self.mode)
+            return self._selected
+
+    def pin(self, cipher: int) -> None:
+        """Adopt a choice made elsewhere, e.g. by the parent of a worker process."""
+
+        if cipher not in CIPHER_NAMES:
+            raise ValueError(f"Unsupported cipher: {cipher}")
+        with self._lock:
+            self._selected = cipher
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "selected": CIPHER_NAMES[self._selected] if self._selected is not None else None,
+                "benchmark_mb_per_s": self._results,
+            }
+
+
+cipher_preference = CipherPreference()
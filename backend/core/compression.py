@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import math
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterator
+
+from .constants import COMPRESSION_LEVEL, COMPRESSION_MAX_ENTROPY, COMPRESSION_MODE
+
+# Codec ids stored in the container header (see ``core.container``).
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_NAMES = {CODEC_NONE: "none", CODEC_ZLIB: "zlib"}
+
+# Bytes of the first chunk inspected when choosing a codec.
+SAMPLE_SIZE = 64 * 1024
+# Smaller files are stored as-is in auto mode: the savings cannot pay for the
+# codec overhead, and entropy estimates over a few bytes are meaningless.
+MIN_COMPRESS_SIZE = 512
+# Decompressed output produced per step, bounding memory on hostile input.
+MAX_DECOMPRESS_CHUNK = 1024 * 1024
+
+# Leading bytes of formats that are already compressed (or, for PDF, usually
+# made of compressed streams); recompressing them only costs CPU.
+_COMPRESSED_SIGNATURES = (
+    b"%PDF-",
+    b"\xff\xd8\xff",  # JPEG
+    b"\x89PNG\r\n\x1a\n",
+    b"GIF8",
+    b"PK\x03\x04",  # ZIP, DOCX/XLSX/PPTX, JAR, ...
+    b"\x1f\x8b",  # gzip
+    b"BZh",
+    b"\xfd7zXZ\x00",
+    b"7z\xbc\xaf\x27\x1c",
+    b"Rar!\x1a\x07",
+    b"\x28\xb5\x2f\xfd",  # zstd
+    b"RIFF",  # WebP, AVI, WAV
+    b"OggS",
+    b"ID3",  # MP3
+)
+
+
+def shannon_entropy(sample: bytes) -> float:
+    """Return the byte-level Shannon entropy of ``sample`` in bits per byte."""
+
+    if not sample:
+        return 0.0
+    total = len(sample)
+    return -sum(count / total * math.log2(count / total) for count in Counter(sample).values())
+
+
+def choose_codec(sample: bytes, mode: str = COMPRESSION_MODE) -> int:
+    """Pick a codec for a file based on its first chunk.
+
+    ``mode`` is ``"off"`` (never compress), ``"always"`` or ``"auto"``; in auto
+    mode known compressed formats and high-entropy samples are stored as-is.
+    """
+
+    if mode == "off" or not sample:
+        return CODEC_NONE
+    if mode == "always":
+        return CODEC_ZLIB
+
+    if len(sample) < MIN_COMPRESS_SIZE:
+        return CODEC_NONE
+    head = sample[:SAMPLE_SIZE]
+    if head.startswith(_COMPRESSED_SIGNATURES) or head[4:8] == b"ftyp":  # MP4/MOV/HEIC
+        return CODEC_NONE
+    if shannon_entropy(head) > COMPRESSION_MAX_ENTROPY:
+        return CODEC_NONE
+    return CODEC_ZLIB
+
+
+def compressor(codec: int) -> Any | None:
+    if codec == CODEC_NONE:
+        return None
+    if codec == CODEC_ZLIB:
+        return zlib.compressobj(COMPRESSION_LEVEL)
+    raise ValueError(f"Unsupported codec: {codec}")
+
+
+def iter_decompressed(codec: int, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Decompress a stream of ``codec`` chunks, yielding at most 1 MiB at a time."""
+
+    if codec == CODEC_NONE:
+        yield from chunks
+        return
+    if codec != CODEC_ZLIB:
+        raise ValueError(f"Unsupported codec: {codec}")
+
+    decompressor = zlib.decompressobj()
+    for chunk in chunks:
+        data = decompressor.decompress(chunk, MAX_DECOMPRESS_CHUNK)
+        while data:
+            yield data
+            data = decompressor.decompress(decompressor.unconsumed_tail, MAX_DECOMPRESS_CHUNK)
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+    if not decompressor.eof:
+        raise ValueError("Compressed stream is truncated")
+
+
+class CompressionStats:
+    """Process-wide totals of achieved compression ratio and CPU spent."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.files = 0
+        self.compressed_files = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def record(self, summary: Dict[str, Any] | None) -> None:
+        if not summary:
+            return
+        with self._lock:
+            self.files += 1
+            if summary.get("codec", "none") != "none":
+                self.compressed_files += 1
+            self.bytes_in += summary.get("plaintext_size", 0)
+            self.bytes_out += summary.get("stored_size", 0)
+            self.cpu_seconds += summary.get("compress_seconds", 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": COMPRESSION_MODE,
+                "files": self.files,
+                "compressed_files": self.compressed_files,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+                "cpu_seconds": round(self.cpu_seconds, 4),
+                "cpu_ms_per_mb": (
+                    round(self.cpu_seconds * 1000 / (self.bytes_in / 1024**2), 3)
+                    if self.bytes_in
+                    else None
+                ),
+            }
+
+
+compression_stats = CompressionStats()
@@ -5,7 +5,74 @@ import os
 
 USERS_COLLECTION = "users"
 FILES_COLLECTION = "user_files"
+TAGS_COLLECTION = "tags"
 MAX_UPLOAD_FILES = 15
+# Upper bound for /encrypt/batch and friends (Firestore batches cap at 500 writes).
+MAX_BATCH_FILES = 100
+# Page sizes for GET /files when a client asks for a paginated listing.
+DEFAULT_LIST_PAGE_SIZE = 100
+MAX_LIST_PAGE_SIZE = 500
+
+# Where user, file and tag metadata is stored: "firestore" or "sqlite" (a local
+# WAL-mode database at ``core.paths.METADATA_DB_PATH``, e.g. for offline load tests).
+METADATA_BACKEND = os.getenv("METADATA_BACKEND", "firestore").strip().lower()
+
+# Per-worker cache of file records (0 entries disables it). Missing records are
+# remembered for a shorter time so uploads made through other workers show up
+# quickly. With METADATA_CACHE_WATCH_USERS > 0 (Firestore only) up to that many
+# recently active users also get an ``on_snapshot`` listener that keeps their
+# cached records current.
+METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", "4096"))
+METADATA_CACHE_TTL_SECONDS = float(os.getenv("METADATA_CACHE_TTL_SECONDS", "30"))
+METADATA_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("METADATA_CACHE_NEGATIVE_TTL_SECONDS", "5"))
+METADATA_CACHE_WATCH_USERS = int(os.getenv("METADATA_CACHE_WATCH_USERS", "0"))
+
+# Firebase uids allowed to use operator endpoints (/keys/reload, /metrics/*),
+# comma-separated. Empty means nobody can.
+OPERATOR_UIDS = frozenset(uid.strip() for uid in os.getenv("OPERATOR_UIDS", "").split(",") if uid.strip())
+
+# How often (seconds) cached RSA key objects re-check key files for changes.
+KEY_RELOAD_CHECK_SECONDS = float(os.getenv("KEY_RELOAD_CHECK_SECONDS", "5"))
+
+# Unwrapped per-file AES keys kept in memory to skip repeat RSA unwraps.
+DATA_KEY_CACHE_SIZE = int(os.getenv("DATA_KEY_CACHE_SIZE", "1024"))
+DATA_KEY_CACHE_TTL_SECONDS = float(os.getenv("DATA_KEY_CACHE_TTL_SECONDS", "300"))
+
+# Verified Firebase ID tokens kept in memory until their ``exp`` claim.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+# Lifetime of the session tokens issued by /auth/verify.
+SESSION_TOKEN_TTL_SECONDS = int(os.getenv("SESSION_TOKEN_TTL_SECONDS", "900"))
+
+# A user's profile (lastLogin etc.) is synced to Firestore at most once per
+# interval; the writes are batched by a background thread every flush interval.
+PROFILE_SYNC_INTERVAL_SECONDS = float(os.getenv("PROFILE_SYNC_INTERVAL_SECONDS", "300"))
+PROFILE_SYNC_FLUSH_SECONDS = float(os.getenv("PROFILE_SYNC_FLUSH_SECONDS", "5"))
+
+# How new file keys are wrapped: "kek" (AES-KW under a per-user key derived
+# from the master key) or "rsa" (RSA-OAEP with the public key, one private-key
+# operation per unwrap).
+KEY_WRAP_SCHEME = os.getenv("KEY_WRAP_SCHEME", "kek").strip().lower()
+
+# Crypto executor: "process" (default) or "thread", worker count, and how many
+# jobs may wait beyond the busy workers before new ones are rejected.
+CRYPTO_EXECUTOR = os.getenv("CRYPTO_EXECUTOR", "process").strip().lower()
+CRYPTO_WORKERS = int(os.getenv("CRYPTO_WORKERS", "0")) or (os.cpu_count() or 1)
+CRYPTO_QUEUE_DEPTH = int(os.getenv("CRYPTO_QUEUE_DEPTH", "64"))
+
+# Files at least this large are sealed/opened with CRYPTO_SEGMENT_THREADS threads.
+CRYPTO_SEGMENT_THREADS = int(os.getenv("CRYPTO_SEGMENT_THREADS", "0")) or min(os.cpu_count() or 1, 4)
+PARALLEL_SEGMENT_MIN_BYTES = int(os.getenv("PARALLEL_SEGMENT_MIN_BYTES", str(32 * 1024 * 1024)))
+
+# AEAD for new files: "auto" (benchmark at startup), "aes-256-gcm" or
+# "chacha20-poly1305". Existing files are read with whatever they were sealed with.
+CRYPTO_CIPHER = os.getenv("CRYPTO_CIPHER", "auto").strip().lower()
+
+# Pre-encryption compression: "auto" (entropy/format detection), "always" or "off".
+COMPRESSION_MODE = os.getenv("COMPRESSION_MODE", "auto").strip().lower()
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+# Samples above this many bits/byte are treated as incompressible.
+COMPRESSION_MAX_ENTROPY = float(os.getenv("COMPRESSION_MAX_ENTROPY", "7.5"))
 
 DEFAULT_ALLOWED_ORIGINS = [
     "http://localhost:5173",
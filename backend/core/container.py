@@ -0,0 +1,530 @@
+from __future__ import annotations
+
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from secrets import token_bytes
+from typing import Any, BinaryIO, Dict, Iterator
+
+from cryptography.exceptions import InvalidTag
+from .ciphers import CIPHER_AES_256_GCM, CIPHER_NAMES, aead, cipher_preference
+from .compression import CODEC_NAMES, CODEC_NONE, compressor, iter_decompressed
+
+# Segmented container layout (all integers big-endian):
+#
+#   magic "CAISEG" | version u8 | cipher u8 | segment_size u32 | nonce_prefix 8B
+#   | ext_len u16 | ext (ext_len bytes)
+#   | slot_len u16 | key slot (slot_len bytes)            (version >= 2 only)
+#   | segment 0 | segment 1 | ... | segment N-1
+#
+# ``cipher`` is CIPHER_AES_256_GCM or CIPHER_CHACHA20_POLY1305 (see
+# ``core.ciphers``); both use the same nonce, tag and segment layout.
+#
+# Every segment holds ``segment_size`` plaintext bytes (the last one may be
+# shorter, or empty for an empty file) followed by a 16-byte tag. Segment ``i``
+# is sealed with nonce ``nonce_prefix || u32(i)`` and associated data
+# ``header || u32(i) || u8(is_last)``, so segments cannot be reordered, moved
+# between files, or truncated away without failing authentication.
+#
+# The extension area is a sequence of ``type u8 | length u16 | value`` entries;
+# since it is part of the header it is covered by every segment's tag. Unknown
+# types are ignored. EXT_CODEC (1 byte) names the compression applied before
+# encryption; without it segments hold the raw plaintext.
+#
+# The key slot carries the wrapped data key so a file needs no ``.key``
+# sidecar: ``wrap_alg u8 | key_id_len u8 | key_id | wrapped_len u16 | wrapped``,
+# zero-padded to ``slot_len``. It is deliberately outside the associated data so
+# the key can be re-wrapped in place without re-encrypting the segments; a
+# tampered slot simply unwraps to a key that fails every segment's tag.
+
+MAGIC = b"CAISEG"
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+SEGMENT_SIZE = 64 * 1024
+TAG_SIZE = 16
+NONCE_PREFIX_SIZE = 8
+# Room for an RSA-4096 wrapped key plus key id, so slots can be rewritten in place.
+KEY_SLOT_SIZE = 1024
+# Key slot wrapping algorithms; see ``core.crypto`` for the KEK hierarchy.
+WRAP_RSA_OAEP_SHA256 = 1
+WRAP_AES_KW_HKDF = 2
+WRAP_NAMES = {WRAP_RSA_OAEP_SHA256: "rsa-oaep-sha256", WRAP_AES_KW_HKDF: "aes-kw-hkdf"}
+
+EXT_CODEC = 0x01
+
+_FIXED_HEADER = struct.Struct(">6sBBI8sH")
+_EXTENSION = struct.Struct(">BH")
+_SLOT_LEN = struct.Struct(">H")
+_SLOT_HEAD = struct.Struct(">BB")
+_SEGMENT_AAD = struct.Struct(">IB")
+_MAX_SEGMENTS = 2**32
+
+
+class ContainerError(ValueError):
+    """Raised when a container is malformed or fails authentication."""
+
+
+@dataclass(frozen=True)
+class KeySlot:
+    """The wrapped data key stored in a version 2 header."""
+
+    wrap_alg: int
+    key_id: str
+    wrapped_key: bytes
+
+    def pack(self, capacity: int = KEY_SLOT_SIZE) -> bytes:
+        key_id = self.key_id.encode("utf-8")
+        data = (
+            _SLOT_HEAD.pack(self.wrap_alg, len(key_id))
+            + key_id
+            + _SLOT_LEN.pack(len(self.wrapped_key))
+            + self.wrapped_key
+        )
+        if len(data) > capacity:
+            raise ContainerError("Wrapped key does not fit in the container key slot")
+        return data + bytes(capacity - len(data))
+
+    @classmethod
+    def parse(cls, data: bytes) -> KeySlot | None:
+        """Decode a slot; returns ``None`` for an empty (all-zero) slot."""
+
+        if not data or data[0] == 0:
+            return None
+        try:
+            wrap_alg, id_len = _SLOT_HEAD.unpack_from(data, 0)
+            offset = _SLOT_HEAD.size
+            key_id = data[offset:offset + id_len].decode("utf-8")
+            offset += id_len
+            (wrapped_len,) = _SLOT_LEN.unpack_from(data, offset)
+            offset += _SLOT_LEN.size
+        except (struct.error, UnicodeDecodeError) as exc:
+            raise ContainerError("Malformed container key slot") from exc
+        wrapped_key = data[offset:offset + wrapped_len]
+        if len(wrapped_key) != wrapped_len:
+            raise ContainerError("Malformed container key slot")
+        return cls(wrap_alg=wrap_alg, key_id=key_id, wrapped_key=wrapped_key)
+
+
+@dataclass(frozen=True)
+class ContainerHeader:
+    cipher_id: int
+    segment_size: int
+    nonce_prefix: bytes
+    extensions: bytes = b""
+    version: int = VERSION
+    # Not covered by the segment tags; see the layout notes above.
+    key_slot: KeySlot | None = field(default=None, compare=False)
+    key_slot_capacity: int = 0
+
+    def pack(self) -> bytes:
+        """The authenticated header bytes (everything before the key slot)."""
+
+        return (
+            _FIXED_HEADER.pack(
+                MAGIC,
+                self.version,
+                self.cipher_id,
+                self.segment_size,
+                self.nonce_prefix,
+                len(self.extensions),
+            )
+            + self.extensions
+        )
+
+    def pack_key_slot(self) -> bytes:
+        if self.version < 2:
+            return b""
+        slot = self.key_slot.pack(self.key_slot_capacity) if self.key_slot else bytes(self.key_slot_capacity)
+        return _SLOT_LEN.pack(self.key_slot_capacity) + slot
+
+    @property
+    def size(self) -> int:
+        return _FIXED_HEADER.size + len(self.extensions)
+
+    @property
+    def key_slot_offset(self) -> int:
+        return self.size + _SLOT_LEN.size
+
+    @property
+    def data_offset(self) -> int:
+        """Offset of segment 0."""
+
+        if self.version < 2:
+            return self.size
+        return self.key_slot_offset + self.key_slot_capacity
+
+    @property
+    def codec(self) -> int:
+        value = parse_extensions(self.extensions).get(EXT_CODEC)
+        return value[0] if value else CODEC_NONE
+
+
+def pack_extensions(entries: Dict[int, bytes]) -> bytes:
+    return b"".join(_EXTENSION.pack(kind, len(value)) + value for kind, value in entries.items())
+
+
+def parse_extensions(data: bytes) -> Dict[int, bytes]:
+    entries: Dict[int, bytes] = {}
+    offset = 0
+    while offset < len(data):
+        if offset + _EXTENSION.size > len(data):
+            raise ContainerError("Malformed container extension")
+        kind, length = _EXTENSION.unpack_from(data, offset)
+        offset += _EXTENSION.size
+        if offset + length > len(data):
+            raise ContainerError("Malformed container extension")
+        entries[kind] = data[offset:offset + length]
+        offset += length
+    return entries
+
+
+def read_header(source: BinaryIO) -> ContainerHeader | None:
+    """Parse a container header at the current position of ``source``.
+
+    Returns ``None`` (and rewinds) when the stream is not a segmented container,
+    e.g. a legacy ``iv + AES-CBC`` blob.
+    """
+
+    start = source.tell()
+    fixed = source.read(_FIXED_HEADER.size)
+    if len(fixed) < _FIXED_HEADER.size or not fixed.startswith(MAGIC):
+        source.seek(start)
+        return None
+
+    _, version, cipher_id, segment_size, nonce_prefix, ext_len = _FIXED_HEADER.unpack(fixed)
+    if version not in SUPPORTED_VERSIONS:
+        raise ContainerError(f"Unsupported container version: {version}")
+    if cipher_id not in CIPHER_NAMES:
+        raise ContainerError(f"Unsupported container cipher: {cipher_id}")
+    if segment_size <= 0:
+        raise ContainerError("Container segment size must be positive")
+
+    extensions = source.read(ext_len)
+    if len(extensions) != ext_len:
+        raise ContainerError("Truncated container header")
+
+    key_slot = None
+    key_slot_capacity = 0
+    if version >= 2:
+        slot_len = source.read(_SLOT_LEN.size)
+        if len(slot_len) != _SLOT_LEN.size:
+            raise ContainerError("Truncated container header")
+        (key_slot_capacity,) = _SLOT_LEN.unpack(slot_len)
+        slot = source.read(key_slot_capacity)
+        if len(slot) != key_slot_capacity:
+            raise ContainerError("Truncated container key slot")
+        key_slot = KeySlot.parse(slot)
+
+    header = ContainerHeader(
+        cipher_id=cipher_id,
+        segment_size=segment_size,
+        nonce_prefix=nonce_prefix,
+        extensions=extensions,
+        version=version,
+        key_slot=key_slot,
+        key_slot_capacity=key_slot_capacity,
+    )
+    if header.codec not in CODEC_NAMES:
+        raise ContainerError(f"Unsupported container codec: {header.codec}")
+    return header
+
+
+def write_key_slot(path: Path, key_slot: KeySlot) -> None:
+    """Replace the key slot of a version 2 container in place.
+
+    Only the slot is rewritten (and fsync'ed); the segments stay as they are
+    because the slot is not part of their associated data.
+    """
+
+    with path.open("r+b") as handle:
+        header = read_header(handle)
+        if header is None or header.version < 2 or header.key_slot_capacity == 0:
+            raise ContainerError(f"{path.name} has no key slot")
+        packed = key_slot.pack(header.key_slot_capacity)
+        handle.seek(header.key_slot_offset)
+        handle.write(packed)
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+def container_layout(header: ContainerHeader, total_size: int) -> tuple[int, int]:
+    """Return ``(segment_count, payload_size)`` for a container of ``total_size`` bytes.
+
+    The payload is the data sealed in the segments: the plaintext itself, or
+    its compressed form when the header names a codec.
+    """
+
+    body_size = total_size - header.data_offset
+    stride = header.segment_size + TAG_SIZE
+    if body_size < TAG_SIZE:
+        raise ContainerError("Truncated container body")
+
+    segment_count = -(-body_size // stride)
+    last_size = body_size - (segment_count - 1) * stride
+    if last_size < TAG_SIZE:
+        raise ContainerError("Truncated container segment")
+    return segment_count, body_size - segment_count * TAG_SIZE
+
+
+def _segment_nonce(header: ContainerHeader, index: int) -> bytes:
+    return header.nonce_prefix + struct.pack(">I", index)
+
+
+def _segment_aad(header_bytes: bytes, index: int, is_last: bool) -> bytes:
+    return header_bytes + _SEGMENT_AAD.pack(index, 1 if is_last else 0)
+
+
+class SegmentWriter:
+    """Push-style writer that seals plaintext into container segments.
+
+    ``write`` may be called with chunks of any size; full segments are flushed as
+    soon as it is known they are not the final one. ``close`` must be called to
+    emit the final segment.
+
+    With ``threads > 1`` segments are sealed concurrently on a thread pool and
+    written back in index order through a reorder window of ``2 * threads``
+    segments, so memory stays bounded while AES-GCM runs on several cores.
+
+    A non-default ``codec`` compresses the plaintext before it is segmented and
+    records the codec in the header. ``key_slot`` embeds the wrapped data key
+    in the header so the container is self-contained. ``cipher_id`` defaults
+    to the host's preferred cipher (see ``core.ciphers``).
+    """
+
+    def __init__(
+        self,
+        sink: BinaryIO,
+        aes_key: bytes,
+        segment_size: int = SEGMENT_SIZE,
+        threads: int = 1,
+        codec: int = CODEC_NONE,
+        key_slot: KeySlot | None = None,
+        cipher_id: int | None = None,
+    ) -> None:
+        if cipher_id is None:
+            cipher_id = cipher_preference.select()
+        self._sink = sink
+        self._aead = aead(cipher_id, aes_key)
+        extensions = {EXT_CODEC: bytes([codec])} if codec != CODEC_NONE else {}
+        self.header = ContainerHeader(
+            cipher_id=cipher_id,
+            segment_size=segment_size,
+            nonce_prefix=token_bytes(NONCE_PREFIX_SIZE),
+            extensions=pack_extensions(extensions),
+            key_slot=key_slot,
+            key_slot_capacity=KEY_SLOT_SIZE if key_slot is not None else 0,
+        )
+        self._header_bytes = self.header.pack()
+        self._buffer = bytearray()
+        self._index = 0
+        self._closed = False
+        self._compressor = compressor(codec)
+        self.plaintext_size = 0
+        self.stored_size = 0
+        self.compress_seconds = 0.0
+
+        self._pool = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+        self._window = 2 * threads
+        self._pending: deque[Future] = deque()
+
+        sink.write(self._header_bytes + self.header.pack_key_slot())
+
+    def _seal_segment(self, index: int, data: bytes, is_last: bool) -> bytes:
+        return self._aead.encrypt(
+            _segment_nonce(self.header, index),
+            data,
+            _segment_aad(self._header_bytes, index, is_last),
+        )
+
+    def _seal(self, data: bytes, is_last: bool) -> None:
+        if self._index >= _MAX_SEGMENTS:
+            raise ContainerError("Container segment limit exceeded")
+        self.stored_size += len(data)
+        if self._pool is None:
+            self._sink.write(self._seal_segment(self._index, data, is_last))
+        else:
+            self._pending.append(self._pool.submit(self._seal_segment, self._index, data, is_last))
+            while len(self._pending) >= self._window:
+                self._sink.write(self._pending.popleft().result())
+        self._index += 1
+
+    def write(self, data: bytes) -> None:
+        if self._closed:
+            raise ValueError("SegmentWriter is closed")
+        self.plaintext_size += len(data)
+        if self._compressor is not None:
+            started = time.perf_counter()
+            data = self._compressor.compress(data)
+            self.compress_seconds += time.perf_counter() - started
+        self._buffer += data
+        self._flush_full_segments()
+
+    def _flush_full_segments(self) -> None:
+        segment_size = self.header.segment_size
+        buffer = self._buffer
+        offset = 0
+        # Keep the trailing segment buffered: it may turn out to be the last one.
+        while len(buffer) - offset > segment_size:
+            self._seal(bytes(buffer[offset:offset + segment_size]), is_last=False)
+            offset += segment_size
+        if offset:
+            del buffer[:offset]
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        if self._compressor is not None:
+            started = time.perf_counter()
+            self._buffer += self._compressor.flush()
+            self.compress_seconds += time.perf_counter() - started
+            self._flush_full_segments()
+        self._closed = True
+        try:
+            self._seal(bytes(self._buffer), is_last=True)
+            self._buffer.clear()
+            while self._pending:
+                self._sink.write(self._pending.popleft().result())
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def summary(self) -> Dict[str, Any]:
+        """Sizes and compression cost of the finished container."""
+
+        return {
+            "cipher": CIPHER_NAMES[self.header.cipher_id],
+            "codec": CODEC_NAMES[self.header.codec],
+            "plaintext_size": self.plaintext_size,
+            "stored_size": self.stored_size,
+            "compress_seconds": round(self.compress_seconds, 6),
+        }
+
+
+class SegmentReader:
+    """Random-access reader over a segmented container.
+
+    ``source`` must be seekable; the header is read on construction.
+    """
+
+    def __init__(self, source: BinaryIO, aes_key: bytes) -> None:
+        source.seek(0)
+        header = read_header(source)
+        if header is None:
+            raise ContainerError("Not a segmented container")
+
+        self._source = source
+        self._aead = aead(header.cipher_id, aes_key)
+        self.header = header
+        self._header_bytes = header.pack()
+
+        self.segment_count, self.payload_size = container_layout(header, source.seek(0, 2))
+        self.codec = header.codec
+
+    @property
+    def random_access(self) -> bool:
+        """Whether plaintext offsets map directly onto segments (no compression)."""
+
+        return self.codec == CODEC_NONE
+
+    @property
+    def plaintext_size(self) -> int:
+        if not self.random_access:
+            raise ContainerError("Plaintext size of a compressed container is not recorded")
+        return self.payload_size
+
+    def _read_sealed(self, index: int) -> bytes:
+        if not 0 <= index < self.segment_count:
+            raise IndexError(f"Segment {index} out of range")
+
+        stride = self.header.segment_size + TAG_SIZE
+        self._source.seek(self.header.data_offset + index * stride)
+        return self._source.read(stride)
+
+    def _open_segment(self, index: int, sealed: bytes) -> bytes:
+        is_last = index == self.segment_count - 1
+        try:
+            return self._aead.decrypt(
+                _segment_nonce(self.header, index),
+                sealed,
+                _segment_aad(self._header_bytes, index, is_last),
+            )
+        except InvalidTag as exc:
+            raise ContainerError(f"Segment {index} failed authentication") from exc
+
+    def read_segment(self, index: int) -> bytes:
+        """Decrypt and authenticate segment ``index``."""
+
+        return self._open_segment(index, self._read_sealed(index))
+
+    def iter_segments(self, first: int, last: int, threads: int = 1) -> Iterator[bytes]:
+        """Yield decrypted segments ``first..last`` (inclusive) in order.
+
+        With ``threads > 1`` segments are read sequentially but authenticated and
+        decrypted on a thread pool, with at most ``2 * threads`` in flight.
+        """
+
+        if threads <= 1:
+            for index in range(first, last + 1):
+                yield self.read_segment(index)
+            return
+
+        window = 2 * threads
+        pending: deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            try:
+                for index in range(first, last + 1):
+                    pending.append(pool.submit(self._open_segment, index, self._read_sealed(index)))
+                    if len(pending) >= window:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def iter_range(
+        self,
+        start: int = 0,
+        end: int | None = None,
+        threads: int = 1,
+    ) -> Iterator[bytes]:
+        """Yield plaintext bytes ``[start, end)``, decrypting only covering segments."""
+
+        if not self.random_access:
+            raise ContainerError("Compressed containers do not support random access")
+        if end is None or end > self.plaintext_size:
+            end = self.plaintext_size
+        if start >= end:
+            return
+
+        segment_size = self.header.segment_size
+        first = start // segment_size
+        last = (end - 1) // segment_size
+        for index, data in enumerate(self.iter_segments(first, last, threads=threads), start=first):
+            offset = index * segment_size
+            lo = max(start - offset, 0)
+            hi = min(end - offset, len(data))
+            yield data[lo:hi]
+
+    def iter_all(self, threads: int = 1) -> Iterator[bytes]:
+        """Yield the plaintext, authenticating (and decompressing) every segment."""
+
+        segments = (
+            data
+            for data in self.iter_segments(0, self.segment_count - 1, threads=threads)
+            if data
+        )
+        try:
+            yield from iter_decompressed(self.codec, segments)
+        except ContainerError:
+            raise
+        except (ValueError, zlib.error) as exc:
+            raise ContainerError("Container payload failed to decompress") from exc
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self.iter_all()
@@ -1,11 +1,26 @@
 from __future__ import annotations
 
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
 
-from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives import hashes, keywrap, serialization
+from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
 from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from fastapi import HTTPException
 
+from .constants import (
+    DATA_KEY_CACHE_SIZE,
+    DATA_KEY_CACHE_TTL_SECONDS,
+    KEY_RELOAD_CHECK_SECONDS,
+)
+from .paths import MASTER_KEY_PATH, PRIVATE_KEY_PATH, PUBLIC_KEY_PATH, RETIRED_KEYS_DIR
+
 
 def ensure_key_exists(path: Path, key_type: str) -> None:
     if not path.exists():
@@ -15,6 +30,39 @@ def ensure_key_exists(path: Path, key_type: str) -> None:
         )
 
 
+def _pem_pair(private_key: rsa.RSAPrivateKey) -> Tuple[bytes, bytes]:
+    private_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    public_pem = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return private_pem, public_pem
+
+
+def write_atomic(path: Path, data: bytes, mode: int | None = None) -> None:
+    """Replace ``path`` with ``data`` so readers see the old or the new file, never a partial one."""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = path.with_name(f"{path.name}.{os.getpid()}.part")
+    partial_path.write_bytes(data)
+    try:
+        if mode is not None:
+            os.chmod(partial_path, mode)
+        os.replace(partial_path, path)
+    finally:
+        partial_path.unlink(missing_ok=True)
+
+
+def write_secret(path: Path, data: bytes) -> None:
+    """Atomically replace ``path`` with ``data``, readable by the owner only."""
+
+    write_atomic(path, data, 0o600)
+
+
 def ensure_rsa_keys(public_key_path: Path, private_key_path: Path) -> None:
     """Ensure RSA key material exists for local encryption/decryption.
 
@@ -46,19 +94,481 @@ def ensure_rsa_keys(public_key_path: Path, private_key_path: Path) -> None:
 
     # Neither exists: generate a new pair.
     private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
-    public_key = private_key.public_key()
-
-    private_pem = private_key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption(),
-    )
-    public_pem = public_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo,
-    )
+    private_pem, public_pem = _pem_pair(private_key)
 
     private_key_path.parent.mkdir(parents=True, exist_ok=True)
     public_key_path.parent.mkdir(parents=True, exist_ok=True)
     private_key_path.write_bytes(private_pem)
     public_key_path.write_bytes(public_pem)
+
+
+def public_key_id(public_key: rsa.RSAPublicKey) -> str:
+    """Short, stable identifier for an RSA public key (SHA-256 of its DER form)."""
+
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return hashlib.sha256(der).hexdigest()[:16]
+
+
+class RSAKeyManager:
+    """Process-wide cache of parsed RSA key objects.
+
+    Keys are loaded (and created if necessary, via ``ensure_rsa_keys``) on first
+    use and then served from memory. At most once every ``check_interval``
+    seconds the key files are stat'ed, and the keys are re-parsed only when
+    their inode, mtime or size changed. ``reload`` forces a re-read. While
+    ``watched`` is set a ``core.keywatch.KeyWatcher`` calls ``check`` in the
+    background instead, and requests never touch the disk.
+
+    Private keys replaced by ``rotate`` are kept in ``retired_dir`` (named by
+    key id) so file keys still wrapped under them can be opened until the
+    rotation job has re-wrapped them.
+    """
+
+    def __init__(
+        self,
+        public_key_path: Path,
+        private_key_path: Path,
+        check_interval: float = KEY_RELOAD_CHECK_SECONDS,
+        retired_dir: Path = RETIRED_KEYS_DIR,
+    ) -> None:
+        self.public_key_path = public_key_path
+        self.private_key_path = private_key_path
+        self.check_interval = check_interval
+        self.retired_dir = retired_dir
+
+        self._lock = threading.Lock()
+        self._fingerprint: Tuple[Tuple[int, int, int], ...] | None = None
+        self._checked_at = 0.0
+        # (private key, public key, public PEM, key id), swapped as one unit on reload.
+        self._keys: Tuple[rsa.RSAPrivateKey, rsa.RSAPublicKey, str, str] | None = None
+        self._retired: Dict[str, rsa.RSAPrivateKey] = {}
+        self.watched = False
+
+    def _stat_fingerprint(self) -> Tuple[Tuple[int, int, int], ...] | None:
+        try:
+            stats = (self.public_key_path.stat(), self.private_key_path.stat())
+        except FileNotFoundError:
+            return None
+        return tuple((item.st_ino, item.st_mtime_ns, item.st_size) for item in stats)
+
+    def _load(self) -> None:
+        ensure_rsa_keys(self.public_key_path, self.private_key_path)
+        public_pem = self.public_key_path.read_bytes()
+        private_key = serialization.load_pem_private_key(
+            self.private_key_path.read_bytes(),
+            password=None,
+        )
+
+        public_key = serialization.load_pem_public_key(public_pem)
+        self._keys = (
+            private_key,
+            public_key,
+            public_pem.decode("utf-8"),
+            public_key_id(public_key),
+        )
+        self._fingerprint = self._stat_fingerprint()
+
+    def _refresh(self, force: bool = False) -> bool:
+        """Under ``_lock``: (re)load the keys if needed; returns whether they were."""
+
+        changed = force or self._keys is None or self._stat_fingerprint() != self._fingerprint
+        if changed:
+            self._load()
+        self._checked_at = time.monotonic()
+        return changed
+
+    def _current(self, force: bool = False) -> Tuple[rsa.RSAPrivateKey, rsa.RSAPublicKey, str, str]:
+        keys = self._keys
+        fresh = self.watched or time.monotonic() - self._checked_at < self.check_interval
+        if not force and keys is not None and fresh:
+            return keys
+
+        with self._lock:
+            self._refresh(force)
+            return self._keys
+
+    def reload(self) -> None:
+        """Re-read key files immediately, e.g. after an out-of-band rotation."""
+
+        self._current(force=True)
+
+    def check(self) -> bool:
+        """Load the keys, or reload them if the files changed; returns whether they were."""
+
+        with self._lock:
+            return self._refresh()
+
+    def private_key(self) -> rsa.RSAPrivateKey:
+        return self._current()[0]
+
+    def public_key(self) -> rsa.RSAPublicKey:
+        return self._current()[1]
+
+    def public_pem(self) -> str:
+        return self._current()[2]
+
+    def key_id(self) -> str:
+        return self._current()[3]
+
+    def retired_private_key(self, key_id: str) -> rsa.RSAPrivateKey:
+        """Return the retired private key whose public key id is ``key_id``."""
+
+        private_key = self._retired.get(key_id)
+        if private_key is not None:
+            return private_key
+
+        path = self.retired_dir / f"{key_id}.pem"
+        if not path.exists():
+            raise ValueError(f"File key was wrapped under unknown RSA key {key_id}")
+        private_key = serialization.load_pem_private_key(path.read_bytes(), password=None)
+        if public_key_id(private_key.public_key()) != key_id:
+            raise ValueError(f"Retired RSA key {path.name} does not match its id")
+        self._retired[key_id] = private_key
+        return private_key
+
+    def retired_private_keys(self) -> List[rsa.RSAPrivateKey]:
+        if not self.retired_dir.exists():
+            return []
+        return [self.retired_private_key(path.stem) for path in sorted(self.retired_dir.glob("*.pem"))]
+
+    def rotate(self) -> str:
+        """Retire the current key pair, install a fresh one and return its id."""
+
+        with self._lock:
+            if self._keys is None:
+                self._load()
+            write_secret(self.retired_dir / f"{self._keys[3]}.pem", self.private_key_path.read_bytes())
+
+            private_pem, public_pem = _pem_pair(rsa.generate_private_key(public_exponent=65537, key_size=2048))
+            write_secret(self.private_key_path, private_pem)
+            write_atomic(self.public_key_path, public_pem)
+            self._load()
+            self._checked_at = time.monotonic()
+            return self._keys[3]
+
+
+key_manager = RSAKeyManager(PUBLIC_KEY_PATH, PRIVATE_KEY_PATH)
+
+
+_OAEP = asym_padding.OAEP(
+    mgf=asym_padding.MGF1(algorithm=hashes.SHA256()),
+    algorithm=hashes.SHA256(),
+    label=None,
+)
+
+
+class KeyHierarchy:
+    """Master key -> per-user KEK -> file key.
+
+    The 256-bit master key lives at ``master_key_path`` wrapped with the RSA
+    public key and is unwrapped once per process, so RSA's private operation
+    is paid at startup instead of on every file open. Per-user KEKs are derived
+    from it with HKDF-SHA256 (``info`` binds the uid) and wrap file keys with
+    AES key wrap (RFC 3394), which costs microseconds.
+
+    Like ``RSAKeyManager`` the master key file is re-checked every
+    ``check_interval`` seconds, or by a ``KeyWatcher`` while ``watched`` is
+    set. Master keys replaced by ``rotate`` stay in
+    ``retired_dir`` as ``master-<key id>.bin`` until nothing is wrapped under
+    them.
+    """
+
+    def __init__(
+        self,
+        master_key_path: Path,
+        rsa_keys: RSAKeyManager,
+        check_interval: float = KEY_RELOAD_CHECK_SECONDS,
+        retired_dir: Path = RETIRED_KEYS_DIR,
+    ) -> None:
+        self.master_key_path = master_key_path
+        self.check_interval = check_interval
+        self.retired_dir = retired_dir
+        self._rsa_keys = rsa_keys
+        self._lock = threading.Lock()
+        self._fingerprint: Tuple[int, int, int] | None = None
+        self._checked_at = 0.0
+        # (key id, master key), loaded lazily.
+        self._master: Tuple[str, bytes] | None = None
+        self._retired: Dict[str, bytes] = {}
+        self.watched = False
+
+    @staticmethod
+    def _master_key_id(master_key: bytes) -> str:
+        return hashlib.sha256(b"cipherai/master-key-id/" + master_key).hexdigest()[:16]
+
+    def _stat_fingerprint(self) -> Tuple[int, int, int] | None:
+        try:
+            item = self.master_key_path.stat()
+        except FileNotFoundError:
+            return None
+        return (item.st_ino, item.st_mtime_ns, item.st_size)
+
+    def _create(self) -> None:
+        """Write a new wrapped master key unless another process beat us to it."""
+
+        wrapped = self._rsa_keys.public_key().encrypt(os.urandom(32), _OAEP)
+        self.master_key_path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = self.master_key_path.with_name(f"{self.master_key_path.name}.{os.getpid()}.part")
+        partial_path.write_bytes(wrapped)
+        try:
+            os.chmod(partial_path, 0o600)
+            os.link(partial_path, self.master_key_path)
+        except FileExistsError:
+            pass
+        finally:
+            partial_path.unlink(missing_ok=True)
+
+    def _unwrap_file(self, path: Path) -> bytes:
+        """Unwrap a master key file with the RSA key pair, new or retired.
+
+        Another process may have rotated the RSA pair and re-wrapped the file
+        before our cached key noticed, or not yet re-wrapped it after the
+        rotation; both are tried before giving up.
+        """
+
+        wrapped = path.read_bytes()
+        try:
+            return self._rsa_keys.private_key().decrypt(wrapped, _OAEP)
+        except ValueError:
+            self._rsa_keys.reload()
+            for private_key in (self._rsa_keys.private_key(), *self._rsa_keys.retired_private_keys()):
+                try:
+                    return private_key.decrypt(wrapped, _OAEP)
+                except ValueError:
+                    continue
+            raise
+
+    def _refresh(self) -> bool:
+        """Under ``_lock``: (re)load the master key if needed; returns whether it was."""
+
+        fingerprint = self._stat_fingerprint()
+        # A master key that disappears from disk is kept rather than replaced.
+        changed = self._master is None or (fingerprint is not None and fingerprint != self._fingerprint)
+        if changed:
+            if fingerprint is None:
+                self._create()
+            master_key = self._unwrap_file(self.master_key_path)
+            self._master = (self._master_key_id(master_key), master_key)
+            self._fingerprint = self._stat_fingerprint()
+        self._checked_at = time.monotonic()
+        return changed
+
+    def _current(self) -> Tuple[str, bytes]:
+        master = self._master
+        fresh = self.watched or time.monotonic() - self._checked_at < self.check_interval
+        if master is not None and fresh:
+            return master
+
+        with self._lock:
+            self._refresh()
+            return self._master
+
+    def check(self) -> bool:
+        """Reload the master key if its file changed; returns whether it did.
+
+        A hierarchy that was never loaded (``KEY_WRAP_SCHEME=rsa``) is left alone.
+        """
+
+        with self._lock:
+            if self._master is None:
+                return False
+            return self._refresh()
+
+    def load(self) -> str:
+        """Unwrap (creating if needed) the master key now; returns its id."""
+
+        return self._current()[0]
+
+    def master_key_id(self) -> str:
+        return self._current()[0]
+
+    def _master_for(self, key_id: str) -> bytes:
+        current_id, master_key = self._current()
+        if not key_id or key_id == current_id:
+            return master_key
+
+        master_key = self._retired.get(key_id)
+        if master_key is None:
+            path = self.retired_dir / f"master-{key_id}.bin"
+            if not path.exists():
+                raise ValueError(f"File key was wrapped under unknown master key {key_id}")
+            master_key = self._unwrap_file(path)
+            if self._master_key_id(master_key) != key_id:
+                raise ValueError(f"Retired master key {path.name} does not match its id")
+            self._retired[key_id] = master_key
+        return master_key
+
+    def kek(self, uid: str, key_id: str = "") -> bytes:
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b"cipherai/kek/v1/" + uid.encode("utf-8"),
+        ).derive(self._master_for(key_id))
+
+    def wrap(self, uid: str, aes_key: bytes) -> Tuple[str, bytes]:
+        """Wrap ``aes_key`` under ``uid``'s KEK; returns ``(master key id, wrapped)``."""
+
+        key_id, _ = self._current()
+        return key_id, keywrap.aes_key_wrap(self.kek(uid, key_id), aes_key)
+
+    def unwrap(self, uid: str, key_id: str, wrapped_key: bytes) -> bytes:
+        kek = self.kek(uid, key_id)
+        try:
+            return keywrap.aes_key_unwrap(kek, wrapped_key)
+        except keywrap.InvalidUnwrap as exc:
+            raise ValueError("File key failed to unwrap") from exc
+
+    def rotate(self, new_master: bool = False) -> str:
+        """Re-wrap every master key file under the current RSA public key.
+
+        With ``new_master`` the current master key is retired and replaced by
+        a fresh one. Returns the id of the master key in use afterwards.
+        """
+
+        with self._lock:
+            if not self.master_key_path.exists():
+                self._create()
+            master_key = self._unwrap_file(self.master_key_path)
+            masters: Dict[Path, bytes] = {}
+            if self.retired_dir.exists():
+                for path in sorted(self.retired_dir.glob("master-*.bin")):
+                    masters[path] = self._unwrap_file(path)
+            if new_master:
+                masters[self.retired_dir / f"master-{self._master_key_id(master_key)}.bin"] = master_key
+                master_key = os.urandom(32)
+
+            public_key = self._rsa_keys.public_key()
+            for path, retired_key in masters.items():
+                write_secret(path, public_key.encrypt(retired_key, _OAEP))
+            write_secret(self.master_key_path, public_key.encrypt(master_key, _OAEP))
+
+            self._master = (self._master_key_id(master_key), master_key)
+            self._fingerprint = self._stat_fingerprint()
+            self._checked_at = time.monotonic()
+            return self._master[0]
+
+
+key_hierarchy = KeyHierarchy(MASTER_KEY_PATH, key_manager)
+
+
+class DataKeyCache:
+    """Bounded LRU cache of unwrapped per-file AES keys with a TTL.
+
+    Entries are keyed by ``(uid, file_name)`` and remember a digest of the
+    wrapped key they were unwrapped from, so a re-encrypted file (new wrapped
+    key) is treated as a miss. Evicted or expired keys are overwritten in place
+    as a best-effort zeroization of the cached copy.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DATA_KEY_CACHE_SIZE,
+        ttl_seconds: float = DATA_KEY_CACHE_TTL_SECONDS,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bytes, bytearray, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _zeroize(secret: bytearray) -> None:
+        secret[:] = bytes(len(secret))
+
+    def _drop(self, cache_key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(cache_key, None)
+        if entry is not None:
+            self._zeroize(entry[1])
+
+    def get(self, uid: str, file_name: str, wrapped_key: bytes) -> bytes | None:
+        """Return the cached AES key for ``wrapped_key``, or ``None`` on a miss."""
+
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return None
+
+        cache_key = (uid, file_name)
+        digest = hashlib.sha256(wrapped_key).digest()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                if entry[2] <= now:
+                    self._drop(cache_key)
+                    self.expirations += 1
+                elif entry[0] == digest:
+                    self._entries.move_to_end(cache_key)
+                    self.hits += 1
+                    return bytes(entry[1])
+            self.misses += 1
+            return None
+
+    def put(self, uid: str, file_name: str, wrapped_key: bytes, aes_key: bytes) -> None:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+
+        cache_key = (uid, file_name)
+        digest = hashlib.sha256(wrapped_key).digest()
+
+        with self._lock:
+            self._drop(cache_key)
+            self._entries[cache_key] = (digest, bytearray(aes_key), time.monotonic() + self.ttl_seconds)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def get_or_unwrap(
+        self,
+        uid: str,
+        file_name: str,
+        wrapped_key: bytes,
+        unwrap: Callable[[bytes], bytes],
+    ) -> bytes:
+        """Return the AES key for ``wrapped_key``, calling ``unwrap`` only on a miss."""
+
+        aes_key = self.get(uid, file_name, wrapped_key)
+        if aes_key is None:
+            aes_key = unwrap(wrapped_key)
+            self.put(uid, file_name, wrapped_key, aes_key)
+        return aes_key
+
+    def invalidate(self, uid: str, file_name: str | None = None) -> None:
+        """Forget one file's key, or every key cached for ``uid``."""
+
+        with self._lock:
+            if file_name is not None:
+                self._drop((uid, file_name))
+                return
+            for cache_key in [key for key in self._entries if key[0] == uid]:
+                self._drop(cache_key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for cache_key in list(self._entries):
+                self._drop(cache_key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+data_key_cache = DataKeyCache()
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from .ciphers import cipher_preference
+from .constants import CRYPTO_EXECUTOR, CRYPTO_QUEUE_DEPTH, CRYPTO_WORKERS, KEY_WRAP_SCHEME
+from .crypto import key_hierarchy, key_manager
+
+
+class CryptoQueueFull(RuntimeError):
+    """Raised when the crypto executor already has ``queue_depth`` jobs waiting."""
+
+
+def _init_worker(cipher_id: int) -> None:
+    # Seal with the parent's cipher choice rather than benchmarking again.
+    cipher_preference.pin(cipher_id)
+    # Parse key material once per worker instead of once per job.
+    key_manager.public_key()
+    key_manager.private_key()
+    if KEY_WRAP_SCHEME == "kek":
+        key_hierarchy.load()
+
+
+def encrypt_job(input_path: str, output_path: str, uid: str | None = None) -> Dict[str, Any]:
+    """Encrypt one file with the worker's cached keys.
+
+    With ``uid`` the file key is wrapped under that user's KEK. Returns the
+    summary from ``encrypt_file``.
+    """
+
+    from encrypt_file import encrypt_file
+
+    return encrypt_file(
+        input_path=Path(input_path),
+        output_path=Path(output_path),
+        public_key_path=key_manager.public_key_path,
+        public_key=key_manager.public_key(),
+        uid=uid,
+    )
+
+
+def decrypt_job(
+    encrypted_file_path: str,
+    output_path: str,
+    aes_key: bytes | None = None,
+    encrypted_key_path: str | None = None,
+    uid: str | None = None,
+) -> bytes:
+    """Decrypt one file, unwrapping its key in the worker if not supplied.
+
+    The key is read from the container header; ``encrypted_key_path`` is only
+    needed for legacy blobs. Returns the AES key so the caller can cache it.
+    """
+
+    from decrypt_file import decrypt_file
+
+    return decrypt_file(
+        encrypted_file_path=Path(encrypted_file_path),
+        encrypted_key_path=Path(encrypted_key_path) if encrypted_key_path else None,
+        output_path=Path(output_path),
+        private_key_path=key_manager.private_key_path,
+        private_key=key_manager.private_key(),
+        aes_key=aes_key,
+        uid=uid,
+    )
+
+
+class CryptoExecutor:
+    """Bounded pool that runs encrypt/decrypt jobs off the request threads.
+
+    With ``kind="process"`` jobs run in a process pool so crypto work scales
+    across cores without contending for the API process's GIL; ``"thread"``
+    keeps everything in-process (useful for tests and single-core hosts). The
+    pool is created lazily on first submit.
+    """
+
+    def __init__(
+        self,
+        kind: str = CRYPTO_EXECUTOR,
+        workers: int = CRYPTO_WORKERS,
+        queue_depth: int = CRYPTO_QUEUE_DEPTH,
+    ) -> None:
+        self.kind = kind
+        self.workers = max(workers, 1)
+        self.queue_depth = max(queue_depth, 0)
+
+        self._lock = threading.Lock()
+        self._pool: Executor | None = None
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._latencies: deque[float] = deque(maxlen=1024)
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "thread":
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="crypto",
+                )
+            else:
+                # "spawn" avoids forking the gRPC/Firestore threads of the API process.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(cipher_preference.select(),),
+                )
+        return self._pool
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_depth:
+                self._rejected += 1
+                raise CryptoQueueFull("Crypto executor queue is full")
+            self._in_flight += 1
+            pool = self._get_pool()
+
+        started = time.perf_counter()
+        try:
+            future = pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+        def _record(done: Future) -> None:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._in_flight -= 1
+                self._latencies.append(elapsed)
+                if done.cancelled() or done.exception() is not None:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+
+        future.add_done_callback(_record)
+        return future
+
+    def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Submit a job and block until it finishes."""
+
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run_async(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Submit a job and await it without blocking the event loop."""
+
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            in_flight = self._in_flight
+            stats: Dict[str, Any] = {
+                "kind": self.kind,
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "in_flight": in_flight,
+                "queued": max(in_flight - self.workers, 0),
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
+
+        if latencies:
+            stats["latency_ms"] = {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 3),
+                "p50": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p95": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000, 3),
+                "max": round(latencies[-1] * 1000, 3),
+            }
+        return stats
+
+
+crypto_executor = CryptoExecutor()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict
+
+from .constants import KEY_RELOAD_CHECK_SECONDS
+from .crypto import key_hierarchy, key_manager
+from .sessions import session_tokens
+
+
+class KeyWatcher:
+    """Re-checks a set of key managers (objects with ``check()`` and a
+    ``watched`` flag) in a background thread. Sources are checked in order, so
+    the RSA pair is current before the master key is unwrapped with it.
+
+    A failed background check keeps the keys already in memory and is counted
+    in ``stats``; ``ready`` is false until a check has passed without errors.
+    """
+
+    def __init__(self, sources: Dict[str, Any], interval: float = KEY_RELOAD_CHECK_SECONDS) -> None:
+        self.sources = sources
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.ready = False
+        self.checks = 0
+        self.reloads = 0
+        self.errors = 0
+        self.last_error: str | None = None
+        self._last_check: float | None = None
+
+    def check(self) -> Dict[str, bool]:
+        """Check every source now; returns which ones were reloaded."""
+
+        reloaded: Dict[str, bool] = {}
+        failed = None
+        for name, source in self.sources.items():
+            try:
+                reloaded[name] = source.check()
+            except Exception as exc:  # noqa: BLE001
+                reloaded[name] = False
+                failed = f"{name}: {exc}"
+
+        with self._lock:
+            self.checks += 1
+            self.reloads += sum(reloaded.values())
+            self._last_check = time.monotonic()
+            self.ready = failed is None
+            if failed is not None:
+                self.errors += 1
+                self.last_error = failed
+        return reloaded
+
+    def start(self) -> None:
+        """Load all key material, raising if any of it is unusable, then watch it."""
+
+        self.check()
+        if not self.ready:
+            raise RuntimeError(f"Key material is not ready: {self.last_error}")
+
+        with self._lock:
+            if self._thread is not None:
+                return
+            for source in self.sources.values():
+                source.watched = True
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="key-watcher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def stop(self) -> None:
+        """Stop watching; the key managers go back to checking on access."""
+
+        with self._lock:
+            thread, self._thread = self._thread, None
+            for source in self.sources.values():
+                source.watched = False
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "watching": self._thread is not None,
+                "interval_seconds": self.interval,
+                "checks": self.checks,
+                "reloads": self.reloads,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "seconds_since_check": (
+                    round(time.monotonic() - self._last_check, 1) if self._last_check is not None else None
+                ),
+            }
+
+
+key_watcher = KeyWatcher(
+    {"rsa": key_manager, "master_key": key_hierarchy, "session_keys": session_tokens},
+)
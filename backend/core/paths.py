@@ -12,6 +12,14 @@ DECRYPTED_DIR = FILES_DIR / "decrypted"
 KEYS_DIR = ROOT_DIR / "keys"
 PUBLIC_KEY_PATH = KEYS_DIR / "public.pem"
 PRIVATE_KEY_PATH = KEYS_DIR / "private.pem"
+# Master key of the KEK hierarchy, stored RSA-wrapped with the public key above.
+MASTER_KEY_PATH = KEYS_DIR / "master_key.bin"
+# Keys superseded by rotate_keys.py, kept until no file is wrapped under them.
+RETIRED_KEYS_DIR = KEYS_DIR / "retired"
+# HMAC keys and revocation list for session tokens (see ``core.sessions``).
+SESSION_KEYS_PATH = KEYS_DIR / "session_keys.json"
+# Metadata database used when METADATA_BACKEND=sqlite.
+METADATA_DB_PATH = FILES_DIR / "metadata.sqlite3"
 
 # Ensure expected directories exist (mirrors original behavior)
 for directory in (UPLOADS_DIR, ENCRYPTED_DIR, DECRYPTED_DIR):
@@ -1,23 +1,174 @@
 from __future__ import annotations
 
 import base64
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from firebase_admin import firestore
 from pydantic import BaseModel
 
-from firebase_admin_init import firebase_auth, firebase_db
+from firebase_admin_init import firebase_auth
 from models.user import UserModel
+from repositories import users_repo
 
-from .paths import PUBLIC_KEY_PATH, PRIVATE_KEY_PATH
-from .crypto import ensure_rsa_keys
+from .constants import (
+    OPERATOR_UIDS,
+    PROFILE_SYNC_FLUSH_SECONDS,
+    PROFILE_SYNC_INTERVAL_SECONDS,
+    TOKEN_CACHE_SIZE,
+)
+from .crypto import key_manager
+from .sessions import session_tokens
 
 
 security = HTTPBearer(auto_error=False)
 
+# Firebase ID tokens live for an hour, so a revocation only needs to be
+# remembered that long.
+MAX_TOKEN_LIFETIME_SECONDS = 3600
+
+
+class TokenCache:
+    """Bounded LRU cache of verified ID token claims.
+
+    Entries are keyed by a SHA-256 digest of the token (the token itself is
+    never stored) and expire at the token's ``exp`` claim, so a cached token is
+    never accepted after Firebase would have rejected it. ``revoke`` drops a
+    user's entries and rejects any of their tokens issued up to the call,
+    even if they are verified again afterwards.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._revoked: Dict[str, int] = {}
+        self._verify_latencies: deque[float] = deque(maxlen=1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.revocations = 0
+
+    @staticmethod
+    def _digest(id_token: str) -> bytes:
+        return hashlib.sha256(id_token.encode("utf-8")).digest()
+
+    @staticmethod
+    def _uid(claims: Dict[str, Any]) -> str | None:
+        return claims.get("uid") or claims.get("sub")
+
+    def _is_revoked(self, claims: Dict[str, Any]) -> bool:
+        # ``iat`` has whole seconds, so a token from the revocation's second is rejected too.
+        revoked_at_ms = self._revoked.get(self._uid(claims))
+        return revoked_at_ms is not None and claims.get("iat", 0) * 1000 <= revoked_at_ms
+
+    def get(self, id_token: str) -> Dict[str, Any] | None:
+        """Return the cached claims for ``id_token``, or ``None`` on a miss."""
+
+        cache_key = self._digest(id_token)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                if entry[1] <= time.time():
+                    del self._entries[cache_key]
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(cache_key)
+                    self.hits += 1
+                    return dict(entry[0])
+            self.misses += 1
+            return None
+
+    def put(self, id_token: str, claims: Dict[str, Any]) -> None:
+        expires_at = claims.get("exp")
+        if self.max_entries <= 0 or not isinstance(expires_at, (int, float)) or expires_at <= time.time():
+            return
+
+        with self._lock:
+            if self._is_revoked(claims):
+                return
+            cache_key = self._digest(id_token)
+            self._entries[cache_key] = (dict(claims), float(expires_at))
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def verify(self, id_token: str) -> Dict[str, Any]:
+        """Return the token's claims, verifying its signature only on a miss."""
+
+        claims = self.get(id_token)
+        if claims is not None:
+            return claims
+        return self.fetch(id_token)
+
+    def fetch(self, id_token: str) -> Dict[str, Any]:
+        """Verify ``id_token`` with Firebase, skipping the lookup, and cache it."""
+
+        started = time.perf_counter()
+        claims = firebase_auth.verify_id_token(id_token)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._verify_latencies.append(elapsed)
+            revoked = self._is_revoked(claims)
+        if revoked:
+            raise ValueError("Token was issued before its user's tokens were revoked")
+        self.put(id_token, claims)
+        return claims
+
+    def revoke(self, uid: str) -> None:
+        """Revocation hook: forget ``uid``'s tokens and reject those already issued."""
+
+        now_ms = time.time_ns() // 1_000_000
+        with self._lock:
+            self._revoked[uid] = now_ms
+            self.revocations += 1
+            for cache_key in [key for key, entry in self._entries.items() if self._uid(entry[0]) == uid]:
+                del self._entries[cache_key]
+            cutoff = now_ms - MAX_TOKEN_LIFETIME_SECONDS * 1000
+            for stale_uid in [key for key, revoked_at_ms in self._revoked.items() if revoked_at_ms < cutoff]:
+                del self._revoked[stale_uid]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            latencies = sorted(self._verify_latencies)
+            stats: Dict[str, Any] = {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "revocations": self.revocations,
+            }
+
+        if latencies:
+            stats["verify_latency_ms"] = {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 3),
+                "p50": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p95": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000, 3),
+                "max": round(latencies[-1] * 1000, 3),
+            }
+        return stats
+
+
+token_cache = TokenCache()
+
 
 class UserContext(BaseModel):
     uid: str
@@ -26,13 +177,36 @@ class UserContext(BaseModel):
     picture: str | None = None
 
 
+class SessionGrant(UserContext):
+    """``/auth/verify`` response: the user plus a session token to use instead
+    of the Firebase ID token until ``expires_at`` (epoch seconds)."""
+
+    session_token: str
+    token_type: str = "session"
+    expires_at: int
+
+
 def _verify_token(id_token: str) -> Dict[str, Any]:
     try:
-        return firebase_auth.verify_id_token(id_token)
+        return token_cache.verify(id_token)
+    except Exception as exc:  # noqa: BLE001
+        raise HTTPException(status_code=401, detail="Invalid or expired token") from exc
+
+
+def _fetch_token(id_token: str) -> Dict[str, Any]:
+    try:
+        return token_cache.fetch(id_token)
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=401, detail="Invalid or expired token") from exc
 
 
+def _verify_session(session_token: str) -> Dict[str, Any]:
+    try:
+        return session_tokens.verify(session_token)
+    except ValueError as exc:
+        raise HTTPException(status_code=401, detail="Invalid or expired session") from exc
+
+
 def _build_user_context(decoded_token: Dict[str, Any]) -> UserContext:
     return UserContext(
         uid=decoded_token.get("uid") or decoded_token.get("sub"),
@@ -42,33 +216,182 @@ def _build_user_context(decoded_token: Dict[str, Any]) -> UserContext:
     )
 
 
-def _sync_user_profile(decoded_token: Dict[str, Any]) -> None:
-    uid = decoded_token.get("uid") or decoded_token.get("sub")
-    if not uid:
-        raise HTTPException(status_code=400, detail="Token missing uid")
-
-    doc_ref = firebase_db.collection("users").document(uid)
-    snapshot = doc_ref.get()
-
-    ensure_rsa_keys(PUBLIC_KEY_PATH, PRIVATE_KEY_PATH)
-    public_key: str | None = None
-    if PUBLIC_KEY_PATH.exists():
-        public_key = PUBLIC_KEY_PATH.read_text(encoding="utf-8")
-
-    profile = UserModel(
+def _profile_fields(uid: str, decoded_token: Dict[str, Any]) -> Dict[str, Any]:
+    return UserModel(
         uid=uid,
         email=decoded_token.get("email"),
         name=decoded_token.get("name") or decoded_token.get("display_name"),
         picture=decoded_token.get("picture") or decoded_token.get("photo_url"),
-        public_key=public_key,
+        public_key=key_manager.public_pem(),
         lastLogin=firestore.SERVER_TIMESTAMP,
         createdAt=None,
     ).dict(exclude_none=True)
 
-    if not snapshot.exists:
-        profile["createdAt"] = firestore.SERVER_TIMESTAMP
 
-    doc_ref.set(profile, merge=True)
+class ProfileSync:
+    """Debounced, write-behind sync of user profiles to ``users_repo``.
+
+    A user is synced at most once per ``interval`` seconds per process. The
+    first sync checks whether the profile exists; new profiles are written
+    immediately, while updates of known ones (mostly ``lastLogin``) are queued
+    and written in batches by a background thread every ``flush_interval``
+    seconds, coalescing repeated updates of the same user. Warm requests touch
+    neither the metadata store nor the disk.
+    """
+
+    # Users remembered as synced; the least recently seen are forgotten first
+    # and simply re-checked on their next request.
+    MAX_USERS = 10000
+    # Firestore batches cap at 500 writes.
+    MAX_BATCH_WRITES = 500
+
+    def __init__(
+        self,
+        interval: float = PROFILE_SYNC_INTERVAL_SECONDS,
+        flush_interval: float = PROFILE_SYNC_FLUSH_SECONDS,
+    ) -> None:
+        self.interval = interval
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._synced: "OrderedDict[str, float]" = OrderedDict()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        self.skipped = 0
+        self.created = 0
+        self.queued = 0
+        self.written = 0
+        self.failed_flushes = 0
+
+    def _due(self, decoded_token: Dict[str, Any]) -> Tuple[str, float, float | None] | None:
+        """Return ``(uid, now, last_synced)``, or ``None`` if the user was synced recently."""
+
+        uid = decoded_token.get("uid") or decoded_token.get("sub")
+        if not uid:
+            raise HTTPException(status_code=400, detail="Token missing uid")
+
+        now = time.monotonic()
+        with self._lock:
+            last_synced = self._synced.get(uid)
+            if last_synced is not None and now - last_synced < self.interval:
+                self.skipped += 1
+                return None
+        return uid, now, last_synced
+
+    def _created(self, uid: str, now: float) -> None:
+        with self._lock:
+            self.created += 1
+            self._mark_synced(uid, now)
+
+    def _enqueue(self, uid: str, profile: Dict[str, Any], now: float) -> None:
+        with self._lock:
+            self._mark_synced(uid, now)
+            self._pending[uid] = profile
+            self.queued += 1
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="profile-sync", daemon=True)
+                self._thread.start()
+        if self._closed:
+            self.flush()
+
+    def sync(self, decoded_token: Dict[str, Any]) -> None:
+        due = self._due(decoded_token)
+        if due is None:
+            return
+        uid, now, last_synced = due
+
+        profile = _profile_fields(uid, decoded_token)
+        if last_synced is None:
+            if users_repo.get(uid) is None:
+                profile["createdAt"] = firestore.SERVER_TIMESTAMP
+                users_repo.set(uid, profile, merge=True)
+                self._created(uid, now)
+                return
+        self._enqueue(uid, profile, now)
+
+    async def sync_async(self, decoded_token: Dict[str, Any]) -> None:
+        """``sync`` for the event loop: the first-sync check and create use the
+        repository's async path; queued updates share the background writer."""
+
+        due = self._due(decoded_token)
+        if due is None:
+            return
+        uid, now, last_synced = due
+
+        profile = _profile_fields(uid, decoded_token)
+        if last_synced is None:
+            if await users_repo.aget(uid) is None:
+                profile["createdAt"] = firestore.SERVER_TIMESTAMP
+                await users_repo.aset(uid, profile, merge=True)
+                self._created(uid, now)
+                return
+        self._enqueue(uid, profile, now)
+
+    def _mark_synced(self, uid: str, now: float) -> None:
+        self._synced[uid] = now
+        self._synced.move_to_end(uid)
+        while len(self._synced) > self.MAX_USERS:
+            self._synced.popitem(last=False)
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all queued profiles now."""
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        for start in range(0, len(items), self.MAX_BATCH_WRITES):
+            chunk = items[start:start + self.MAX_BATCH_WRITES]
+            try:
+                users_repo.set_many(dict(chunk))
+            except Exception:  # noqa: BLE001
+                with self._lock:
+                    self.failed_flushes += 1
+                    # Retry on the next flush unless a newer update replaced it.
+                    for uid, profile in items[start:]:
+                        self._pending.setdefault(uid, profile)
+                return
+            with self._lock:
+                self.written += len(chunk)
+
+    def close(self) -> None:
+        """Stop the background writer after a final flush."""
+
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+        self._wake.set()
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "interval_seconds": self.interval,
+                "flush_interval_seconds": self.flush_interval,
+                "tracked_users": len(self._synced),
+                "pending": len(self._pending),
+                "skipped": self.skipped,
+                "created": self.created,
+                "queued": self.queued,
+                "written": self.written,
+                "failed_flushes": self.failed_flushes,
+            }
+
+
+profile_sync = ProfileSync()
+
+
+def _sync_user_profile(decoded_token: Dict[str, Any]) -> None:
+    profile_sync.sync(decoded_token)
 
 
 def get_current_user(
@@ -76,6 +399,48 @@ def get_current_user(
 ) -> UserContext:
     if credentials is None:
         raise HTTPException(status_code=401, detail="Missing bearer token")
+    if session_tokens.is_session_token(credentials.credentials):
+        # The profile was synced when the session was issued.
+        return _build_user_context(_verify_session(credentials.credentials))
     decoded = _verify_token(credentials.credentials)
     _sync_user_profile(decoded)
     return _build_user_context(decoded)
+
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials | None = Depends(security),
+) -> UserContext:
+    """``get_current_user`` for ``async`` routes.
+
+    Session tokens and cached ID tokens are checked on the event loop; only a
+    cache miss is verified in the thread pool (``firebase_admin`` has no async
+    verifier), and the profile sync uses the repository's async path.
+    """
+
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    if session_tokens.is_session_token(credentials.credentials):
+        return _build_user_context(_verify_session(credentials.credentials))
+    decoded = token_cache.get(credentials.credentials)
+    if decoded is None:
+        decoded = await run_in_threadpool(_fetch_token, credentials.credentials)
+    await profile_sync.sync_async(decoded)
+    return _build_user_context(decoded)
+
+
+def _require_operator(user: UserContext) -> UserContext:
+    if user.uid not in OPERATOR_UIDS:
+        raise HTTPException(status_code=403, detail="Operator access required")
+    return user
+
+
+def get_operator(user: UserContext = Depends(get_current_user)) -> UserContext:
+    """``get_current_user`` restricted to ``OPERATOR_UIDS``."""
+
+    return _require_operator(user)
+
+
+async def get_operator_async(user: UserContext = Depends(get_current_user_async)) -> UserContext:
+    """``get_operator`` for ``async`` routes."""
+
+    return _require_operator(user)
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+from .constants import KEY_RELOAD_CHECK_SECONDS, SESSION_TOKEN_TTL_SECONDS
+from .crypto import write_secret
+from .paths import SESSION_KEYS_PATH
+
+TOKEN_PREFIX = "cs1."
+# Claims copied from the verified Firebase token into the session token.
+PROFILE_CLAIMS = ("email", "name", "picture")
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def _new_key() -> Tuple[str, Dict[str, Any]]:
+    return secrets.token_hex(4), {"secret": _b64encode(secrets.token_bytes(32)), "created_at": int(time.time())}
+
+
+class SessionTokens:
+    """Issues and verifies session tokens; see the module docstring.
+
+    ``revoke_user`` rejects every session of a user issued up to now and
+    ``revoke`` a single session. Issue and revocation times are kept in
+    milliseconds, so a session issued right after a logout (in the same
+    second) stays valid. Revocations are kept until the tokens they cover have
+    expired.
+    """
+
+    def __init__(
+        self,
+        path: Path = SESSION_KEYS_PATH,
+        ttl_seconds: int = SESSION_TOKEN_TTL_SECONDS,
+        check_interval: float = KEY_RELOAD_CHECK_SECONDS,
+    ) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._fingerprint: Tuple[int, int, int] | None = None
+        self._checked_at = 0.0
+        # (state as stored, {kid: secret bytes}), swapped as one unit on reload.
+        self._state: Tuple[Dict[str, Any], Dict[str, bytes]] | None = None
+        self.issued = 0
+        self.verified = 0
+        self.rejected = 0
+        self.watched = False
+
+    @staticmethod
+    def is_session_token(token: str) -> bool:
+        return token.startswith(TOKEN_PREFIX)
+
+    def _stat_fingerprint(self) -> Tuple[int, int, int] | None:
+        try:
+            item = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (item.st_ino, item.st_mtime_ns, item.st_size)
+
+    def _create(self) -> None:
+        """Write a first signing key unless another process beat us to it."""
+
+        kid, key = _new_key()
+        state = {"current": kid, "keys": {kid: key}, "revoked_uids": {}, "revoked_sessions": {}}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.part")
+        partial_path.write_text(json.dumps(state, indent=2))
+        try:
+            os.chmod(partial_path, 0o600)
+            os.link(partial_path, self.path)
+        except FileExistsError:
+            pass
+        finally:
+            partial_path.unlink(missing_ok=True)
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            self._create()
+        state = json.loads(self.path.read_text())
+        secrets_by_kid = {kid: _b64decode(key["secret"]) for kid, key in state["keys"].items()}
+        self._state = (state, secrets_by_kid)
+        self._fingerprint = self._stat_fingerprint()
+
+    def _refresh(self, force: bool = False) -> bool:
+        """Under ``_lock``: (re)load the key file if needed; returns whether it was."""
+
+        changed = force or self._state is None or self._stat_fingerprint() != self._fingerprint
+        if changed:
+            self._load()
+        self._checked_at = time.monotonic()
+        return changed
+
+    def _current(self, force: bool = False) -> Tuple[Dict[str, Any], Dict[str, bytes]]:
+        state = self._state
+        fresh = self.watched or time.monotonic() - self._checked_at < self.check_interval
+        if not force and state is not None and fresh:
+            return state
+
+        with self._lock:
+            self._refresh(force)
+            return self._state
+
+    def check(self) -> bool:
+        """Load the key file, or reload it if it changed; returns whether it was."""
+
+        with self._lock:
+            return self._refresh()
+
+    def _update(self, change: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        """Apply ``change`` to the freshest stored state and write it back."""
+
+        with self._lock:
+            self._load()
+            state = json.loads(json.dumps(self._state[0]))
+            change(state)
+
+            # Drop keys and revocations that can no longer matter.
+            now = int(time.time())
+            state["keys"] = {
+                kid: key
+                for kid, key in state["keys"].items()
+                if kid == state["current"] or key.get("retired_at", now) + self.ttl_seconds >= now
+            }
+            state["revoked_uids"] = {
+                uid: revoked_at_ms
+                for uid, revoked_at_ms in state["revoked_uids"].items()
+                if revoked_at_ms // 1000 + self.ttl_seconds >= now
+            }
+            state["revoked_sessions"] = {
+                sid: expires_at for sid, expires_at in state["revoked_sessions"].items() if expires_at >= now
+            }
+
+            write_secret(self.path, json.dumps(state, indent=2).encode("utf-8"))
+            self._load()
+            self._checked_at = time.monotonic()
+            return state
+
+    def issue(self, claims: Dict[str, Any]) -> Tuple[str, int]:
+        """Sign a session for verified Firebase ``claims``; returns ``(token, exp)``.
+
+        Raises ``ValueError`` if the claims were issued before ``revoke_user``.
+        """
+
+        uid = claims.get("uid") or claims.get("sub")
+        if not uid:
+            raise ValueError("Token missing uid")
+
+        # Another worker may have just revoked ``uid``; logins are rare enough to stat every time.
+        self.check()
+        state, secrets_by_kid = self._current()
+        revoked_at_ms = state["revoked_uids"].get(uid)
+        # Firebase ``iat`` has whole seconds, so a token from the revocation's second is refused too.
+        if revoked_at_ms is not None and isinstance(claims.get("iat"), (int, float)):
+            if claims["iat"] * 1000 <= revoked_at_ms:
+                raise ValueError("Token was issued before its user's sessions were revoked")
+        kid = state["current"]
+        issued_at_ms = _now_ms()
+        expires_at = issued_at_ms // 1000 + self.ttl_seconds
+        # Never outlive the Firebase token the session was exchanged for.
+        if isinstance(claims.get("exp"), (int, float)):
+            expires_at = min(expires_at, int(claims["exp"]))
+
+        payload = {"kid": kid, "sid": secrets.token_hex(8), "uid": uid, "iat_ms": issued_at_ms, "exp": expires_at}
+        payload.update({name: claims[name] for name in PROFILE_CLAIMS if claims.get(name) is not None})
+        signing_input = TOKEN_PREFIX + _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        signature = hmac.new(secrets_by_kid[kid], signing_input.encode("ascii"), hashlib.sha256).digest()
+        with self._lock:
+            self.issued += 1
+        return f"{signing_input}.{_b64encode(signature)}", expires_at
+
+    def _check(self, token: str) -> Dict[str, Any]:
+        state, secrets_by_kid = self._current()
+        try:
+            signing_input, signature = token.rsplit(".", 1)
+            claims = json.loads(_b64decode(signing_input[len(TOKEN_PREFIX):]))
+            secret = secrets_by_kid[claims["kid"]]
+            expected = hmac.new(secret, signing_input.encode("ascii"), hashlib.sha256).digest()
+            valid = hmac.compare_digest(expected, _b64decode(signature))
+            sid, uid, issued_at_ms, expires_at = claims["sid"], claims["uid"], claims["iat_ms"], claims["exp"]
+        except (KeyError, TypeError, ValueError) as exc:
+            raise ValueError("Malformed session token") from exc
+
+        if not valid:
+            raise ValueError("Bad session token signature")
+        if expires_at <= time.time():
+            raise ValueError("Session token expired")
+        if sid in state["revoked_sessions"]:
+            raise ValueError("Session was revoked")
+        revoked_at_ms = state["revoked_uids"].get(uid)
+        if revoked_at_ms is not None and issued_at_ms <= revoked_at_ms:
+            raise ValueError("Session was revoked")
+        return claims
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """Return the claims of a valid session token or raise ``ValueError``."""
+
+        if not self.is_session_token(token):
+            raise ValueError("Not a session token")
+        try:
+            claims = self._check(token)
+        except ValueError:
+            with self._lock:
+                self.rejected += 1
+            raise
+        with self._lock:
+            self.verified += 1
+        return claims
+
+    def rotate(self) -> str:
+        """Start signing with a fresh key; returns its id."""
+
+        kid, key = _new_key()
+
+        def _change(state: Dict[str, Any]) -> None:
+            state["keys"][state["current"]]["retired_at"] = int(time.time())
+            state["keys"][kid] = key
+            state["current"] = kid
+
+        self._update(_change)
+        return kid
+
+    def revoke_user(self, uid: str) -> None:
+        """Reject every session ``uid`` was issued up to now."""
+
+        def _change(state: Dict[str, Any]) -> None:
+            state["revoked_uids"][uid] = _now_ms()
+
+        self._update(_change)
+
+    def revoke(self, token: str) -> None:
+        """Reject one (validly signed) session token."""
+
+        claims = self._check(token)
+
+        def _change(state: Dict[str, Any]) -> None:
+            state["revoked_sessions"][claims["sid"]] = claims["exp"]
+
+        self._update(_change)
+
+    def stats(self) -> Dict[str, Any]:
+        state, _ = self._current()
+        with self._lock:
+            return {
+                "ttl_seconds": self.ttl_seconds,
+                "current_kid": state["current"],
+                "keys": len(state["keys"]),
+                "revoked_users": len(state["revoked_uids"]),
+                "revoked_sessions": len(state["revoked_sessions"]),
+                "issued": self.issued,
+                "verified": self.verified,
+                "rejected": self.rejected,
+            }
+
+
+session_tokens = SessionTokens()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage session token keys and revocations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rotate", help="Start signing with a new key")
+    revoke_user = commands.add_parser("revoke-user", help="Revoke every current session of a user")
+    revoke_user.add_argument("uid")
+    commands.add_parser("status", help="Show keys and revocation counts")
+    issue = commands.add_parser("issue", help="Print a session token for a user (testing)")
+    issue.add_argument("uid")
+    issue.add_argument("--email", default="")
+    args = parser.parse_args(argv)
+
+    if args.command == "issue":
+        token, _ = session_tokens.issue({"uid": args.uid, "email": args.email or f"{args.uid}@localhost"})
+        print(token)
+        return
+    if args.command == "rotate":
+        session_tokens.rotate()
+    elif args.command == "revoke-user":
+        session_tokens.revoke_user(args.uid)
+    print(json.dumps(session_tokens.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
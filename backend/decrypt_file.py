@@ -1,37 +1,42 @@
 from __future__ import annotations
 
+import os
+import secrets
 from pathlib import Path
+from typing import BinaryIO, Iterator
 
 from cryptography.hazmat.primitives import hashes, padding, serialization
 from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
+from core.compression import CODEC_NONE
+from core.constants import CRYPTO_SEGMENT_THREADS, PARALLEL_SEGMENT_MIN_BYTES
+from core.container import (
+    WRAP_AES_KW_HKDF,
+    WRAP_RSA_OAEP_SHA256,
+    ContainerError,
+    KeySlot,
+    SegmentReader,
+    container_layout,
+    read_header,
+)
+from core.crypto import key_hierarchy, key_manager, public_key_id
+from core.executor import crypto_executor, decrypt_job
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 FILES_DIR = BASE_DIR / "files"
 KEYS_DIR = BASE_DIR / "keys"
 
+# Ciphertext is read and decrypted in blocks of this size; plaintext is yielded
+# as soon as each block is decrypted.
+CHUNK_SIZE = 1024 * 1024
 
-def decrypt_file(
-    encrypted_file_path: Path,
-    encrypted_key_path: Path,
-    output_path: Path,
-    private_key_path: Path,
-) -> None:
-    """Decrypt ``encrypted_file_path`` into ``output_path`` using stored AES material."""
-
-    if not encrypted_file_path.exists():
-        raise FileNotFoundError(f"Encrypted file not found: {encrypted_file_path}")
 
-    if not encrypted_key_path.exists():
-        raise FileNotFoundError(f"Encrypted AES key not found: {encrypted_key_path}")
+def unwrap_aes_key(encrypted_key: bytes, private_key: RSAPrivateKey) -> bytes:
+    """Recover a per-file AES key wrapped with RSA-OAEP(SHA-256)."""
 
-    encrypted_key = encrypted_key_path.read_bytes()
-    private_key = serialization.load_pem_private_key(
-        private_key_path.read_bytes(),
-        password=None,
-    )
-
-    aes_key = private_key.decrypt(
+    return private_key.decrypt(
         encrypted_key,
         asym_padding.OAEP(
             mgf=asym_padding.MGF1(algorithm=hashes.SHA256()),
@@ -40,18 +45,299 @@ def decrypt_file(
         ),
     )
 
-    blob = encrypted_file_path.read_bytes()
-    iv, ciphertext = blob[:16], blob[16:]
 
-    cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv))
-    decryptor = cipher.decryptor()
-    padded_data = decryptor.update(ciphertext) + decryptor.finalize()
+def unwrap_key_slot(
+    key_slot: KeySlot,
+    private_key: RSAPrivateKey | None,
+    uid: str | None = None,
+) -> bytes:
+    """Recover a data key from a key slot.
+
+    RSA-wrapped slots need ``private_key``; KEK-wrapped slots need the owner's
+    ``uid`` and cost no RSA operation. Keys wrapped under a key pair retired by
+    ``rotate_keys.py`` are opened with the retired private key.
+    """
+
+    if key_slot.wrap_alg == WRAP_AES_KW_HKDF:
+        if uid is None:
+            raise ContainerError("KEK-wrapped file keys need the owner's uid")
+        return key_hierarchy.unwrap(uid, key_slot.key_id, key_slot.wrapped_key)
+    if key_slot.wrap_alg != WRAP_RSA_OAEP_SHA256:
+        raise ContainerError(f"Unsupported key wrapping algorithm: {key_slot.wrap_alg}")
+    if private_key is None:
+        raise ValueError("An RSA private key is required to unwrap this file key")
+    if key_slot.key_id and key_slot.key_id != public_key_id(private_key.public_key()):
+        return unwrap_aes_key(key_slot.wrapped_key, key_manager.retired_private_key(key_slot.key_id))
+    try:
+        return unwrap_aes_key(key_slot.wrapped_key, private_key)
+    except ValueError:
+        if key_slot.key_id:
+            raise
+        # Legacy keys carry no key id and may predate the last rotation.
+        for retired_key in key_manager.retired_private_keys():
+            try:
+                return unwrap_aes_key(key_slot.wrapped_key, retired_key)
+            except ValueError:
+                continue
+        raise
+
+
+def _load_private_key(private_key_path: Path) -> RSAPrivateKey:
+    return serialization.load_pem_private_key(private_key_path.read_bytes(), password=None)
+
+
+def load_aes_key(
+    encrypted_key_path: Path,
+    private_key_path: Path | None,
+    private_key: RSAPrivateKey | None = None,
+) -> bytes:
+    """Unwrap the RSA-encrypted AES key stored at ``encrypted_key_path``.
+
+    ``private_key`` may be an already-loaded key object, in which case
+    ``private_key_path`` is not read.
+    """
 
+    if not encrypted_key_path.exists():
+        raise FileNotFoundError(f"Encrypted AES key not found: {encrypted_key_path}")
+
+    encrypted_key = encrypted_key_path.read_bytes()
+    if private_key is None:
+        private_key = _load_private_key(private_key_path)
+
+    return unwrap_aes_key(encrypted_key, private_key)
+
+
+def decrypt_stream(
+    source: BinaryIO,
+    aes_key: bytes,
+    chunk_size: int = CHUNK_SIZE,
+    threads: int = 1,
+) -> Iterator[bytes]:
+    """Yield plaintext chunks from a segmented container or a legacy CBC blob.
+
+    Segmented containers (see ``core.container``) are authenticated segment by
+    segment, on ``threads`` threads; anything without the container magic is
+    treated as a legacy ``iv + AES-CBC(PKCS7(data))`` blob.
+    """
+
+    if read_header(source) is not None:
+        yield from SegmentReader(source, aes_key).iter_all(threads=threads)
+        return
+
+    yield from _decrypt_legacy_cbc(source, aes_key, chunk_size)
+
+
+def _decrypt_legacy_cbc(
+    source: BinaryIO,
+    aes_key: bytes,
+    chunk_size: int,
+) -> Iterator[bytes]:
+    iv = source.read(16)
+    decryptor = Cipher(algorithms.AES(aes_key), modes.CBC(iv)).decryptor()
     unpadder = padding.PKCS7(128).unpadder()
-    data = unpadder.update(padded_data) + unpadder.finalize()
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_bytes(data)
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        data = unpadder.update(decryptor.update(chunk))
+        if data:
+            yield data
+
+    tail = unpadder.update(decryptor.finalize()) + unpadder.finalize()
+    if tail:
+        yield tail
+
+
+class EncryptedBlob:
+    """An open encrypted file whose header has been parsed once.
+
+    The same handle serves key lookup, sizing and decryption, so opening a
+    file costs one ``open()`` and a sequential read. The ``iter_*`` generators
+    close the handle when they finish; otherwise use ``close`` or ``with``.
+    """
+
+    def __init__(self, path: Path) -> None:
+        if not path.exists():
+            raise FileNotFoundError(f"Encrypted file not found: {path}")
+        self.path = path
+        self._handle = path.open("rb")
+        try:
+            self.header = read_header(self._handle)
+            self.file_size = self._handle.seek(0, 2)
+        except BaseException:
+            self._handle.close()
+            raise
+
+    def __enter__(self) -> EncryptedBlob:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._handle.close()
+
+    def stat(self) -> os.stat_result:
+        return os.fstat(self._handle.fileno())
+
+    @property
+    def key_slot(self) -> KeySlot | None:
+        """The embedded wrapped key; ``None`` for legacy blobs that use a ``.key`` file."""
+
+        return self.header.key_slot if self.header is not None else None
+
+    @property
+    def plaintext_size(self) -> int | None:
+        """Plaintext size, or ``None`` when it is unknown without decrypting everything.
+
+        That is the case for legacy blobs and compressed containers, neither of
+        which supports random access.
+        """
+
+        if self.header is None or self.header.codec != CODEC_NONE:
+            return None
+        return container_layout(self.header, self.file_size)[1]
+
+    def default_threads(self) -> int:
+        """Segment threads as in ``encrypt_file``: parallel for large files only."""
+
+        return CRYPTO_SEGMENT_THREADS if self.file_size >= PARALLEL_SEGMENT_MIN_BYTES else 1
+
+    def unwrap(
+        self,
+        encrypted_key_path: Path | None = None,
+        private_key_path: Path | None = None,
+        private_key: RSAPrivateKey | None = None,
+        uid: str | None = None,
+    ) -> bytes:
+        """Unwrap the data key from the header, or from ``encrypted_key_path`` for legacy blobs."""
+
+        if self.key_slot is None:
+            if encrypted_key_path is None:
+                raise FileNotFoundError(f"No embedded or external key for {self.path}")
+            return load_aes_key(encrypted_key_path, private_key_path, private_key=private_key)
+        if (
+            private_key is None
+            and private_key_path is not None
+            and self.key_slot.wrap_alg == WRAP_RSA_OAEP_SHA256
+        ):
+            private_key = _load_private_key(private_key_path)
+        return unwrap_key_slot(self.key_slot, private_key, uid)
+
+    def iter_chunks(
+        self,
+        aes_key: bytes,
+        chunk_size: int = CHUNK_SIZE,
+        threads: int | None = None,
+    ) -> Iterator[bytes]:
+        if threads is None:
+            threads = self.default_threads()
+        try:
+            self._handle.seek(0)
+            yield from decrypt_stream(self._handle, aes_key, chunk_size=chunk_size, threads=threads)
+        finally:
+            self.close()
+
+    def iter_range(self, aes_key: bytes, start: int, end: int, threads: int = 1) -> Iterator[bytes]:
+        """Yield plaintext bytes ``[start, end)``, decrypting only the covering segments."""
+
+        try:
+            yield from SegmentReader(self._handle, aes_key).iter_range(start, end, threads=threads)
+        finally:
+            self.close()
+
+
+def iter_decrypted_chunks(
+    encrypted_file_path: Path,
+    encrypted_key_path: Path | None,
+    private_key_path: Path | None,
+    chunk_size: int = CHUNK_SIZE,
+    private_key: RSAPrivateKey | None = None,
+    aes_key: bytes | None = None,
+    threads: int | None = None,
+    uid: str | None = None,
+) -> Iterator[bytes]:
+    """Return an iterator over the plaintext of ``encrypted_file_path``.
+
+    The file is opened and the AES key is unwrapped before this returns, so
+    errors surface to the caller instead of midway through iteration. The key
+    comes from the container header; ``encrypted_key_path`` is only read for
+    legacy blobs without one. Callers that already hold the unwrapped
+    ``aes_key`` skip the unwrap entirely; KEK-wrapped keys need the owner's
+    ``uid``. ``threads`` defaults as in ``encrypt_file``: parallel for large
+    files only.
+    """
+
+    blob = EncryptedBlob(encrypted_file_path)
+    try:
+        if aes_key is None:
+            aes_key = blob.unwrap(encrypted_key_path, private_key_path, private_key=private_key, uid=uid)
+    except BaseException:
+        blob.close()
+        raise
+    return blob.iter_chunks(aes_key, chunk_size=chunk_size, threads=threads)
+
+
+def decrypted_size(encrypted_file_path: Path) -> int | None:
+    """Return the plaintext size of a segmented container (see ``EncryptedBlob.plaintext_size``)."""
+
+    with EncryptedBlob(encrypted_file_path) as blob:
+        return blob.plaintext_size
+
+
+def iter_decrypted_range(
+    encrypted_file_path: Path,
+    aes_key: bytes,
+    start: int,
+    end: int,
+    threads: int = 1,
+) -> Iterator[bytes]:
+    """Yield plaintext bytes ``[start, end)`` of a segmented container.
+
+    Only the segments covering the range are read and decrypted.
+    """
+
+    yield from EncryptedBlob(encrypted_file_path).iter_range(aes_key, start, end, threads=threads)
+
+
+def decrypt_file(
+    encrypted_file_path: Path,
+    encrypted_key_path: Path | None,
+    output_path: Path,
+    private_key_path: Path | None,
+    chunk_size: int = CHUNK_SIZE,
+    private_key: RSAPrivateKey | None = None,
+    aes_key: bytes | None = None,
+    threads: int | None = None,
+    uid: str | None = None,
+) -> bytes:
+    """Decrypt ``encrypted_file_path`` into ``output_path``.
+
+    The plaintext goes to a ``.part`` sibling that replaces ``output_path``
+    only once every segment has authenticated, so a failure never leaves a
+    partial plaintext behind or truncates an existing good file.
+
+    Returns the AES key that was used, so callers can cache it.
+    """
+
+    blob = EncryptedBlob(encrypted_file_path)
+    with blob:
+        if aes_key is None:
+            aes_key = blob.unwrap(encrypted_key_path, private_key_path, private_key=private_key, uid=uid)
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique per call: concurrent decrypts of one file must not share it.
+        partial_path = output_path.with_name(f"{output_path.name}.{secrets.token_hex(4)}.part")
+        try:
+            with partial_path.open("wb") as sink:
+                for chunk in blob.iter_chunks(aes_key, chunk_size=chunk_size, threads=threads):
+                    sink.write(chunk)
+            os.replace(partial_path, output_path)
+        except BaseException:
+            partial_path.unlink(missing_ok=True)
+            raise
+    return aes_key
 
 
 def decrypt_sample_file() -> None:
@@ -59,14 +345,18 @@ def decrypt_sample_file() -> None:
 
     encrypted_file = FILES_DIR / "sample_encrypted.bin"
     output_file = FILES_DIR / "sample_decrypted.pdf"
-    encrypted_key_file = KEYS_DIR / "sample_encrypted_aes.key"
+    # Only read for samples encrypted before keys were embedded in the header.
+    legacy_key_file = KEYS_DIR / "sample_encrypted_aes.key"
 
-    decrypt_file(
-        encrypted_file_path=encrypted_file,
-        encrypted_key_path=encrypted_key_file,
-        output_path=output_file,
-        private_key_path=KEYS_DIR / "private.pem",
+    # Go through the shared crypto executor, like the API routes do.
+    crypto_executor.run(
+        decrypt_job,
+        str(encrypted_file),
+        str(output_file),
+        None,
+        str(legacy_key_file) if legacy_key_file.exists() else None,
     )
+    crypto_executor.shutdown()
 
     print("File decrypted successfully!")
 
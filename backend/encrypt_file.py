@@ -1,56 +1,194 @@
 from __future__ import annotations
 
+import base64
+import os
 from pathlib import Path
-from secrets import token_bytes
+from secrets import token_bytes, token_hex
+from typing import Any, BinaryIO, Dict
 
-from cryptography.hazmat.primitives import hashes, padding, serialization
+from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+
+from core.compression import choose_codec
+from core.constants import (
+    COMPRESSION_MODE,
+    CRYPTO_SEGMENT_THREADS,
+    KEY_WRAP_SCHEME,
+    PARALLEL_SEGMENT_MIN_BYTES,
+)
+from core.container import (
+    SEGMENT_SIZE,
+    WRAP_AES_KW_HKDF,
+    WRAP_NAMES,
+    WRAP_RSA_OAEP_SHA256,
+    KeySlot,
+    SegmentWriter,
+)
+from core.crypto import key_hierarchy, public_key_id
+from core.executor import crypto_executor, encrypt_job
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 FILES_DIR = BASE_DIR / "files"
 KEYS_DIR = BASE_DIR / "keys"
 
+# Plaintext is read and sealed in blocks of this size so peak memory stays
+# constant regardless of the input size.
+CHUNK_SIZE = 1024 * 1024
+
+
+def wrap_aes_key(aes_key: bytes, public_key: RSAPublicKey) -> bytes:
+    """Wrap a per-file AES key with RSA-OAEP(SHA-256)."""
+
+    return public_key.encrypt(
+        aes_key,
+        asym_padding.OAEP(
+            mgf=asym_padding.MGF1(algorithm=hashes.SHA256()),
+            algorithm=hashes.SHA256(),
+            label=None,
+        ),
+    )
+
+
+def wrap_key_slot(
+    aes_key: bytes,
+    public_key: RSAPublicKey | None,
+    uid: str | None = None,
+    scheme: str = KEY_WRAP_SCHEME,
+) -> KeySlot:
+    """Wrap ``aes_key`` for embedding in a container header.
+
+    Files with an owner are wrapped under the owner's KEK when ``scheme`` is
+    ``"kek"``; everything else is wrapped with RSA-OAEP under ``public_key``.
+    """
+
+    if uid is not None and scheme == "kek":
+        key_id, wrapped_key = key_hierarchy.wrap(uid, aes_key)
+        return KeySlot(wrap_alg=WRAP_AES_KW_HKDF, key_id=key_id, wrapped_key=wrapped_key)
+    if public_key is None:
+        raise ValueError("An RSA public key is required to wrap this file key")
+    return KeySlot(
+        wrap_alg=WRAP_RSA_OAEP_SHA256,
+        key_id=public_key_id(public_key),
+        wrapped_key=wrap_aes_key(aes_key, public_key),
+    )
+
+
+def key_slot_fields(key_slot: KeySlot) -> Dict[str, Any]:
+    """Firestore fields holding the recovery copy of a file's wrapped key."""
+
+    return {
+        "aes_key": base64.b64encode(key_slot.wrapped_key).decode("ascii"),
+        "key_wrap": WRAP_NAMES[key_slot.wrap_alg],
+        "key_id": key_slot.key_id,
+    }
+
+
+def encrypt_stream(
+    source: BinaryIO,
+    sink: BinaryIO,
+    aes_key: bytes,
+    chunk_size: int = CHUNK_SIZE,
+    segment_size: int = SEGMENT_SIZE,
+    threads: int = 1,
+    compression: str = COMPRESSION_MODE,
+    key_slot: KeySlot | None = None,
+    cipher_id: int | None = None,
+) -> Dict[str, Any]:
+    """Encrypt ``source`` into ``sink`` as a segmented AEAD container.
+
+    The codec is chosen from the first chunk (see ``core.compression``), and
+    ``key_slot`` (if given) is embedded in the header. ``cipher_id`` defaults
+    to the host's preferred cipher (see ``core.ciphers``).
+    Returns the writer's summary: cipher, codec, plaintext and stored sizes,
+    and the time spent compressing.
+    """
+
+    chunk = source.read(chunk_size)
+    writer = SegmentWriter(
+        sink,
+        aes_key,
+        segment_size=segment_size,
+        threads=threads,
+        codec=choose_codec(chunk, compression),
+        key_slot=key_slot,
+        cipher_id=cipher_id,
+    )
+    while chunk:
+        writer.write(chunk)
+        chunk = source.read(chunk_size)
+    writer.close()
+    return writer.summary()
+
 
 def encrypt_file(
     input_path: Path,
     output_path: Path,
-    public_key_path: Path,
-    encrypted_key_path: Path,
-) -> None:
-    """Encrypt the file at ``input_path`` to ``output_path`` using a fresh AES key."""
+    public_key_path: Path | None,
+    chunk_size: int = CHUNK_SIZE,
+    public_key: RSAPublicKey | None = None,
+    threads: int | None = None,
+    compression: str = COMPRESSION_MODE,
+    uid: str | None = None,
+    cipher_id: int | None = None,
+) -> Dict[str, Any]:
+    """Encrypt the file at ``input_path`` to ``output_path`` using a fresh AES key.
+
+    The input is streamed in ``chunk_size`` blocks into a segmented AEAD
+    container (see ``core.container``), so memory use does not grow with the
+    file size and each segment can later be decrypted on its own. The wrapped
+    AES key and the public key's id are stored in the container header, so
+    the output is the only file written. Pass the owner's ``uid`` to wrap the
+    key under their KEK instead of RSA (see ``wrap_key_slot``).
+
+    Pass an already-loaded ``public_key`` (e.g. from ``core.crypto.key_manager``)
+    to skip reading and parsing ``public_key_path``. ``threads`` defaults to
+    ``CRYPTO_SEGMENT_THREADS`` for inputs of at least
+    ``PARALLEL_SEGMENT_MIN_BYTES`` and to 1 otherwise. ``compression`` is
+    ``"auto"``, ``"always"`` or ``"off"``; the returned summary reports what
+    was chosen and the size actually stored. ``cipher_id`` defaults to the
+    host's preferred cipher.
+
+    The container goes to a ``.part`` sibling that replaces ``output_path``
+    only once it is complete, so a failure never truncates an existing good
+    file.
+    """
 
     if not input_path.exists():
         raise FileNotFoundError(f"Input file not found: {input_path}")
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    encrypted_key_path.parent.mkdir(parents=True, exist_ok=True)
-
-    data = input_path.read_bytes()
-    aes_key = token_bytes(32)
-    iv = token_bytes(16)
 
-    padder = padding.PKCS7(128).padder()
-    padded_data = padder.update(data) + padder.finalize()
+    if threads is None:
+        large = input_path.stat().st_size >= PARALLEL_SEGMENT_MIN_BYTES
+        threads = CRYPTO_SEGMENT_THREADS if large else 1
 
-    cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv))
-    encryptor = cipher.encryptor()
-    encrypted_data = encryptor.update(padded_data) + encryptor.finalize()
+    if public_key is None and public_key_path is not None:
+        public_key = serialization.load_pem_public_key(public_key_path.read_bytes())
 
-    # Persist IV + ciphertext in a single blob for easier transport.
-    output_path.write_bytes(iv + encrypted_data)
-
-    public_key = serialization.load_pem_public_key(public_key_path.read_bytes())
-    encrypted_aes_key = public_key.encrypt(
-        aes_key,
-        asym_padding.OAEP(
-            mgf=asym_padding.MGF1(algorithm=hashes.SHA256()),
-            algorithm=hashes.SHA256(),
-            label=None,
-        ),
-    )
-
-    encrypted_key_path.write_bytes(encrypted_aes_key)
+    aes_key = token_bytes(32)
+    key_slot = wrap_key_slot(aes_key, public_key, uid)
+
+    # Unique per call: concurrent encrypts of one file must not share it.
+    partial_path = output_path.with_name(f"{output_path.name}.{token_hex(8)}.part")
+    try:
+        with input_path.open("rb") as source, partial_path.open("wb") as sink:
+            summary = encrypt_stream(
+                source,
+                sink,
+                aes_key,
+                chunk_size=chunk_size,
+                threads=threads,
+                compression=compression,
+                key_slot=key_slot,
+                cipher_id=cipher_id,
+            )
+        os.replace(partial_path, output_path)
+    except BaseException:
+        partial_path.unlink(missing_ok=True)
+        raise
+
+    return summary
 
 
 def encrypt_sample_file() -> None:
@@ -58,16 +196,12 @@ def encrypt_sample_file() -> None:
 
     input_file = FILES_DIR / "sample.pdf"
     output_file = FILES_DIR / "sample_encrypted.bin"
-    encrypted_key_file = KEYS_DIR / "sample_encrypted_aes.key"
 
-    encrypt_file(
-        input_path=input_file,
-        output_path=output_file,
-        public_key_path=KEYS_DIR / "public.pem",
-        encrypted_key_path=encrypted_key_file,
-    )
+    # Go through the shared crypto executor, like the API routes do.
+    crypto_executor.run(encrypt_job, str(input_file), str(output_file))
+    crypto_executor.shutdown()
 
-    print("File encrypted + AES key encrypted successfully!")
+    print("File encrypted (AES key embedded in the header) successfully!")
 
 
 if __name__ == "__main__":
@@ -3,7 +3,7 @@ from __future__ import annotations
 from pathlib import Path
 
 import firebase_admin
-from firebase_admin import auth, credentials, firestore
+from firebase_admin import auth, credentials, firestore, firestore_async
 
 BASE_DIR = Path(__file__).resolve().parent
 SERVICE_ACCOUNT_PATH = BASE_DIR / "firebase_key.json"
@@ -14,3 +14,5 @@ if not firebase_admin._apps:
 
 firebase_auth = auth
 firebase_db = firestore.client()
+# Same database for ``async`` routes; its calls never block a thread.
+firebase_db_async = firestore_async.client()
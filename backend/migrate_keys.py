@@ -0,0 +1,171 @@
+"""Re-wrap existing RSA-wrapped file keys under the KEK hierarchy.
+
+For every file record (optionally only one user's) the data key is unwrapped
+once with the RSA private key and re-wrapped with the owner's KEK:
+
+- containers with a key slot get the new slot written in place; the
+  ciphertext is untouched;
+- legacy blobs (version 1 containers and CBC files) keep their ciphertext and
+  are opened through the KEK-wrapped ``aes_key`` in their record from then on;
+  their ``.key`` file is removed.
+
+Records are read and written through ``files_repo``, so this works against
+either ``METADATA_BACKEND``. They are updated before any file is touched, so
+an interrupted run leaves every file readable, and records already on the KEK
+scheme are skipped, so the script can simply be re-run.
+
+Run from the ``backend`` directory::
+
+    python migrate_keys.py [--uid UID] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+from collections import Counter
+from typing import Any, Callable, Dict, List, Tuple
+
+from core.container import (
+    WRAP_AES_KW_HKDF,
+    WRAP_NAMES,
+    WRAP_RSA_OAEP_SHA256,
+    ContainerError,
+    KeySlot,
+    write_key_slot,
+)
+from core.crypto import key_hierarchy, key_manager
+from core.paths import ENCRYPTED_DIR
+from decrypt_file import EncryptedBlob, unwrap_key_slot
+from encrypt_file import key_slot_fields
+from repositories import files_repo
+
+# Records are read and updated in batches of this many.
+BATCH_SIZE = 200
+
+_KEK_WRAP = WRAP_NAMES[WRAP_AES_KW_HKDF]
+
+
+def _plan(payload: Dict[str, Any]) -> Tuple[str, Dict[str, Any] | None, Callable[[], None] | None]:
+    """Decide what to do with one record.
+
+    Returns ``(status, fields, finalize)``: the fields to merge into the
+    record and a callback that rewrites files once they are committed.
+    """
+
+    uid = payload.get("uid")
+    file_name = payload.get("file_name") or payload.get("filename")
+    if not uid or not file_name:
+        return "invalid_record", None, None
+
+    encrypted_path = ENCRYPTED_DIR / f"{file_name}.enc"
+    if not encrypted_path.exists():
+        return "not_encrypted", None, None
+
+    try:
+        with EncryptedBlob(encrypted_path) as blob:
+            key_slot = blob.key_slot
+    except ContainerError:
+        return "unreadable", None, None
+
+    stored_kek = payload.get("key_wrap") == _KEK_WRAP
+    legacy_key_path = ENCRYPTED_DIR / f"{file_name}.key"
+    if key_slot is not None:
+        if key_slot.wrap_alg == WRAP_AES_KW_HKDF:
+            if stored_kek and payload.get("key_id") == key_slot.key_id:
+                return "already_migrated", None, None
+            # The file was migrated but its recovery copy was not.
+            return "synced", key_slot_fields(key_slot), None
+        rsa_slot = key_slot
+    elif stored_kek:
+        return "already_migrated", None, None
+    elif legacy_key_path.exists():
+        rsa_slot = KeySlot(WRAP_RSA_OAEP_SHA256, "", legacy_key_path.read_bytes())
+    elif payload.get("aes_key"):
+        try:
+            wrapped_key = base64.b64decode(payload["aes_key"], validate=True)
+        except ValueError:
+            return "unwrap_failed", None, None
+        rsa_slot = KeySlot(WRAP_RSA_OAEP_SHA256, "", wrapped_key)
+    else:
+        return "missing_key", None, None
+
+    try:
+        aes_key = unwrap_key_slot(rsa_slot, key_manager.private_key())
+    except ValueError:
+        return "unwrap_failed", None, None
+
+    key_id, wrapped_key = key_hierarchy.wrap(uid, aes_key)
+    kek_slot = KeySlot(WRAP_AES_KW_HKDF, key_id, wrapped_key)
+
+    def _finalize() -> None:
+        if key_slot is not None:
+            write_key_slot(encrypted_path, kek_slot)
+        legacy_key_path.unlink(missing_ok=True)
+
+    return "migrated", key_slot_fields(kek_slot), _finalize
+
+
+# (uid, file_name, fields to merge, finalize)
+PendingUpdate = Tuple[str, str, Dict[str, Any], Callable[[], None] | None]
+
+
+def pending_update(
+    payload: Dict[str, Any],
+    fields: Dict[str, Any],
+    finalize: Callable[[], None] | None,
+) -> PendingUpdate:
+    """Queue ``fields`` for the record ``payload`` was read from (``_plan``
+    only returns fields for records with a uid and file name)."""
+
+    return payload["uid"], payload.get("file_name") or payload["filename"], fields, finalize
+
+
+def commit_updates(pending: List[PendingUpdate]) -> None:
+    """Write the queued records (one ``set_many`` per user), then run their
+    file rewrites, so files never hold keys their records do not."""
+
+    by_user: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for uid, file_name, fields, _ in pending:
+        by_user.setdefault(uid, {})[file_name] = fields
+    for uid, updates in by_user.items():
+        files_repo.set_many(uid, updates)
+    for _, _, _, finalize in pending:
+        if finalize is not None:
+            finalize()
+    pending.clear()
+
+
+def migrate(uid: str | None = None, dry_run: bool = False) -> Dict[str, int]:
+    key_hierarchy.load()
+    counts: Counter[str] = Counter()
+    pending: List[PendingUpdate] = []
+    after = None
+    while True:
+        docs = files_repo.scan(uid, after, BATCH_SIZE)
+        for doc in docs:
+            status, fields, finalize = _plan(doc.data)
+            counts[status] += 1
+            if fields is not None and not dry_run:
+                pending.append(pending_update(doc.data, fields, finalize))
+        if pending:
+            commit_updates(pending)
+        if len(docs) < BATCH_SIZE:
+            break
+        after = docs[-1].id
+    return dict(counts)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uid", help="Only migrate this user's files")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change")
+    args = parser.parse_args(argv)
+
+    counts = migrate(uid=args.uid, dry_run=args.dry_run)
+    print(json.dumps({"dry_run": args.dry_run, "master_key_id": key_hierarchy.master_key_id(), **counts}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
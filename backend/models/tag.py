@@ -4,10 +4,9 @@ import sys
 from typing import Iterable
 
 from pydantic import BaseModel
-from firebase_admin_init import firebase_db
 
-
-TAGS_COLLECTION = "tags"
+from core.constants import METADATA_BACKEND, TAGS_COLLECTION
+from repositories import tags_repo
 
 class TagModel(BaseModel):
     tag_id: str
@@ -33,7 +32,7 @@ def _tag_id_from_name(tag_name: str) -> str:
 
 
 def seed_tags(tag_names: Iterable[str] = DEFAULT_TAG_NAMES) -> int:
-    """Create/merge the default tags into Firestore.
+    """Create/merge the default tags into the metadata store.
 
     Firestore doesn't require creating a table upfront; writing documents creates the
     collection automatically.
@@ -41,7 +40,6 @@ def seed_tags(tag_names: Iterable[str] = DEFAULT_TAG_NAMES) -> int:
     Returns the number of tags written.
     """
 
-    collection = firebase_db.collection(TAGS_COLLECTION)
     count = 0
 
     for name in tag_names:
@@ -50,7 +48,7 @@ def seed_tags(tag_names: Iterable[str] = DEFAULT_TAG_NAMES) -> int:
             continue
 
         tag = TagModel(tag_id=_tag_id_from_name(cleaned_name), tag_name=cleaned_name)
-        collection.document(tag.tag_id).set(tag.dict(), merge=True)
+        tags_repo.set(tag.tag_id, tag.dict(), merge=True)
         count += 1
 
     return count
@@ -58,4 +56,4 @@ def seed_tags(tag_names: Iterable[str] = DEFAULT_TAG_NAMES) -> int:
 
 if __name__ == "__main__":
     written = seed_tags()
-    print(f"Seeded {written} tags into Firestore collection '{TAGS_COLLECTION}'.")
+    print(f"Seeded {written} tags into {METADATA_BACKEND} collection '{TAGS_COLLECTION}'.")
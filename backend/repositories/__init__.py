@@ -0,0 +1,55 @@
+"""User, file and tag metadata storage, selected by ``METADATA_BACKEND``."""
+
+from __future__ import annotations
+
+from core.constants import METADATA_BACKEND, METADATA_CACHE_SIZE
+
+from .base import (
+    LIST_ORDER_FIELDS,
+    Document,
+    FileQuery,
+    FileRepository,
+    TagRepository,
+    UserRepository,
+    decode_cursor,
+    encode_cursor,
+    file_doc_id,
+)
+from .cache import CachedFileRepository
+
+if METADATA_BACKEND == "sqlite":
+    from core.paths import METADATA_DB_PATH
+
+    from .sqlite import SQLiteFileRepository, SQLiteMetadataStore, SQLiteTagRepository, SQLiteUserRepository
+
+    metadata_store = SQLiteMetadataStore(METADATA_DB_PATH)
+    files_repo: FileRepository = SQLiteFileRepository(metadata_store)
+    users_repo: UserRepository = SQLiteUserRepository(metadata_store)
+    tags_repo: TagRepository = SQLiteTagRepository(metadata_store)
+elif METADATA_BACKEND == "firestore":
+    from .firestore import FirestoreFileRepository, FirestoreTagRepository, FirestoreUserRepository
+
+    files_repo = FirestoreFileRepository()
+    users_repo = FirestoreUserRepository()
+    tags_repo = FirestoreTagRepository()
+else:
+    raise ValueError(f"Unknown METADATA_BACKEND {METADATA_BACKEND!r}; expected 'firestore' or 'sqlite'")
+
+if METADATA_CACHE_SIZE > 0:
+    files_repo = CachedFileRepository(files_repo)
+
+__all__ = [
+    "CachedFileRepository",
+    "Document",
+    "FileQuery",
+    "FileRepository",
+    "LIST_ORDER_FIELDS",
+    "TagRepository",
+    "UserRepository",
+    "decode_cursor",
+    "encode_cursor",
+    "file_doc_id",
+    "files_repo",
+    "tags_repo",
+    "users_repo",
+]
@@ -0,0 +1,196 @@
+"""Metadata repository interfaces."""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+# Fields a file listing can be ordered by.
+LIST_ORDER_FIELDS = ("file_name", "uploaded_at", "expiry_time", "size")
+
+
+class Document(NamedTuple):
+    id: str
+    data: Dict[str, Any]
+
+
+def file_doc_id(uid: str, file_name: str) -> str:
+    return f"{uid}:{file_name}"
+
+
+def encode_json_value(value: Any) -> Any:
+    """``json.dumps`` default: datetimes become ``{"$datetime": iso}``."""
+
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__} in metadata")
+
+
+def decode_json_object(item: Dict[str, Any]) -> Any:
+    """``json.loads`` object hook reversing ``encode_json_value``."""
+
+    if len(item) == 1 and "$datetime" in item:
+        return datetime.fromisoformat(item["$datetime"])
+    return item
+
+
+def encode_cursor(order_by: str, descending: bool, doc: Document) -> str:
+    """Opaque, URL-safe cursor resuming a listing after ``doc``."""
+
+    payload = json.dumps(
+        [order_by, descending, doc.data.get(order_by), doc.id],
+        default=encode_json_value,
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, bool, Any, str]:
+    """Return ``(order_by, descending, order value, document id)``; raises
+    ``ValueError`` for a cursor ``encode_cursor`` did not produce."""
+
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        order_by, descending, value, doc_id = json.loads(payload, object_hook=decode_json_object)
+    except (TypeError, binascii.Error) as exc:
+        raise ValueError("Malformed cursor") from exc
+    if order_by not in LIST_ORDER_FIELDS or not isinstance(descending, bool) or not isinstance(doc_id, str):
+        raise ValueError("Malformed cursor")
+    return order_by, descending, value, doc_id
+
+
+@dataclass(frozen=True)
+class FileQuery:
+    """One page of a user's file records, ordered by ``order_by`` then id.
+
+    ``after`` is ``(order value, document id)`` of the last record of the
+    previous page. Expiry ranges are ``[expires_after, expires_before)`` and
+    size ranges ``[min_size, max_size]``; a range filter must be on the
+    ``order_by`` field (a Firestore restriction). ``fields`` projects the
+    records (the ``order_by`` field is always included); ``None`` returns
+    every field.
+    """
+
+    uid: str
+    order_by: str = "file_name"
+    descending: bool = False
+    limit: int = 100
+    after: Tuple[Any, str] | None = None
+    tag_id: str | None = None
+    expires_after: datetime | None = None
+    expires_before: datetime | None = None
+    min_size: int | None = None
+    max_size: int | None = None
+    fields: Tuple[str, ...] | None = None
+
+    def projection(self) -> List[str] | None:
+        if self.fields is None:
+            return None
+        return sorted({*self.fields, self.order_by})
+
+
+class FileRepository(ABC):
+    """File records, one per ``(uid, file_name)``; ``file_name`` is already sanitized."""
+
+    @abstractmethod
+    def get(self, uid: str, file_name: str) -> Dict[str, Any] | None:
+        ...
+
+    @abstractmethod
+    def get_many(self, uid: str, file_names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch several records in one round trip; missing ones are left out."""
+
+    @abstractmethod
+    def set(self, uid: str, file_name: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        ...
+
+    @abstractmethod
+    def set_many(self, uid: str, updates: Dict[str, Dict[str, Any]]) -> None:
+        """Merge ``{file_name: fields}`` atomically (at most 500 records)."""
+
+    @abstractmethod
+    def list(self, uid: str) -> List[Document]:
+        ...
+
+    @abstractmethod
+    def query(self, query: FileQuery) -> List[Document]:
+        """Return up to ``query.limit`` records; see ``FileQuery``."""
+
+    @abstractmethod
+    def scan(self, uid: str | None = None, after: str | None = None, limit: int = 500) -> List[Document]:
+        """Page through every record (or only ``uid``'s) in document id order,
+        starting after the id ``after``; for maintenance jobs such as key
+        rotation."""
+
+    def watch(
+        self,
+        uid: str,
+        on_change: Callable[[str, Dict[str, Any] | None], None],
+    ) -> Callable[[], None] | None:
+        """Call ``on_change(file_name, record or None)`` whenever one of
+        ``uid``'s records changes; returns a function that stops watching, or
+        ``None`` if the backend cannot push changes."""
+
+        return None
+
+    def invalidate(self, uid: str, file_name: str) -> None:
+        """Make the next read of a record go to storage (no-op without a cache)."""
+
+    def close(self) -> None:
+        """Release background resources such as change listeners."""
+
+    async def aget(self, uid: str, file_name: str) -> Dict[str, Any] | None:
+        return await run_in_threadpool(self.get, uid, file_name)
+
+    async def aset(self, uid: str, file_name: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        await run_in_threadpool(self.set, uid, file_name, fields, merge)
+
+    async def alist(self, uid: str) -> List[Document]:
+        return await run_in_threadpool(self.list, uid)
+
+    async def aquery(self, query: FileQuery) -> List[Document]:
+        return await run_in_threadpool(self.query, query)
+
+
+class UserRepository(ABC):
+    """User profiles keyed by uid."""
+
+    @abstractmethod
+    def get(self, uid: str) -> Dict[str, Any] | None:
+        ...
+
+    @abstractmethod
+    def set(self, uid: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        ...
+
+    @abstractmethod
+    def set_many(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        """Merge ``{uid: fields}`` atomically (at most 500 records)."""
+
+    async def aget(self, uid: str) -> Dict[str, Any] | None:
+        return await run_in_threadpool(self.get, uid)
+
+    async def aset(self, uid: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        await run_in_threadpool(self.set, uid, fields, merge)
+
+
+class TagRepository(ABC):
+    """Tags keyed by tag id."""
+
+    @abstractmethod
+    def list(self) -> List[Document]:
+        ...
+
+    @abstractmethod
+    def set(self, tag_id: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        ...
+
+    async def alist(self) -> List[Document]:
+        return await run_in_threadpool(self.list)
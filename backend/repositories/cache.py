@@ -0,0 +1,302 @@
+"""Per-worker write-through cache in front of a ``FileRepository``."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from firebase_admin import firestore
+
+from core.constants import (
+    METADATA_CACHE_NEGATIVE_TTL_SECONDS,
+    METADATA_CACHE_SIZE,
+    METADATA_CACHE_TTL_SECONDS,
+    METADATA_CACHE_WATCH_USERS,
+)
+
+from .base import Document, FileQuery, FileRepository
+
+
+class CachedFileRepository(FileRepository):
+    """Bounded LRU cache of file records keyed by ``(uid, file_name)``.
+
+    Reads are served from memory until an entry's TTL runs out; missing
+    records are cached too (for ``negative_ttl_seconds``) so repeated 404s
+    cost nothing. Every write goes to ``backend`` first and is then applied to
+    the cached copy, with ``SERVER_TIMESTAMP`` approximated by the local clock.
+    A write whose result cannot be known locally (a merge into a record that
+    is not cached) drops the entry instead, as does a failed write.
+    ``list`` passes through and refreshes the entries of the listed records;
+    ``query`` passes through and refreshes them only for unprojected pages.
+
+    Records written by other workers are seen after at most a TTL, or at once
+    for up to ``watch_users`` recently active users when the backend can push
+    changes (Firestore ``on_snapshot``).
+    """
+
+    def __init__(
+        self,
+        backend: FileRepository,
+        max_entries: int = METADATA_CACHE_SIZE,
+        ttl_seconds: float = METADATA_CACHE_TTL_SECONDS,
+        negative_ttl_seconds: float = METADATA_CACHE_NEGATIVE_TTL_SECONDS,
+        watch_users: int = METADATA_CACHE_WATCH_USERS,
+    ) -> None:
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.watch_users = watch_users
+
+        self._lock = threading.Lock()
+        # (uid, file_name) -> (record or None if missing, expires at)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any] | None, float]]" = OrderedDict()
+        # Bumped by every write, so a read that raced a write is not cached.
+        self._version = 0
+        self._watches: "OrderedDict[str, Callable[[], None] | None]" = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.pushed = 0
+
+    def _lookup(self, cache_key: Tuple[str, str], now: float) -> Tuple[bool, Dict[str, Any] | None]:
+        """Under ``_lock``: return ``(hit, record copy)``."""
+
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        if entry[1] <= now:
+            del self._entries[cache_key]
+            self.expirations += 1
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(cache_key)
+        if entry[0] is None:
+            self.negative_hits += 1
+            return True, None
+        self.hits += 1
+        return True, dict(entry[0])
+
+    def _store(self, cache_key: Tuple[str, str], record: Dict[str, Any] | None) -> None:
+        """Under ``_lock``: cache ``record`` (``None`` = known to be missing)."""
+
+        ttl = self.ttl_seconds if record is not None else self.negative_ttl_seconds
+        if ttl <= 0:
+            self._entries.pop(cache_key, None)
+            return
+        self._entries[cache_key] = (dict(record) if record is not None else None, time.monotonic() + ttl)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _fill(self, uid: str, records: Dict[str, Dict[str, Any] | None], version: int) -> None:
+        with self._lock:
+            if version != self._version:
+                return
+            for file_name, record in records.items():
+                self._store((uid, file_name), record)
+        self._watch(uid)
+
+    def _apply(self, uid: str, updates: Dict[str, Dict[str, Any]], merge: bool) -> None:
+        """Under ``_lock``: mirror a successful write in the cached entries."""
+
+        now = None
+        for file_name, fields in updates.items():
+            resolved = {}
+            for name, value in fields.items():
+                if value is firestore.SERVER_TIMESTAMP:
+                    now = now or datetime.now(timezone.utc)
+                    value = now
+                resolved[name] = value
+
+            cache_key = (uid, file_name)
+            entry = self._entries.get(cache_key)
+            if not merge or (entry is not None and entry[0] is None):
+                self._store(cache_key, resolved)
+            elif entry is not None:
+                self._store(cache_key, {**entry[0], **resolved})
+
+    def _invalidate(self, uid: str, file_names: Iterable[str]) -> None:
+        with self._lock:
+            self._version += 1
+            for file_name in file_names:
+                if self._entries.pop((uid, file_name), None) is not None:
+                    self.invalidations += 1
+
+    def _watch(self, uid: str) -> None:
+        if self.watch_users <= 0:
+            return
+        with self._lock:
+            if uid in self._watches:
+                self._watches.move_to_end(uid)
+                return
+            # Reserve the slot before subscribing so concurrent misses subscribe once.
+            self._watches[uid] = None
+            stale = []
+            while len(self._watches) > self.watch_users:
+                stale.append(self._watches.popitem(last=False)[1])
+
+        for unsubscribe in stale:
+            if unsubscribe is not None:
+                unsubscribe()
+        try:
+            unsubscribe = self.backend.watch(uid, lambda file_name, record: self._pushed(uid, file_name, record))
+        except Exception:  # noqa: BLE001
+            unsubscribe = None
+        with self._lock:
+            if uid in self._watches:
+                self._watches[uid] = unsubscribe
+                return
+        # Evicted while subscribing.
+        if unsubscribe is not None:
+            unsubscribe()
+
+    def _pushed(self, uid: str, file_name: str, record: Dict[str, Any] | None) -> None:
+        with self._lock:
+            self._version += 1
+            self.pushed += 1
+            self._store((uid, file_name), record)
+
+    def close(self) -> None:
+        """Stop every change listener."""
+
+        with self._lock:
+            watches, self._watches = self._watches, OrderedDict()
+        for unsubscribe in watches.values():
+            if unsubscribe is not None:
+                unsubscribe()
+
+    def get(self, uid: str, file_name: str) -> Dict[str, Any] | None:
+        with self._lock:
+            hit, record = self._lookup((uid, file_name), time.monotonic())
+            version = self._version
+        if hit:
+            return record
+        record = self.backend.get(uid, file_name)
+        self._fill(uid, {file_name: record}, version)
+        return record
+
+    def get_many(self, uid: str, file_names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        now = time.monotonic()
+        with self._lock:
+            for file_name in dict.fromkeys(file_names):
+                hit, record = self._lookup((uid, file_name), now)
+                if not hit:
+                    missing.append(file_name)
+                elif record is not None:
+                    found[file_name] = record
+            version = self._version
+        if missing:
+            fetched = self.backend.get_many(uid, missing)
+            self._fill(uid, {name: fetched.get(name) for name in missing}, version)
+            found.update(fetched)
+        return found
+
+    def set(self, uid: str, file_name: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        try:
+            self.backend.set(uid, file_name, fields, merge=merge)
+        except BaseException:
+            self._invalidate(uid, [file_name])
+            raise
+        with self._lock:
+            self._version += 1
+            self._apply(uid, {file_name: fields}, merge)
+
+    def set_many(self, uid: str, updates: Dict[str, Dict[str, Any]]) -> None:
+        try:
+            self.backend.set_many(uid, updates)
+        except BaseException:
+            self._invalidate(uid, updates)
+            raise
+        with self._lock:
+            self._version += 1
+            self._apply(uid, updates, merge=True)
+
+    def _listed(self, uid: str, docs: List[Document], version: int) -> List[Document]:
+        prefix_length = len(uid) + 1
+        self._fill(uid, {doc.id[prefix_length:]: doc.data for doc in docs}, version)
+        return docs
+
+    def list(self, uid: str) -> List[Document]:
+        with self._lock:
+            version = self._version
+        return self._listed(uid, self.backend.list(uid), version)
+
+    def query(self, query: FileQuery) -> List[Document]:
+        with self._lock:
+            version = self._version
+        docs = self.backend.query(query)
+        return self._listed(query.uid, docs, version) if query.fields is None else docs
+
+    def scan(self, uid: str | None = None, after: str | None = None, limit: int = 500) -> List[Document]:
+        return self.backend.scan(uid, after, limit)
+
+    def watch(
+        self,
+        uid: str,
+        on_change: Callable[[str, Dict[str, Any] | None], None],
+    ) -> Callable[[], None] | None:
+        return self.backend.watch(uid, on_change)
+
+    def invalidate(self, uid: str, file_name: str) -> None:
+        self._invalidate(uid, [file_name])
+
+    async def aget(self, uid: str, file_name: str) -> Dict[str, Any] | None:
+        with self._lock:
+            hit, record = self._lookup((uid, file_name), time.monotonic())
+            version = self._version
+        if hit:
+            return record
+        record = await self.backend.aget(uid, file_name)
+        self._fill(uid, {file_name: record}, version)
+        return record
+
+    async def aset(self, uid: str, file_name: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        try:
+            await self.backend.aset(uid, file_name, fields, merge=merge)
+        except BaseException:
+            self._invalidate(uid, [file_name])
+            raise
+        with self._lock:
+            self._version += 1
+            self._apply(uid, {file_name: fields}, merge)
+
+    async def alist(self, uid: str) -> List[Document]:
+        with self._lock:
+            version = self._version
+        return self._listed(uid, await self.backend.alist(uid), version)
+
+    async def aquery(self, query: FileQuery) -> List[Document]:
+        with self._lock:
+            version = self._version
+        docs = await self.backend.aquery(query)
+        return self._listed(query.uid, docs, version) if query.fields is None else docs
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "negative_ttl_seconds": self.negative_ttl_seconds,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "watched_users": sum(1 for unsubscribe in self._watches.values() if unsubscribe is not None),
+                "pushed_changes": self.pushed,
+            }
@@ -0,0 +1,162 @@
+"""Firestore-backed metadata repositories (the default backend)."""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, List
+
+from firebase_admin import firestore
+
+from core.constants import FILES_COLLECTION, TAGS_COLLECTION, USERS_COLLECTION
+from firebase_admin_init import firebase_db, firebase_db_async
+
+from .base import Document, FileQuery, FileRepository, TagRepository, UserRepository, file_doc_id
+
+# Field path of the document id in ``order_by``/``start_after``.
+_DOCUMENT_ID = "__name__"
+
+
+def _file_query(client: Any, query: FileQuery) -> Any:
+    """Build ``query`` on ``client``'s files collection.
+
+    Each filter/order combination is served by a composite index in
+    ``firestore.indexes.json``; the implicit document-id order breaks ties, so
+    the page boundary is exact.
+    """
+
+    direction = firestore.Query.DESCENDING if query.descending else firestore.Query.ASCENDING
+    built = client.collection(FILES_COLLECTION).where("uid", "==", query.uid)
+    if query.tag_id is not None:
+        built = built.where("tag_id", "==", query.tag_id)
+    for value, field, operator in (
+        (query.expires_after, "expiry_time", ">="),
+        (query.expires_before, "expiry_time", "<"),
+        (query.min_size, "size", ">="),
+        (query.max_size, "size", "<="),
+    ):
+        if value is not None:
+            built = built.where(field, operator, value)
+    built = built.order_by(query.order_by, direction=direction).order_by(
+        _DOCUMENT_ID, direction=direction
+    )
+    projection = query.projection()
+    if projection is not None:
+        built = built.select(projection)
+    if query.after is not None:
+        value, doc_id = query.after
+        built = built.start_after({query.order_by: value, _DOCUMENT_ID: doc_id})
+    return built.limit(query.limit)
+
+
+class FirestoreFileRepository(FileRepository):
+    def _ref(self, uid: str, file_name: str) -> Any:
+        return firebase_db.collection(FILES_COLLECTION).document(file_doc_id(uid, file_name))
+
+    def _async_ref(self, uid: str, file_name: str) -> Any:
+        return firebase_db_async.collection(FILES_COLLECTION).document(file_doc_id(uid, file_name))
+
+    def get(self, uid: str, file_name: str) -> Dict[str, Any] | None:
+        snapshot = self._ref(uid, file_name).get()
+        return (snapshot.to_dict() or {}) if snapshot.exists else None
+
+    def get_many(self, uid: str, file_names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        refs = {file_doc_id(uid, name): name for name in file_names}
+        if not refs:
+            return {}
+        collection = firebase_db.collection(FILES_COLLECTION)
+        return {
+            refs[snapshot.id]: snapshot.to_dict() or {}
+            for snapshot in firebase_db.get_all([collection.document(doc_id) for doc_id in refs])
+            if snapshot.exists
+        }
+
+    def set(self, uid: str, file_name: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        self._ref(uid, file_name).set(fields, merge=merge)
+
+    def set_many(self, uid: str, updates: Dict[str, Dict[str, Any]]) -> None:
+        batch = firebase_db.batch()
+        for file_name, fields in updates.items():
+            batch.set(self._ref(uid, file_name), fields, merge=True)
+        batch.commit()
+
+    def list(self, uid: str) -> List[Document]:
+        query = firebase_db.collection(FILES_COLLECTION).where("uid", "==", uid)
+        return [Document(doc.id, doc.to_dict() or {}) for doc in query.stream()]
+
+    def query(self, query: FileQuery) -> List[Document]:
+        return [Document(doc.id, doc.to_dict() or {}) for doc in _file_query(firebase_db, query).stream()]
+
+    def scan(self, uid: str | None = None, after: str | None = None, limit: int = 500) -> List[Document]:
+        query = firebase_db.collection(FILES_COLLECTION)
+        if uid is not None:
+            query = query.where("uid", "==", uid)
+        query = query.order_by(_DOCUMENT_ID)
+        if after is not None:
+            query = query.start_after({_DOCUMENT_ID: after})
+        return [Document(doc.id, doc.to_dict() or {}) for doc in query.limit(limit).stream()]
+
+    def watch(
+        self,
+        uid: str,
+        on_change: Callable[[str, Dict[str, Any] | None], None],
+    ) -> Callable[[], None] | None:
+        prefix = file_doc_id(uid, "")
+
+        def _on_snapshot(_docs: Any, changes: Any, _read_time: Any) -> None:
+            for change in changes:
+                document = change.document
+                if not document.id.startswith(prefix):
+                    continue
+                removed = change.type.name == "REMOVED"
+                on_change(document.id[len(prefix):], None if removed else document.to_dict() or {})
+
+        query = firebase_db.collection(FILES_COLLECTION).where("uid", "==", uid)
+        return query.on_snapshot(_on_snapshot).unsubscribe
+
+    async def aget(self, uid: str, file_name: str) -> Dict[str, Any] | None:
+        snapshot = await self._async_ref(uid, file_name).get()
+        return (snapshot.to_dict() or {}) if snapshot.exists else None
+
+    async def aset(self, uid: str, file_name: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        await self._async_ref(uid, file_name).set(fields, merge=merge)
+
+    async def alist(self, uid: str) -> List[Document]:
+        query = firebase_db_async.collection(FILES_COLLECTION).where("uid", "==", uid)
+        return [Document(doc.id, doc.to_dict() or {}) async for doc in query.stream()]
+
+    async def aquery(self, query: FileQuery) -> List[Document]:
+        built = _file_query(firebase_db_async, query)
+        return [Document(doc.id, doc.to_dict() or {}) async for doc in built.stream()]
+
+
+class FirestoreUserRepository(UserRepository):
+    def get(self, uid: str) -> Dict[str, Any] | None:
+        snapshot = firebase_db.collection(USERS_COLLECTION).document(uid).get()
+        return (snapshot.to_dict() or {}) if snapshot.exists else None
+
+    def set(self, uid: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        firebase_db.collection(USERS_COLLECTION).document(uid).set(fields, merge=merge)
+
+    def set_many(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        batch = firebase_db.batch()
+        for uid, fields in updates.items():
+            batch.set(firebase_db.collection(USERS_COLLECTION).document(uid), fields, merge=True)
+        batch.commit()
+
+    async def aget(self, uid: str) -> Dict[str, Any] | None:
+        snapshot = await firebase_db_async.collection(USERS_COLLECTION).document(uid).get()
+        return (snapshot.to_dict() or {}) if snapshot.exists else None
+
+    async def aset(self, uid: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        await firebase_db_async.collection(USERS_COLLECTION).document(uid).set(fields, merge=merge)
+
+
+class FirestoreTagRepository(TagRepository):
+    def list(self) -> List[Document]:
+        return [Document(doc.id, doc.to_dict() or {}) for doc in firebase_db.collection(TAGS_COLLECTION).stream()]
+
+    def set(self, tag_id: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        firebase_db.collection(TAGS_COLLECTION).document(tag_id).set(fields, merge=merge)
+
+    async def alist(self) -> List[Document]:
+        query = firebase_db_async.collection(TAGS_COLLECTION)
+        return [Document(doc.id, doc.to_dict() or {}) async for doc in query.stream()]
@@ -0,0 +1,330 @@
+"""Embedded SQLite metadata repositories (``METADATA_BACKEND=sqlite``).
+
+Everything lives in one database file in WAL mode, so readers never wait for
+the writer and lookups stay local and sub-millisecond; it is meant for
+single-host deployments, load tests and running the API offline. Each record
+is stored as JSON next to the columns it is queried by: files have one index per
+``FileRepository.query`` ordering (``file_name``, ``uploaded_at``,
+``expiry_time`` or ``size``, then id), with and without a ``tag_id`` prefix,
+matching the Firestore composite indexes.
+
+``firestore.SERVER_TIMESTAMP`` is replaced by the current UTC time, and
+datetimes round-trip as timezone-aware ``datetime`` objects like Firestore
+timestamps do.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+from firebase_admin import firestore
+
+from .base import (
+    Document,
+    FileQuery,
+    FileRepository,
+    TagRepository,
+    UserRepository,
+    decode_json_object,
+    encode_json_value,
+    file_doc_id,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    uid TEXT NOT NULL,
+    file_name TEXT,
+    tag_id TEXT,
+    uploaded_at TEXT,
+    expiry_time TEXT,
+    size INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_uid_name ON files (uid, file_name, id);
+CREATE INDEX IF NOT EXISTS files_uid_uploaded ON files (uid, uploaded_at, id);
+CREATE INDEX IF NOT EXISTS files_uid_expiry ON files (uid, expiry_time, id);
+CREATE INDEX IF NOT EXISTS files_uid_size ON files (uid, size, id);
+CREATE INDEX IF NOT EXISTS files_uid_tag_name ON files (uid, tag_id, file_name, id);
+CREATE INDEX IF NOT EXISTS files_uid_tag_uploaded ON files (uid, tag_id, uploaded_at, id);
+CREATE INDEX IF NOT EXISTS files_uid_tag_expiry ON files (uid, tag_id, expiry_time, id);
+CREATE INDEX IF NOT EXISTS files_uid_tag_size ON files (uid, tag_id, size, id);
+CREATE TABLE IF NOT EXISTS users (uid TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS tags (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+"""
+
+# Seconds a writer waits for another process's transaction before failing.
+BUSY_TIMEOUT_SECONDS = 5.0
+# SQLite caps bound parameters per statement (999 on older builds).
+MAX_QUERY_PARAMS = 900
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=encode_json_value, separators=(",", ":"))
+
+
+def _loads(text: str) -> Dict[str, Any]:
+    return json.loads(text, object_hook=decode_json_object)
+
+
+def _resolve(fields: Dict[str, Any]) -> Dict[str, Any]:
+    now = None
+    resolved = {}
+    for name, value in fields.items():
+        if value is firestore.SERVER_TIMESTAMP:
+            now = now or datetime.now(timezone.utc)
+            value = now
+        resolved[name] = value
+    return resolved
+
+
+def _sortable_time(value: Any) -> str | None:
+    """Index form of a timestamp: UTC ISO-8601 so string order is time order.
+    Naive datetimes are taken as UTC, as Firestore does."""
+
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat(timespec="microseconds")
+    return None
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+# Column each orderable field is stored in, and how a value is put in index form.
+_ORDER_COLUMNS = {
+    "file_name": _identity,
+    "uploaded_at": _sortable_time,
+    "expiry_time": _sortable_time,
+    "size": lambda value: value if isinstance(value, int) else None,
+}
+
+
+def _after(column: str, descending: bool, value: Any, doc_id: str) -> tuple[str, tuple[Any, ...]]:
+    """Keyset condition for rows after ``(value, doc_id)``. NULLs sort first
+    ascending and last descending, in SQLite and Firestore alike."""
+
+    if descending:
+        if value is None:
+            return f"({column} IS NULL AND id < ?)", (doc_id,)
+        return f"({column} < ? OR ({column} = ? AND id < ?) OR {column} IS NULL)", (value, value, doc_id)
+    if value is None:
+        return f"(({column} IS NULL AND id > ?) OR {column} IS NOT NULL)", (doc_id,)
+    return f"({column} > ? OR ({column} = ? AND id > ?))", (value, value, doc_id)
+
+
+class SQLiteMetadataStore:
+    """Owns the database file and hands each thread its own connection."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit; writes open explicit ``BEGIN IMMEDIATE`` transactions.
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    connection.executescript(_SCHEMA)
+                    self._schema_ready = True
+            self._local.connection = connection
+        return connection
+
+    def write(self, statements: Iterable[tuple[str, tuple[Any, ...]]]) -> None:
+        """Run ``statements`` in one transaction.
+
+        ``statements`` may be a generator; it is consumed inside the
+        transaction, so the reads it does for merges see the latest data.
+        """
+
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                connection.execute(sql, params)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+
+class SQLiteFileRepository(FileRepository):
+    def __init__(self, store: SQLiteMetadataStore) -> None:
+        self.store = store
+
+    def get(self, uid: str, file_name: str) -> Dict[str, Any] | None:
+        row = self.store.connection().execute(
+            "SELECT data FROM files WHERE id = ?", (file_doc_id(uid, file_name),)
+        ).fetchone()
+        return _loads(row[0]) if row is not None else None
+
+    def get_many(self, uid: str, file_names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        ids = {file_doc_id(uid, name): name for name in file_names}
+        keys = list(ids)
+        records: Dict[str, Dict[str, Any]] = {}
+        connection = self.store.connection()
+        for start in range(0, len(keys), MAX_QUERY_PARAMS):
+            chunk = keys[start:start + MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            for doc_id, data in connection.execute(
+                f"SELECT id, data FROM files WHERE id IN ({placeholders})", chunk
+            ):
+                records[ids[doc_id]] = _loads(data)
+        return records
+
+    def _upsert(
+        self,
+        uid: str,
+        file_name: str,
+        fields: Dict[str, Any],
+        merge: bool,
+    ) -> tuple[str, tuple[Any, ...]]:
+        # Runs inside the write transaction, so the merge cannot lose an update.
+        data = _resolve(fields)
+        if merge:
+            current = self.get(uid, file_name)
+            if current is not None:
+                data = {**current, **data}
+        size = data.get("size")
+        return (
+            "INSERT OR REPLACE INTO files (id, uid, file_name, tag_id, uploaded_at, expiry_time, size, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                file_doc_id(uid, file_name),
+                data.get("uid") or uid,
+                data.get("file_name") or data.get("filename") or file_name,
+                data.get("tag_id") or data.get("tad_id"),
+                _sortable_time(data.get("uploaded_at")),
+                _sortable_time(data.get("expiry_time")),
+                size if isinstance(size, int) else None,
+                _dumps(data),
+            ),
+        )
+
+    def set(self, uid: str, file_name: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        self.set_many(uid, {file_name: fields}, merge=merge)
+
+    def set_many(self, uid: str, updates: Dict[str, Dict[str, Any]], merge: bool = True) -> None:
+        self.store.write(self._upsert(uid, name, fields, merge) for name, fields in updates.items())
+
+    def list(self, uid: str) -> List[Document]:
+        rows = self.store.connection().execute("SELECT id, data FROM files WHERE uid = ?", (uid,))
+        return [Document(doc_id, _loads(data)) for doc_id, data in rows]
+
+    def query(self, query: FileQuery) -> List[Document]:
+        column = query.order_by
+        to_index = _ORDER_COLUMNS[column]
+        # Like Firestore, leave out records without the order field (a null one still counts).
+        conditions = ["uid = ?", f"json_type(data, '$.{column}') IS NOT NULL"]
+        params: List[Any] = [query.uid]
+        if query.tag_id is not None:
+            conditions.append("tag_id = ?")
+            params.append(query.tag_id)
+        for bound, operator in (
+            (_sortable_time(query.expires_after), "expiry_time >= ?"),
+            (_sortable_time(query.expires_before), "expiry_time < ?"),
+            (query.min_size, "size >= ?"),
+            (query.max_size, "size <= ?"),
+        ):
+            if bound is not None:
+                conditions.append(operator)
+                params.append(bound)
+        if query.after is not None:
+            value, doc_id = query.after
+            condition, after_params = _after(column, query.descending, to_index(value), doc_id)
+            conditions.append(condition)
+            params.extend(after_params)
+
+        direction = "DESC" if query.descending else "ASC"
+        rows = self.store.connection().execute(
+            f"SELECT id, data FROM files WHERE {' AND '.join(conditions)} "
+            f"ORDER BY {column} {direction}, id {direction} LIMIT ?",
+            (*params, query.limit),
+        )
+        projection = query.projection()
+        docs = []
+        for doc_id, data in rows:
+            record = _loads(data)
+            if projection is not None:
+                record = {name: record[name] for name in projection if name in record}
+            docs.append(Document(doc_id, record))
+        return docs
+
+    def scan(self, uid: str | None = None, after: str | None = None, limit: int = 500) -> List[Document]:
+        conditions = ["id > ?"]
+        params: List[Any] = [after or ""]
+        if uid is not None:
+            conditions.append("uid = ?")
+            params.append(uid)
+        rows = self.store.connection().execute(
+            f"SELECT id, data FROM files WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+            (*params, limit),
+        )
+        return [Document(doc_id, _loads(data)) for doc_id, data in rows]
+
+
+class _KeyedRepository:
+    """Shared storage for the single-key ``users`` and ``tags`` tables."""
+
+    _table = ""
+    _key = ""
+
+    def __init__(self, store: SQLiteMetadataStore) -> None:
+        self.store = store
+
+    def _get(self, key: str) -> Dict[str, Any] | None:
+        row = self.store.connection().execute(
+            f"SELECT data FROM {self._table} WHERE {self._key} = ?", (key,)
+        ).fetchone()
+        return _loads(row[0]) if row is not None else None
+
+    def _upsert(self, key: str, fields: Dict[str, Any], merge: bool) -> tuple[str, tuple[Any, ...]]:
+        data = _resolve(fields)
+        if merge:
+            current = self._get(key)
+            if current is not None:
+                data = {**current, **data}
+        return f"INSERT OR REPLACE INTO {self._table} ({self._key}, data) VALUES (?, ?)", (key, _dumps(data))
+
+    def _set_many(self, updates: Dict[str, Dict[str, Any]], merge: bool = True) -> None:
+        self.store.write(self._upsert(key, fields, merge) for key, fields in updates.items())
+
+
+class SQLiteUserRepository(_KeyedRepository, UserRepository):
+    _table = "users"
+    _key = "uid"
+
+    def get(self, uid: str) -> Dict[str, Any] | None:
+        return self._get(uid)
+
+    def set(self, uid: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        self._set_many({uid: fields}, merge=merge)
+
+    def set_many(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        self._set_many(updates)
+
+
+class SQLiteTagRepository(_KeyedRepository, TagRepository):
+    _table = "tags"
+    _key = "id"
+
+    def list(self) -> List[Document]:
+        rows = self.store.connection().execute("SELECT id, data FROM tags")
+        return [Document(tag_id, _loads(data)) for tag_id, data in rows]
+
+    def set(self, tag_id: str, fields: Dict[str, Any], merge: bool = True) -> None:
+        self._set_many({tag_id: fields}, merge=merge)
@@ -0,0 +1,296 @@
+"""Rotate the RSA key pair and/or the master key without re-encrypting files.
+
+Staging (``--new-rsa-key``, ``--new-master-key``) retires the current key into
+``keys/retired`` and installs a fresh one; the running app keeps opening files
+wrapped under retired keys, so nothing becomes unreadable. The job then pages
+through the file records (``files_repo``, so either ``METADATA_BACKEND``) and
+re-wraps every data key still wrapped under a retired key with the current
+one:
+
+- key slots are rewritten in place (the ciphertext is untouched);
+- the recovery copy in the record is updated in batched writes, before any file;
+- legacy ``.key`` files are replaced by an identified ``aes_key`` in the record.
+
+Cost is proportional to the number of records, not to the stored bytes.
+Progress is checkpointed after every page, so an interrupted run resumes where
+it stopped. Files uploaded by app processes that had not yet noticed the new
+keys are picked up by a second run; once a run re-wraps nothing, the files in
+``keys/retired`` are no longer needed.
+
+Run from the ``backend`` directory::
+
+    python rotate_keys.py [--new-rsa-key] [--new-master-key] [--uid UID]
+        [--workers N] [--rate RECORDS_PER_SECOND] [--page-size N]
+        [--checkpoint PATH] [--restart] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+from core.container import (
+    WRAP_AES_KW_HKDF,
+    WRAP_NAMES,
+    WRAP_RSA_OAEP_SHA256,
+    ContainerError,
+    KeySlot,
+    write_key_slot,
+)
+from core.crypto import key_hierarchy, key_manager
+from core.paths import ENCRYPTED_DIR, KEYS_DIR
+from decrypt_file import EncryptedBlob, unwrap_key_slot
+from encrypt_file import key_slot_fields, wrap_key_slot
+from migrate_keys import BATCH_SIZE, commit_updates, pending_update
+from repositories import files_repo
+
+DEFAULT_CHECKPOINT_PATH = KEYS_DIR / "rotation_checkpoint.json"
+DEFAULT_WORKERS = 4
+
+
+class RateLimiter:
+    """Spaces successive ``wait`` calls at least ``1 / rate`` seconds apart."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+def _is_current(key_slot: KeySlot) -> bool:
+    if key_slot.wrap_alg == WRAP_AES_KW_HKDF:
+        return key_slot.key_id == key_hierarchy.master_key_id()
+    return key_slot.key_id == key_manager.key_id()
+
+
+def _stored_key_slot(payload: Dict[str, Any], legacy_key_path: Path) -> KeySlot | None:
+    """Key slot of a file without an embedded one (mirrors ``routes.files._key_slot``)."""
+
+    stored_aes_key = payload.get("aes_key")
+    if stored_aes_key and payload.get("key_wrap") == WRAP_NAMES[WRAP_AES_KW_HKDF]:
+        wrap_alg = WRAP_AES_KW_HKDF
+    elif legacy_key_path.exists():
+        return KeySlot(WRAP_RSA_OAEP_SHA256, "", legacy_key_path.read_bytes())
+    elif stored_aes_key:
+        wrap_alg = WRAP_RSA_OAEP_SHA256
+    else:
+        return None
+    return KeySlot(wrap_alg, payload.get("key_id") or "", base64.b64decode(stored_aes_key, validate=True))
+
+
+def _plan(payload: Dict[str, Any]) -> Tuple[str, Dict[str, Any] | None, Callable[[], None] | None]:
+    """Decide what to do with one record.
+
+    Returns ``(status, fields, finalize)`` like ``migrate_keys._plan``.
+    Keys keep their wrapping scheme: RSA-wrapped keys are re-wrapped with the
+    current public key, KEK-wrapped keys under the current master key.
+    """
+
+    uid = payload.get("uid")
+    file_name = payload.get("file_name") or payload.get("filename")
+    if not uid or not file_name:
+        return "invalid_record", None, None
+
+    encrypted_path = ENCRYPTED_DIR / f"{file_name}.enc"
+    if not encrypted_path.exists():
+        return "not_encrypted", None, None
+
+    try:
+        with EncryptedBlob(encrypted_path) as blob:
+            key_slot = blob.key_slot
+    except ContainerError:
+        return "unreadable", None, None
+
+    legacy_key_path = ENCRYPTED_DIR / f"{file_name}.key"
+    if key_slot is not None:
+        if _is_current(key_slot):
+            fields = key_slot_fields(key_slot)
+            if all(payload.get(name) == value for name, value in fields.items()):
+                return "current", None, None
+            # Rewritten on disk by an earlier, interrupted run.
+            return "synced", fields, None
+        source = key_slot
+    else:
+        try:
+            source = _stored_key_slot(payload, legacy_key_path)
+        except ValueError:
+            return "unwrap_failed", None, None
+        if source is None:
+            return "missing_key", None, None
+        if _is_current(source):
+            return "current", None, None
+
+    try:
+        aes_key = unwrap_key_slot(source, key_manager.private_key(), uid)
+    except (ContainerError, ValueError):
+        return "unwrap_failed", None, None
+
+    if source.wrap_alg == WRAP_AES_KW_HKDF:
+        new_slot = wrap_key_slot(aes_key, None, uid, scheme="kek")
+    else:
+        new_slot = wrap_key_slot(aes_key, key_manager.public_key(), scheme="rsa")
+
+    def _finalize() -> None:
+        if key_slot is not None:
+            write_key_slot(encrypted_path, new_slot)
+        legacy_key_path.unlink(missing_ok=True)
+
+    return "rewrapped", key_slot_fields(new_slot), _finalize
+
+
+def stage(new_rsa_key: bool, new_master_key: bool) -> None:
+    """Retire and replace the requested keys.
+
+    The master key file (and every retired one) is re-wrapped under the
+    current RSA public key, so an RSA rotation alone never touches file keys
+    that are wrapped under the master key.
+    """
+
+    key_hierarchy.load()
+    if new_rsa_key:
+        key_manager.rotate()
+    key_hierarchy.rotate(new_master=new_master_key)
+
+
+def _load_checkpoint(path: Path, target: Dict[str, Any]) -> Dict[str, Any] | None:
+    if not path.exists():
+        return None
+    state = json.loads(path.read_text())
+    if state.get("target") != target or state.get("done"):
+        return None
+    return state
+
+
+def _save_checkpoint(path: Path, state: Dict[str, Any]) -> None:
+    partial_path = path.with_name(f"{path.name}.part")
+    partial_path.write_text(json.dumps(state, indent=2))
+    os.replace(partial_path, path)
+
+
+def rotate(
+    uid: str | None = None,
+    workers: int = DEFAULT_WORKERS,
+    rate: float = 0.0,
+    page_size: int = BATCH_SIZE,
+    checkpoint_path: Path = DEFAULT_CHECKPOINT_PATH,
+    dry_run: bool = False,
+    restart: bool = False,
+) -> Dict[str, Any]:
+    """Re-wrap every stale data key; returns per-status counts and throughput.
+
+    ``rate`` caps the records processed per second (0 means unlimited) and
+    ``page_size`` is both the read page and the write batch size.
+    """
+
+    key_manager.reload()
+    target = {
+        "rsa_key_id": key_manager.key_id(),
+        "master_key_id": key_hierarchy.load(),
+        "uid": uid,
+    }
+
+    state = None if restart or dry_run else _load_checkpoint(checkpoint_path, target)
+    counts: Counter[str] = Counter(state["counts"]) if state else Counter()
+    processed = state["records"] if state else 0
+    # Records are paged in document id order, so resuming after the
+    # checkpointed id works even if that record has since been deleted.
+    cursor = state.get("last_doc_id") if state else None
+
+    limiter = RateLimiter(rate)
+    started = time.monotonic()
+    resumed_from = processed
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while True:
+            docs = files_repo.scan(uid, cursor, page_size)
+            if not docs:
+                break
+
+            futures = []
+            for doc in docs:
+                limiter.wait()
+                futures.append(pool.submit(_plan, doc.data))
+
+            pending = []
+            for doc, future in zip(docs, futures):
+                status, fields, finalize = future.result()
+                counts[status] += 1
+                if fields is not None and not dry_run:
+                    pending.append(pending_update(doc.data, fields, finalize))
+            if pending:
+                commit_updates(pending)
+
+            cursor = docs[-1].id
+            processed += len(docs)
+            if not dry_run:
+                _save_checkpoint(
+                    checkpoint_path,
+                    {"target": target, "last_doc_id": cursor, "records": processed, "counts": counts, "done": False},
+                )
+            if len(docs) < page_size:
+                break
+
+    if not dry_run:
+        _save_checkpoint(
+            checkpoint_path,
+            {"target": target, "last_doc_id": None, "records": processed, "counts": counts, "done": True},
+        )
+
+    elapsed = time.monotonic() - started
+    return {
+        **target,
+        "records": processed,
+        "records_per_second": round((processed - resumed_from) / elapsed, 1) if elapsed else None,
+        **counts,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--new-rsa-key", action="store_true", help="Retire keys/private.pem and generate a new pair")
+    parser.add_argument("--new-master-key", action="store_true", help="Retire the master key and generate a new one")
+    parser.add_argument("--uid", help="Only re-wrap this user's files")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Records unwrapped in parallel")
+    parser.add_argument("--rate", type=float, default=0.0, help="Max records per second (0 = unlimited)")
+    parser.add_argument("--page-size", type=int, default=BATCH_SIZE, help="Records per page and write batch (max 500)")
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT_PATH, help="Progress file")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start a new pass")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change")
+    args = parser.parse_args(argv)
+
+    if args.dry_run and (args.new_rsa_key or args.new_master_key):
+        parser.error("--dry-run cannot be combined with staging a new key")
+    if not 1 <= args.page_size <= 500:
+        parser.error("--page-size must be between 1 and 500")
+
+    if args.new_rsa_key or args.new_master_key:
+        stage(args.new_rsa_key, args.new_master_key)
+
+    result = rotate(
+        uid=args.uid,
+        workers=args.workers,
+        rate=args.rate,
+        page_size=args.page_size,
+        checkpoint_path=args.checkpoint,
+        dry_run=args.dry_run,
+        restart=args.restart,
+    )
+    print(json.dumps({"dry_run": args.dry_run, **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
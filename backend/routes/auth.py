@@ -2,20 +2,54 @@ from __future__ import annotations
 
 from typing import Any, Dict
 
-from fastapi import APIRouter, Body, Depends
-
-from core.security import UserContext, get_current_user, _verify_token, _build_user_context
+from fastapi import APIRouter, Body, Depends, HTTPException
+
+from core.security import (
+    SessionGrant,
+    UserContext,
+    get_current_user,
+    get_current_user_async,
+    token_cache,
+    _build_user_context,
+    _sync_user_profile,
+    _verify_token,
+)
+from core.sessions import session_tokens
+from firebase_admin_init import firebase_auth
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post("/verify")
-def verify_token(id_token: str = Body(..., embed=True)) -> UserContext:
+def verify_token(id_token: str = Body(..., embed=True)) -> SessionGrant:
+    """Verify a Firebase ID token once and exchange it for a session token."""
+
     decoded = _verify_token(id_token)
-    return _build_user_context(decoded)
+    try:
+        # Refuses ID tokens issued before a logout, including one handled by another worker.
+        session_token, expires_at = session_tokens.issue(decoded)
+    except ValueError as exc:
+        raise HTTPException(status_code=401, detail="Invalid or expired token") from exc
+    _sync_user_profile(decoded)
+    return SessionGrant(
+        **_build_user_context(decoded).dict(),
+        session_token=session_token,
+        expires_at=expires_at,
+    )
 
 
 @router.get("/me")
-def auth_me(current_user: UserContext = Depends(get_current_user)) -> UserContext:
+async def auth_me(current_user: UserContext = Depends(get_current_user_async)) -> UserContext:
     return current_user
+
+
+@router.post("/logout")
+def auth_logout(current_user: UserContext = Depends(get_current_user)) -> Dict[str, Any]:
+    """Sign the user out everywhere: revoke their refresh tokens, cached ID
+    tokens and session tokens."""
+
+    firebase_auth.revoke_refresh_tokens(current_user.uid)
+    token_cache.revoke(current_user.uid)
+    session_tokens.revoke_user(current_user.uid)
+    return {"revoked": True}
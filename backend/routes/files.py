@@ -2,29 +2,40 @@ from __future__ import annotations
 
 import base64
 import json
+import mimetypes
 from datetime import datetime
+from email.utils import formatdate
 from pathlib import Path
+from secrets import token_bytes, token_hex
 from typing import Any, Dict, Tuple
 
-from fastapi import APIRouter, Body, Depends, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Body, Depends, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from firebase_admin import firestore
 
-from core.constants import FILES_COLLECTION, MAX_UPLOAD_FILES
-from core.crypto import ensure_rsa_keys
+from core.compression import choose_codec, compression_stats
+from core.constants import DEFAULT_LIST_PAGE_SIZE, MAX_BATCH_FILES, MAX_LIST_PAGE_SIZE, MAX_UPLOAD_FILES
+from core.container import (
+    WRAP_AES_KW_HKDF,
+    WRAP_NAMES,
+    WRAP_RSA_OAEP_SHA256,
+    ContainerError,
+    KeySlot,
+    SegmentWriter,
+)
+from core.crypto import data_key_cache, key_manager
+from core.executor import CryptoQueueFull, crypto_executor, decrypt_job, encrypt_job
 from core.paths import (
     DECRYPTED_DIR,
     ENCRYPTED_DIR,
-    PRIVATE_KEY_PATH,
-    PUBLIC_KEY_PATH,
     UPLOADS_DIR,
 )
-from core.security import UserContext, get_current_user
-from decrypt_file import decrypt_file
-from encrypt_file import encrypt_file
-from firebase_admin_init import firebase_db
+from core.security import UserContext, get_current_user, get_current_user_async
+from decrypt_file import EncryptedBlob, unwrap_key_slot
+from encrypt_file import CHUNK_SIZE, key_slot_fields, wrap_key_slot
 from models.files import FileModel
-from models.tag import TAGS_COLLECTION
+from repositories import LIST_ORDER_FIELDS, Document, FileQuery, decode_cursor, encode_cursor, files_repo, tags_repo
 
 
 router = APIRouter(tags=["files"])
@@ -44,20 +55,31 @@ def sanitize_filename(filename: str) -> str:
     return safe_name
 
 
-def _file_doc_ref(uid: str, filename: str) -> Tuple[str, Any]:
-    safe_name = sanitize_filename(filename)
-    doc_id = f"{uid}:{safe_name}"
-    return safe_name, firebase_db.collection(FILES_COLLECTION).document(doc_id)
-
-
 def _serialize_timestamp(value: Any) -> Any:
     if isinstance(value, datetime):
         return value.isoformat()
     return value
 
 
-def _serialize_file_doc(doc: Any) -> Dict[str, Any]:
-    payload = doc.to_dict() or {}
+# Fields a paginated /files listing may return; the wrapped ``aes_key`` is never listed.
+LISTED_FILE_FIELDS = (
+    "uid",
+    "file_name",
+    "size",
+    "uploaded_at",
+    "last_opemed_at",
+    "expiry_time",
+    "tag_id",
+    "tad_id",
+    "advance_security",
+    "advance_seciroty",
+    "key_wrap",
+    "key_id",
+)
+
+
+def _serialize_file_doc(doc: Document) -> Dict[str, Any]:
+    payload = dict(doc.data)
     payload["id"] = doc.id
     for field in ("uploaded_at", "last_opemed_at", "expiry_time"):
         if field in payload:
@@ -65,6 +87,227 @@ def _serialize_file_doc(doc: Any) -> Dict[str, Any]:
     return payload
 
 
+def _open_blob(base_name: str) -> EncryptedBlob:
+    try:
+        return EncryptedBlob(ENCRYPTED_DIR / f"{base_name}.enc")
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail="Encrypted file not found") from exc
+    except ContainerError as exc:
+        raise HTTPException(status_code=500, detail="Encrypted file failed integrity check") from exc
+
+
+def _key_slot(base_name: str, blob: EncryptedBlob, doc_payload: Dict[str, Any]) -> KeySlot:
+    """Return the wrapped data key for a file.
+
+    Containers carry it in their header. Legacy blobs fall back to the
+    Firestore copy once it has been migrated to a KEK, otherwise to their
+    ``.key`` file or the RSA-wrapped Firestore copy. The Firestore copy is used
+    in memory and never written back to disk.
+    """
+
+    if blob.key_slot is not None:
+        return blob.key_slot
+
+    legacy_key_path = ENCRYPTED_DIR / f"{base_name}.key"
+    stored_aes_key = doc_payload.get("aes_key")
+    wrap_alg = WRAP_RSA_OAEP_SHA256
+    if stored_aes_key and doc_payload.get("key_wrap") == WRAP_NAMES[WRAP_AES_KW_HKDF]:
+        wrap_alg = WRAP_AES_KW_HKDF
+        wrapped_key = _decode_stored_key(stored_aes_key)
+    elif legacy_key_path.exists():
+        # ``.key`` files predate key ids; the Firestore ``key_id`` describes ``aes_key``.
+        return KeySlot(wrap_alg=wrap_alg, key_id="", wrapped_key=legacy_key_path.read_bytes())
+    elif stored_aes_key:
+        wrapped_key = _decode_stored_key(stored_aes_key)
+    else:
+        raise HTTPException(status_code=404, detail="Encrypted AES key not found")
+    return KeySlot(wrap_alg=wrap_alg, key_id=doc_payload.get("key_id") or "", wrapped_key=wrapped_key)
+
+
+def _file_key_slot(uid: str, base_name: str, blob: EncryptedBlob, doc_payload: Dict[str, Any]) -> KeySlot:
+    """``_key_slot``, re-reading the record once if it has no usable key.
+
+    The record may be a cached copy from before ``migrate_keys.py`` or
+    ``rotate_keys.py`` moved a legacy key into Firestore and removed its
+    ``.key`` file.
+    """
+
+    try:
+        return _key_slot(base_name, blob, doc_payload)
+    except HTTPException as exc:
+        if exc.status_code != 404:
+            raise
+    files_repo.invalidate(uid, base_name)
+    return _key_slot(base_name, blob, files_repo.get(uid, base_name) or {})
+
+
+def _decode_stored_key(stored_aes_key: str) -> bytes:
+    try:
+        return base64.b64decode(stored_aes_key, validate=True)
+    except Exception as exc:  # noqa: BLE001
+        raise HTTPException(status_code=500, detail="Stored AES key is invalid") from exc
+
+
+def _data_key(uid: str, base_name: str, key_slot: KeySlot) -> bytes:
+    """Return the unwrapped AES key for a file, via the per-worker key cache."""
+
+    try:
+        return data_key_cache.get_or_unwrap(
+            uid,
+            base_name,
+            key_slot.wrapped_key,
+            lambda _: unwrap_key_slot(key_slot, key_manager.private_key(), uid),
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=500, detail="Stored AES key is invalid") from exc
+
+
+def _embedded_key(uid: str, base_name: str) -> KeySlot:
+    """Read back the key slot of a freshly encrypted file and drop stale state.
+
+    Any ``.key`` file left over from the legacy format is removed, and cached
+    keys for the old ciphertext are invalidated.
+    """
+
+    with EncryptedBlob(ENCRYPTED_DIR / f"{base_name}.enc") as blob:
+        key_slot = blob.key_slot
+    (ENCRYPTED_DIR / f"{base_name}.key").unlink(missing_ok=True)
+    data_key_cache.invalidate(uid, base_name)
+    return key_slot
+
+
+def _run_crypto_job(job: Any, *args: Any) -> Any:
+    """Run ``job`` on the crypto executor, mapping saturation to a 503."""
+
+    try:
+        return crypto_executor.run(job, *args)
+    except CryptoQueueFull as exc:
+        raise HTTPException(status_code=503, detail="Crypto workers are busy, retry shortly") from exc
+
+
+def _batch_file_names(body: Dict[str, Any]) -> list[str]:
+    names = body.get("file_names") or body.get("filenames")
+    if not isinstance(names, list) or not names:
+        raise HTTPException(status_code=400, detail="file_names must be a non-empty list")
+    if len(names) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum allowed files per batch is {MAX_BATCH_FILES}.",
+        )
+    if not all(isinstance(name, str) and name.strip() for name in names):
+        raise HTTPException(status_code=400, detail="file_names must contain non-empty strings")
+    return list(dict.fromkeys(names))
+
+
+def _batch_names(
+    request_names: list[str],
+    results: Dict[str, Dict[str, Any]],
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Sanitize the names of a batch, recording invalid ones in ``results``.
+
+    Returns ``(names, aliases)`` where ``names`` maps request names to file
+    names; names that sanitize to a file already in the batch are returned as
+    aliases of the first such name so each file is processed once.
+    """
+
+    names: Dict[str, str] = {}
+    aliases: Dict[str, str] = {}
+    primaries: Dict[str, str] = {}
+    for request_name in request_names:
+        try:
+            safe_name = sanitize_filename(request_name)
+        except HTTPException as exc:
+            results[request_name] = _batch_error(request_name, exc.status_code, exc.detail)
+            continue
+        if safe_name in primaries:
+            aliases[request_name] = primaries[safe_name]
+            continue
+        primaries[safe_name] = request_name
+        names[request_name] = safe_name
+    return names, aliases
+
+
+def _batch_error(file_name: str, status_code: int, detail: str) -> Dict[str, Any]:
+    return {"file_name": file_name, "status": "error", "status_code": status_code, "detail": detail}
+
+
+def _ensure_new_upload(safe_name: str, detail: str) -> None:
+    if (UPLOADS_DIR / safe_name).exists() or (ENCRYPTED_DIR / f"{safe_name}.enc").exists():
+        raise HTTPException(status_code=409, detail=detail)
+
+
+async def _store_upload(upload: UploadFile, safe_name: str) -> int:
+    """Write an upload to ``UPLOADS_DIR`` as plaintext; returns its size."""
+
+    destination = UPLOADS_DIR / safe_name
+    with destination.open("wb") as buffer:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer.write(chunk)
+    return destination.stat().st_size
+
+
+async def _store_upload_encrypted(
+    uid: str,
+    upload: UploadFile,
+    safe_name: str,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Encrypt an upload chunk by chunk straight into ``ENCRYPTED_DIR``.
+
+    No plaintext touches the disk: each chunk read from the request is sealed
+    into the segmented container as it arrives, with the wrapped key embedded
+    in its header. The codec is chosen from the first chunk. Returns the
+    compression summary and the Firestore key fields.
+    """
+
+    encrypted_path = ENCRYPTED_DIR / f"{safe_name}.enc"
+    # Unique per request: concurrent uploads of one name must not share it.
+    partial_path = encrypted_path.with_name(f"{encrypted_path.name}.{token_hex(8)}.part")
+    aes_key = token_bytes(32)
+    key_slot = await run_in_threadpool(lambda: wrap_key_slot(aes_key, key_manager.public_key(), uid))
+
+    try:
+        with partial_path.open("wb") as sink:
+            chunk = await upload.read(CHUNK_SIZE)
+            writer = SegmentWriter(sink, aes_key, codec=choose_codec(chunk), key_slot=key_slot)
+            while chunk:
+                await run_in_threadpool(writer.write, chunk)
+                chunk = await upload.read(CHUNK_SIZE)
+            await run_in_threadpool(writer.close)
+        partial_path.replace(encrypted_path)
+    except BaseException:
+        partial_path.unlink(missing_ok=True)
+        raise
+
+    (ENCRYPTED_DIR / f"{safe_name}.key").unlink(missing_ok=True)
+    data_key_cache.invalidate(uid, safe_name)
+    summary = writer.summary()
+    compression_stats.record(summary)
+    return summary, key_slot_fields(key_slot)
+
+
+def _upload_result(
+    safe_name: str,
+    size: int,
+    encrypted: bool,
+    compression: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    result = {
+        "file_name": safe_name,
+        "size": size,
+        "stored_filename": safe_name,
+        "size_bytes": size,
+        "directory": "encrypted" if encrypted else "uploads",
+    }
+    if encrypted:
+        result["encrypted_filename"] = f"{safe_name}.enc"
+    if compression is not None:
+        result["compression"] = compression
+    return result
+
+
 def _parse_expiry(expiry_value: Any) -> Any | None:
     if expiry_value is None:
         return None
@@ -82,11 +325,11 @@ def _parse_expiry(expiry_value: Any) -> Any | None:
 
 
 @router.get("/tags")
-def list_tags(_user: UserContext = Depends(get_current_user)):
-    query = firebase_db.collection(TAGS_COLLECTION).stream()
+async def list_tags(_user: UserContext = Depends(get_current_user_async)):
+    docs = await tags_repo.alist()
     items: list[Dict[str, Any]] = []
-    for doc in query:
-        payload = doc.to_dict() or {}
+    for doc in docs:
+        payload = dict(doc.data)
         payload.setdefault("tag_id", doc.id)
         items.append(payload)
     items.sort(key=lambda item: ((item.get("tag_name") or item.get("tag_id") or "").lower()))
@@ -96,35 +339,37 @@ def list_tags(_user: UserContext = Depends(get_current_user)):
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
-    _user: UserContext = Depends(get_current_user),
+    encrypt: bool = Query(False),
+    _user: UserContext = Depends(get_current_user_async),
 ):
-    safe_source_name = sanitize_filename(file.filename or "upload.bin")
-    destination = UPLOADS_DIR / safe_source_name
+    """Store an upload; with ``encrypt=true`` it is encrypted as it streams in."""
 
-    if destination.exists():
-        raise HTTPException(status_code=409, detail="A file with this name already exists.")
+    safe_source_name = sanitize_filename(file.filename or "upload.bin")
+    _ensure_new_upload(safe_source_name, "A file with this name already exists.")
 
-    with destination.open("wb") as buffer:
-        while True:
-            chunk = await file.read(1024 * 1024)
-            if not chunk:
-                break
-            buffer.write(chunk)
+    key_fields: Dict[str, Any] = {"aes_key": None}
+    compression: Dict[str, Any] | None = None
+    if encrypt:
+        compression, key_fields = await _store_upload_encrypted(_user.uid, file, safe_source_name)
+        size = compression["plaintext_size"]
+    else:
+        size = await _store_upload(file, safe_source_name)
 
-    _, doc_ref = _file_doc_ref(_user.uid, safe_source_name)
     record = FileModel(
         uid=_user.uid,
         file_name=safe_source_name,
-        size=destination.stat().st_size,
+        size=size,
         uploaded_at=firestore.SERVER_TIMESTAMP,
         last_opened_at=None,
         tag_id=None,
         expiry_time=None,
         advance_security=False,
-        aes_key=None,
+        aes_key=key_fields["aes_key"],
     )
     # Preserve original Firestore field names (including typos used by frontend/backward-compat)
-    doc_ref.set(
+    await files_repo.aset(
+        _user.uid,
+        safe_source_name,
         {
             "uid": record.uid,
             "file_name": record.file_name,
@@ -134,26 +379,27 @@ async def upload_file(
             "tad_id": None,
             "expiry_time": None,
             "advance_seciroty": False,
-            "aes_key": None,
+            **key_fields,
         },
         merge=True,
     )
 
-    return {
-        "file_name": safe_source_name,
-        "size": destination.stat().st_size,
-        "stored_filename": safe_source_name,
-        "size_bytes": destination.stat().st_size,
-        "directory": "uploads",
-    }
+    return _upload_result(safe_source_name, size, encrypt, compression)
 
 
 @router.post("/upload/multiple")
 async def upload_files_multiple(
     files: list[UploadFile] = File(...),
     metadata: str = Form(...),
-    _user: UserContext = Depends(get_current_user),
+    encrypt: bool = Query(False),
+    _user: UserContext = Depends(get_current_user_async),
 ):
+    """Store several uploads with per-file tag/expiry metadata.
+
+    With ``encrypt=true`` each file is encrypted as it streams in and its
+    wrapped key is saved with the metadata, so no ``/encrypt`` call is needed.
+    """
+
     if not files:
         raise HTTPException(status_code=400, detail="No files provided")
     if len(files) > MAX_UPLOAD_FILES:
@@ -203,43 +449,35 @@ async def upload_files_multiple(
         if expiry_time is None:
             raise HTTPException(status_code=400, detail=f"Missing expiry time for {original_name}.")
 
-        destination = UPLOADS_DIR / safe_source_name
-        if destination.exists():
-            raise HTTPException(
-                status_code=409,
-                detail=f"A file with this name already exists: {safe_source_name}.",
-            )
+        _ensure_new_upload(
+            safe_source_name,
+            f"A file with this name already exists: {safe_source_name}.",
+        )
 
-        with destination.open("wb") as buffer:
-            while True:
-                chunk = await upload.read(1024 * 1024)
-                if not chunk:
-                    break
-                buffer.write(chunk)
+        key_fields: Dict[str, Any] = {"aes_key": None}
+        compression: Dict[str, Any] | None = None
+        if encrypt:
+            compression, key_fields = await _store_upload_encrypted(
+                _user.uid, upload, safe_source_name
+            )
+            size = compression["plaintext_size"]
+        else:
+            size = await _store_upload(upload, safe_source_name)
 
-        _, doc_ref = _file_doc_ref(_user.uid, safe_source_name)
         record = {
             "uid": _user.uid,
             "file_name": safe_source_name,
-            "size": destination.stat().st_size,
+            "size": size,
             "uploaded_at": firestore.SERVER_TIMESTAMP,
             "last_opemed_at": None,
             "tag_id": tag_id.strip(),
             "expiry_time": expiry_time,
             "advance_security": False,
-            "aes_key": None,
+            **key_fields,
         }
-        doc_ref.set(record, merge=True)
+        await files_repo.aset(_user.uid, safe_source_name, record, merge=True)
 
-        results.append(
-            {
-                "file_name": safe_source_name,
-                "size": destination.stat().st_size,
-                "stored_filename": safe_source_name,
-                "size_bytes": destination.stat().st_size,
-                "directory": "uploads",
-            }
-        )
+        results.append(_upload_result(safe_source_name, size, encrypt, compression))
 
     return {"files": results}
 
@@ -249,14 +487,13 @@ def encrypt_endpoint(
     body: Dict[str, Any] = Body(...),
     _user: UserContext = Depends(get_current_user),
 ):
-    ensure_rsa_keys(PUBLIC_KEY_PATH, PRIVATE_KEY_PATH)
     request_name = body.get("file_name") or body.get("filename")
     if not isinstance(request_name, str) or not request_name.strip():
         raise HTTPException(status_code=400, detail="file_name is required")
 
-    source_name, doc_ref = _file_doc_ref(_user.uid, request_name)
+    source_name = sanitize_filename(request_name)
 
-    if not doc_ref.get().exists:
+    if files_repo.get(_user.uid, source_name) is None:
         raise HTTPException(status_code=404, detail="File metadata not found for user")
 
     source_path = UPLOADS_DIR / source_name
@@ -265,41 +502,107 @@ def encrypt_endpoint(
         raise HTTPException(status_code=404, detail="Source file not found in uploads")
 
     encrypted_name = f"{source_name}.enc"
-    encrypted_key_name = f"{source_name}.key"
-
     encrypted_path = ENCRYPTED_DIR / encrypted_name
-    encrypted_key_path = ENCRYPTED_DIR / encrypted_key_name
 
-    encrypt_file(
-        input_path=source_path,
-        output_path=encrypted_path,
-        public_key_path=PUBLIC_KEY_PATH,
-        encrypted_key_path=encrypted_key_path,
-    )
-
-    encrypted_aes_key_b64 = base64.b64encode(encrypted_key_path.read_bytes()).decode("ascii")
+    compression = _run_crypto_job(encrypt_job, str(source_path), str(encrypted_path), _user.uid)
+    compression_stats.record(compression)
 
-    doc_ref.set(
-        {
-            "aes_key": encrypted_aes_key_b64,
-        },
-        merge=True,
-    )
+    key_slot = _embedded_key(_user.uid, source_name)
+    # Kept as a recovery copy; decryption reads the key from the file header.
+    files_repo.set(_user.uid, source_name, key_slot_fields(key_slot), merge=True)
 
     return {
         "encrypted_filename": encrypted_name,
-        "encrypted_key_filename": encrypted_key_name,
+        "key_id": key_slot.key_id,
         "directory": "encrypted",
+        "compression": compression,
     }
 
 
+@router.post("/encrypt/batch")
+def encrypt_batch_endpoint(
+    body: Dict[str, Any] = Body(...),
+    _user: UserContext = Depends(get_current_user),
+):
+    """Encrypt many uploaded files in one request.
+
+    Metadata is fetched with a single ``get_many``, files are encrypted in
+    parallel on the crypto executor, and all ``aes_key`` updates are committed
+    in one ``set_many``. Failures are reported per file and do not affect the
+    rest of the batch.
+
+    ``files`` has one entry per requested name, in request order. Its
+    ``file_name`` is the sanitized name the file is stored under, ok or error;
+    only a name that fails sanitizing is echoed as sent.
+    """
+
+    request_names = _batch_file_names(body)
+    results: Dict[str, Dict[str, Any]] = {}
+    names, aliases = _batch_names(request_names, results)
+    existing = files_repo.get_many(_user.uid, names.values())
+
+    jobs: Dict[str, Any] = {}
+    for request_name, source_name in names.items():
+        if source_name not in existing:
+            results[request_name] = _batch_error(source_name, 404, "File metadata not found for user")
+            continue
+        source_path = UPLOADS_DIR / source_name
+        if not source_path.exists():
+            results[request_name] = _batch_error(source_name, 404, "Source file not found in uploads")
+            continue
+        try:
+            jobs[request_name] = crypto_executor.submit(
+                encrypt_job,
+                str(source_path),
+                str(ENCRYPTED_DIR / f"{source_name}.enc"),
+                _user.uid,
+            )
+        except CryptoQueueFull:
+            results[request_name] = _batch_error(source_name, 503, "Crypto workers are busy, retry shortly")
+
+    updates: Dict[str, Dict[str, Any]] = {}
+    written: list[str] = []
+    for request_name, job in jobs.items():
+        source_name = names[request_name]
+        try:
+            compression = job.result()
+        except Exception:  # noqa: BLE001
+            results[request_name] = _batch_error(source_name, 500, "Encryption failed")
+            continue
+
+        compression_stats.record(compression)
+        key_slot = _embedded_key(_user.uid, source_name)
+        updates[source_name] = key_slot_fields(key_slot)
+        written.append(request_name)
+        results[request_name] = {
+            "file_name": source_name,
+            "status": "ok",
+            "encrypted_filename": f"{source_name}.enc",
+            "key_id": key_slot.key_id,
+            "directory": "encrypted",
+            "compression": compression,
+        }
+
+    if written:
+        try:
+            files_repo.set_many(_user.uid, updates)
+        except Exception:  # noqa: BLE001
+            for request_name in written:
+                results[request_name] = _batch_error(
+                    names[request_name], 500, "Failed to store encryption metadata"
+                )
+
+    for alias, primary in aliases.items():
+        results[alias] = results[primary]
+
+    return {"files": [results[name] for name in request_names]}
+
+
 @router.post("/decrypt")
 def decrypt_endpoint(
     body: Dict[str, Any] = Body(...),
     _user: UserContext = Depends(get_current_user),
 ):
-    ensure_rsa_keys(PUBLIC_KEY_PATH, PRIVATE_KEY_PATH)
-
     request_name = body.get("file_name") or body.get("filename")
     if not isinstance(request_name, str) or not request_name.strip():
         raise HTTPException(status_code=400, detail="file_name is required")
@@ -307,40 +610,39 @@ def decrypt_endpoint(
     base_name = sanitize_filename(request_name)
     encrypted_name = f"{base_name}.enc"
 
-    _, doc_ref = _file_doc_ref(_user.uid, base_name)
-    if not doc_ref.get().exists:
+    doc_payload = files_repo.get(_user.uid, base_name)
+    if doc_payload is None:
         raise HTTPException(status_code=404, detail="File metadata not found for user")
 
     encrypted_path = ENCRYPTED_DIR / encrypted_name
-    if not encrypted_path.exists():
-        raise HTTPException(status_code=404, detail="Encrypted file not found")
-
-    encrypted_key_path = ENCRYPTED_DIR / f"{base_name}.key"
-
-    doc_snapshot = doc_ref.get()
-    doc_payload = doc_snapshot.to_dict() or {}
-    stored_aes_key = doc_payload.get("aes_key")
-    if (not encrypted_key_path.exists()) and stored_aes_key:
-        try:
-            encrypted_key_path.write_bytes(base64.b64decode(stored_aes_key))
-        except Exception as exc:  # noqa: BLE001
-            raise HTTPException(status_code=500, detail="Stored AES key is invalid") from exc
 
-    if not encrypted_key_path.exists():
-        raise HTTPException(status_code=404, detail="Encrypted AES key not found")
+    with _open_blob(base_name) as blob:
+        key_slot = _file_key_slot(_user.uid, base_name, blob, doc_payload)
+        embedded = blob.key_slot is not None
 
     output_name = base_name
 
     output_path = DECRYPTED_DIR / output_name
 
-    decrypt_file(
-        encrypted_file_path=encrypted_path,
-        encrypted_key_path=encrypted_key_path,
-        output_path=output_path,
-        private_key_path=PRIVATE_KEY_PATH,
-    )
-
-    doc_ref.set(
+    aes_key = data_key_cache.get(_user.uid, base_name, key_slot.wrapped_key)
+    if aes_key is None and not embedded:
+        # Workers only see the file itself; unwrap legacy sidecar keys here.
+        aes_key = _data_key(_user.uid, base_name, key_slot)
+    try:
+        aes_key = _run_crypto_job(
+            decrypt_job, str(encrypted_path), str(output_path), aes_key, None, _user.uid
+        )
+    except ContainerError as exc:
+        output_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail="Encrypted file failed integrity check") from exc
+    except ValueError as exc:
+        output_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail="Stored AES key is invalid") from exc
+    data_key_cache.put(_user.uid, base_name, key_slot.wrapped_key, aes_key)
+
+    files_repo.set(
+        _user.uid,
+        base_name,
         {
             "last_opemed_at": firestore.SERVER_TIMESTAMP,
         },
@@ -350,24 +652,256 @@ def decrypt_endpoint(
     return {"decrypted_filename": output_name, "directory": "decrypted"}
 
 
-@router.get("/files")
-def list_files(_user: UserContext = Depends(get_current_user)):
-    query = (
-        firebase_db.collection(FILES_COLLECTION)
-        .where("uid", "==", _user.uid)
-        .stream()
+@router.post("/decrypt/batch")
+def decrypt_batch_endpoint(
+    body: Dict[str, Any] = Body(...),
+    _user: UserContext = Depends(get_current_user),
+):
+    """Open many files (e.g. a whole tag folder) in one request.
+
+    Metadata is fetched with one ``get_many`` and every data key is unwrapped in
+    a single pass with the cached private key, priming the data-key cache.
+    With ``mode="stream"`` (default) each result carries a ``stream_url`` for
+    ``/download/decrypted/{name}?stream=true``; with ``mode="disk"`` the files
+    are decrypted into ``DECRYPTED_DIR`` in parallel on the crypto executor.
+    ``last_opemed_at`` is bumped for all opened files in one batched write.
+
+    ``files`` is ordered and named as in ``/encrypt/batch``: one entry per
+    requested name, with ``file_name`` the sanitized name.
+    """
+
+    mode = body.get("mode") or "stream"
+    if mode not in ("stream", "disk"):
+        raise HTTPException(status_code=400, detail="mode must be 'stream' or 'disk'")
+
+    request_names = _batch_file_names(body)
+    results: Dict[str, Dict[str, Any]] = {}
+    names, aliases = _batch_names(request_names, results)
+    records = files_repo.get_many(_user.uid, names.values())
+
+    private_key = None
+    # request name -> (encrypted path, AES key, plaintext size), from one open per file.
+    opened: Dict[str, Tuple[Path, bytes, int | None]] = {}
+    for request_name, base_name in names.items():
+        record = records.get(base_name)
+        if record is None:
+            results[request_name] = _batch_error(base_name, 404, "File metadata not found for user")
+            continue
+        encrypted_path = ENCRYPTED_DIR / f"{base_name}.enc"
+        try:
+            with EncryptedBlob(encrypted_path) as blob:
+                key_slot = _file_key_slot(_user.uid, base_name, blob, record)
+                size = blob.plaintext_size
+        except FileNotFoundError:
+            results[request_name] = _batch_error(base_name, 404, "Encrypted file not found")
+            continue
+        except ContainerError:
+            results[request_name] = _batch_error(base_name, 500, "Encrypted file failed integrity check")
+            continue
+        except HTTPException as exc:
+            results[request_name] = _batch_error(base_name, exc.status_code, exc.detail)
+            continue
+
+        aes_key = data_key_cache.get(_user.uid, base_name, key_slot.wrapped_key)
+        if aes_key is None:
+            if private_key is None:
+                private_key = key_manager.private_key()
+            try:
+                aes_key = unwrap_key_slot(key_slot, private_key, _user.uid)
+            except ValueError:
+                results[request_name] = _batch_error(base_name, 500, "Stored AES key is invalid")
+                continue
+            data_key_cache.put(_user.uid, base_name, key_slot.wrapped_key, aes_key)
+        opened[request_name] = (encrypted_path, aes_key, size)
+
+    jobs: Dict[str, Any] = {}
+    if mode == "disk":
+        for request_name, (encrypted_path, aes_key, _) in opened.items():
+            base_name = names[request_name]
+            try:
+                jobs[request_name] = crypto_executor.submit(
+                    decrypt_job,
+                    str(encrypted_path),
+                    str(DECRYPTED_DIR / base_name),
+                    aes_key,
+                )
+            except CryptoQueueFull:
+                results[request_name] = _batch_error(base_name, 503, "Crypto workers are busy, retry shortly")
+
+    opened_updates: Dict[str, Dict[str, Any]] = {}
+    for request_name, (_, _, size) in opened.items():
+        base_name = names[request_name]
+        if mode == "disk":
+            if request_name not in jobs:
+                continue
+            try:
+                jobs[request_name].result()
+            except Exception:  # noqa: BLE001
+                (DECRYPTED_DIR / base_name).unlink(missing_ok=True)
+                results[request_name] = _batch_error(base_name, 500, "Decryption failed")
+                continue
+            results[request_name] = {
+                "file_name": base_name,
+                "status": "ok",
+                "decrypted_filename": base_name,
+                "directory": "decrypted",
+            }
+        else:
+            results[request_name] = {
+                "file_name": base_name,
+                "status": "ok",
+                "stream_url": f"/download/decrypted/{base_name}?stream=true",
+                "size": size,
+            }
+
+        opened_updates[base_name] = {"last_opemed_at": firestore.SERVER_TIMESTAMP}
+
+    if opened_updates:
+        files_repo.set_many(_user.uid, opened_updates)
+
+    for alias, primary in aliases.items():
+        results[alias] = results[primary]
+
+    return {"files": [results[name] for name in request_names]}
+
+
+def _list_fields(fields: str | None) -> Tuple[str, ...]:
+    if fields is None:
+        return LISTED_FILE_FIELDS
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in LISTED_FILE_FIELDS]
+    if not names or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"fields must be a comma-separated subset of {', '.join(LISTED_FILE_FIELDS)}",
+        )
+    return names
+
+
+def _list_query(
+    uid: str,
+    limit: int | None,
+    cursor: str | None,
+    order_by: str | None,
+    direction: str | None,
+    tag_id: str | None,
+    expires_after: datetime | None,
+    expires_before: datetime | None,
+    min_size: int | None,
+    max_size: int | None,
+    fields: str | None,
+) -> FileQuery:
+    range_fields = set()
+    if expires_after is not None or expires_before is not None:
+        range_fields.add("expiry_time")
+    if min_size is not None or max_size is not None:
+        range_fields.add("size")
+    if len(range_fields) > 1:
+        raise HTTPException(status_code=400, detail="Filter by either an expiry range or a size range, not both")
+    range_field = next(iter(range_fields), None)
+    if order_by is None:
+        order_by = range_field or "file_name"
+    if order_by not in LIST_ORDER_FIELDS:
+        raise HTTPException(status_code=400, detail=f"order_by must be one of {', '.join(LIST_ORDER_FIELDS)}")
+    if range_field is not None and range_field != order_by:
+        raise HTTPException(status_code=400, detail=f"A {range_field} range requires order_by={range_field}")
+    if direction not in (None, "asc", "desc"):
+        raise HTTPException(status_code=400, detail="direction must be asc or desc")
+    descending = direction == "desc"
+
+    after = None
+    if cursor is not None:
+        try:
+            cursor_order, cursor_descending, value, doc_id = decode_cursor(cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail="cursor is not valid") from exc
+        if (cursor_order, cursor_descending) != (order_by, descending):
+            raise HTTPException(status_code=400, detail="cursor belongs to a listing with a different order")
+        after = (value, doc_id)
+
+    return FileQuery(
+        uid=uid,
+        order_by=order_by,
+        descending=descending,
+        limit=(limit or DEFAULT_LIST_PAGE_SIZE) + 1,
+        after=after,
+        tag_id=tag_id,
+        expires_after=expires_after,
+        expires_before=expires_before,
+        min_size=min_size,
+        max_size=max_size,
+        fields=_list_fields(fields),
     )
-    items = [_serialize_file_doc(doc) for doc in query]
-    items.sort(key=lambda item: ((item.get("file_name") or item.get("filename") or "").lower()))
-    return {"files": items}
+
+
+@router.get("/files")
+async def list_files(
+    limit: int | None = Query(None, ge=1, le=MAX_LIST_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    order_by: str | None = Query(None),
+    direction: str | None = Query(None),
+    tag_id: str | None = Query(None),
+    expires_after: datetime | None = Query(None),
+    expires_before: datetime | None = Query(None),
+    min_size: int | None = Query(None, ge=0),
+    max_size: int | None = Query(None, ge=0),
+    fields: str | None = Query(None),
+    _user: UserContext = Depends(get_current_user_async),
+):
+    """List the caller's files.
+
+    Without query parameters every record is returned, sorted by name
+    case-insensitively (the original response). Any parameter switches to a
+    page of at most ``limit`` records ordered in storage by ``order_by``
+    (``file_name`` by default, byte-wise) and ``direction`` (``asc`` by
+    default), optionally filtered by ``tag_id`` and one range:
+    ``expires_after``/``expires_before`` (with ``order_by=expiry_time``) or
+    ``min_size``/``max_size`` (with ``order_by=size``). Pages carry only
+    ``LISTED_FILE_FIELDS``, or the comma-separated ``fields``, plus ``id``.
+    Pass ``next_cursor`` back as ``cursor`` with the same order to get the next
+    page; it is ``None`` on the last one.
+    """
+
+    options = (limit, cursor, order_by, direction, tag_id, expires_after, expires_before, min_size, max_size, fields)
+    if all(option is None for option in options):
+        docs = await files_repo.alist(_user.uid)
+        items = [_serialize_file_doc(doc) for doc in docs]
+        items.sort(key=lambda item: ((item.get("file_name") or item.get("filename") or "").lower()))
+        return {"files": items}
+
+    query = _list_query(_user.uid, *options)
+    docs = await files_repo.aquery(query)
+    page_size = query.limit - 1
+    next_cursor = None
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        next_cursor = encode_cursor(query.order_by, query.descending, docs[-1])
+    fields_requested = set(query.fields)
+    items = []
+    for doc in docs:
+        # The order field is always fetched so the cursor can be built from it.
+        data = {name: value for name, value in doc.data.items() if name in fields_requested}
+        items.append(_serialize_file_doc(Document(doc.id, data)))
+    return {"files": items, "next_cursor": next_cursor}
 
 
 @router.get("/download/{category}/{filename}")
 def download_file(
     category: str,
     filename: str,
+    request: Request,
+    stream: bool = Query(False),
     _user: UserContext = Depends(get_current_user),
 ):
+    """Return a stored file.
+
+    With ``stream=true`` on the ``decrypted`` category the plaintext is decrypted
+    chunk by chunk from ``ENCRYPTED_DIR`` straight into the response, so no
+    prior ``/decrypt`` call is needed and nothing is written to ``DECRYPTED_DIR``.
+    Stream mode honours ``Range``/``If-Range`` for segmented containers and
+    decrypts only the segments covering the requested bytes.
+    """
+
     directories = {
         "uploads": UPLOADS_DIR,
         "encrypted": ENCRYPTED_DIR,
@@ -385,12 +919,10 @@ def download_file(
     elif category == "decrypted":
         base_name = sanitize_filename(Path(safe_name).name)
 
-    _, doc_ref = _file_doc_ref(_user.uid, base_name)
-    doc_snapshot = doc_ref.get()
-    if not doc_snapshot.exists:
+    doc = files_repo.get(_user.uid, base_name)
+    if doc is None:
         raise HTTPException(status_code=404, detail="File metadata not found for user")
 
-    doc = doc_snapshot.to_dict() or {}
     owned_name = doc.get("file_name") or doc.get("filename")
     expected_name = {
         "uploads": owned_name,
@@ -401,9 +933,112 @@ def download_file(
     if expected_name != safe_name:
         raise HTTPException(status_code=403, detail="Access denied for requested file")
 
+    if stream and category == "decrypted":
+        return _stream_decrypted(_user.uid, safe_name, doc, request)
+
     file_path = directories[category] / safe_name
 
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
 
     return FileResponse(path=file_path, filename=file_path.name)
+
+
+def _parse_range_header(range_header: str, size: int) -> Tuple[int, int] | None:
+    """Parse a single ``bytes=`` range into a half-open ``(start, end)`` span.
+
+    Returns ``None`` for headers we choose to ignore (other units, multiple
+    ranges, malformed values), in which case the full body is served.
+    Raises 416 for well-formed ranges that cannot be satisfied.
+    """
+
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(size - suffix, 0), size
+        else:
+            start = int(first)
+            end = int(last) + 1 if last else max(size, start + 1)
+            if start < 0 or end <= start:
+                return None
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, min(end, size)
+
+
+def _stream_decrypted(
+    uid: str,
+    base_name: str,
+    doc_payload: Dict[str, Any],
+    request: Request,
+) -> StreamingResponse:
+    media_type = mimetypes.guess_type(base_name)[0] or "application/octet-stream"
+    headers = {"Content-Disposition": f'attachment; filename="{base_name}"'}
+
+    # One open serves the key, the size and the body; the streaming generators
+    # close the handle when they finish.
+    blob = _open_blob(base_name)
+    try:
+        aes_key = _data_key(uid, base_name, _file_key_slot(uid, base_name, blob, doc_payload))
+        try:
+            plaintext_size = blob.plaintext_size
+        except ContainerError as exc:
+            raise HTTPException(status_code=500, detail="Encrypted file failed integrity check") from exc
+
+        span: Tuple[int, int] | None = None
+        if plaintext_size is None:
+            # Legacy CBC blobs and compressed containers have no random access;
+            # always stream the whole file.
+            chunks = blob.iter_chunks(aes_key)
+        else:
+            stat = blob.stat()
+            etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            last_modified = formatdate(stat.st_mtime, usegmt=True)
+            headers.update({"Accept-Ranges": "bytes", "ETag": etag, "Last-Modified": last_modified})
+
+            range_header = request.headers.get("range")
+            if_range = request.headers.get("if-range")
+            if range_header and (if_range is None or if_range.strip() in (etag, last_modified)):
+                span = _parse_range_header(range_header, plaintext_size)
+
+            start, end = span or (0, plaintext_size)
+            headers["Content-Length"] = str(end - start)
+            if span is not None:
+                headers["Content-Range"] = f"bytes {start}-{end - 1}/{plaintext_size}"
+
+            chunks = blob.iter_range(aes_key, start, end)
+    except BaseException:
+        blob.close()
+        raise
+
+    # Seeking players issue many range requests; only count the initial open.
+    if span is None or span[0] == 0:
+        files_repo.set(
+            uid,
+            base_name,
+            {
+                "last_opemed_at": firestore.SERVER_TIMESTAMP,
+            },
+            merge=True,
+        )
+
+    return StreamingResponse(
+        chunks,
+        status_code=206 if span is not None else 200,
+        media_type=media_type,
+        headers=headers,
+    )
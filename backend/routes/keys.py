@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from core.crypto import key_manager
+from core.keywatch import key_watcher
+from core.security import UserContext, get_current_user_async, get_operator
+
+
+router = APIRouter(prefix="/keys", tags=["keys"])
+
+
+@router.get("/status")
+async def key_status(_user: UserContext = Depends(get_current_user_async)) -> Dict[str, Any]:
+    """Whether the key material is loaded and usable (details are for operators)."""
+
+    return {"ready": key_watcher.ready}
+
+
+@router.post("/reload")
+def reload_keys(_user: UserContext = Depends(get_operator)) -> Dict[str, Any]:
+    """Re-check the key files now instead of waiting for the watcher.
+
+    Only files whose inode, mtime or size changed are re-read. Restricted to
+    ``OPERATOR_UIDS``.
+    """
+
+    reloaded = key_watcher.check()
+    if not key_watcher.ready:
+        raise HTTPException(status_code=500, detail=f"Key reload failed: {key_watcher.last_error}")
+    return {"reloaded": reloaded, "rsa_key_id": key_manager.key_id(), **key_watcher.stats()}
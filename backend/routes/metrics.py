@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends
+
+from core.ciphers import cipher_preference
+from core.constants import METADATA_BACKEND
+from core.compression import compression_stats
+from core.crypto import data_key_cache
+from core.executor import crypto_executor
+from core.security import get_operator, profile_sync, token_cache
+from core.sessions import session_tokens
+from repositories import CachedFileRepository, files_repo
+
+
+# Internal counters (cache hit rates, executor queue, cipher benchmark, key
+# ids): operators only, see ``OPERATOR_UIDS``.
+router = APIRouter(prefix="/metrics", tags=["metrics"], dependencies=[Depends(get_operator)])
+
+
+@router.get("/crypto")
+def crypto_metrics():
+    return {
+        "data_key_cache": data_key_cache.stats(),
+        "executor": crypto_executor.stats(),
+        "compression": compression_stats.stats(),
+        "cipher": cipher_preference.stats(),
+    }
+
+
+@router.get("/auth")
+def auth_metrics():
+    return {
+        "token_cache": token_cache.stats(),
+        "profile_sync": profile_sync.stats(),
+        "sessions": session_tokens.stats(),
+    }
+
+
+@router.get("/metadata")
+def metadata_metrics():
+    return {
+        "backend": METADATA_BACKEND,
+        "file_cache": files_repo.stats() if isinstance(files_repo, CachedFileRepository) else None,
+    }
@@ -0,0 +1,76 @@
+"""Shared test setup.
+
+The app reads its configuration at import time, so it is set here before any
+app module is imported: metadata goes to SQLite (tests point the repositories
+at a temporary database) and ``firebase_admin`` is initialized with a
+throwaway service account, whose clients are created but never called.
+"""
+
+from __future__ import annotations
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("METADATA_BACKEND", "sqlite")
+os.environ.setdefault("METADATA_CACHE_SIZE", "0")
+os.environ.setdefault("CRYPTO_CIPHER", "aes-256-gcm")
+os.environ.setdefault("CRYPTO_EXECUTOR", "thread")
+
+
+def _init_firebase() -> None:
+    import firebase_admin
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from firebase_admin import credentials
+
+    if firebase_admin._apps:
+        return
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode("ascii")
+    firebase_admin.initialize_app(
+        credentials.Certificate(
+            {
+                "type": "service_account",
+                "project_id": "cipherai-tests",
+                "private_key_id": "tests",
+                "private_key": pem,
+                "client_email": "tests@cipherai-tests.iam.gserviceaccount.com",
+                "client_id": "1",
+                "token_uri": "https://oauth2.googleapis.com/token",
+            }
+        )
+    )
+
+
+_init_firebase()
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """The files router as ``alice``, with its metadata in a temporary SQLite
+    database and encrypted files in ``tmp_path``."""
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from core.security import UserContext, get_current_user, get_current_user_async
+    from repositories.sqlite import SQLiteFileRepository, SQLiteMetadataStore
+    from routes import files
+
+    repo = SQLiteFileRepository(SQLiteMetadataStore(tmp_path / "metadata.sqlite3"))
+    monkeypatch.setattr(files, "files_repo", repo)
+    monkeypatch.setattr(files, "ENCRYPTED_DIR", tmp_path)
+
+    user = UserContext(uid="alice", email="alice@example.com")
+    app = FastAPI()
+    app.include_router(files.router)
+    app.dependency_overrides[get_current_user] = lambda: user
+    app.dependency_overrides[get_current_user_async] = lambda: user
+    with TestClient(app) as client:
+        yield SimpleNamespace(client=client, repo=repo, directory=tmp_path, uid=user.uid)
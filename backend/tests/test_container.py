@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import io
+import os
+
+import pytest
+
+from core.ciphers import CIPHER_AES_256_GCM, CIPHER_CHACHA20_POLY1305
+from core.compression import CODEC_ZLIB
+from core.container import (
+    TAG_SIZE,
+    WRAP_AES_KW_HKDF,
+    ContainerError,
+    KeySlot,
+    SegmentReader,
+    SegmentWriter,
+    read_header,
+)
+
+SEGMENT = 256
+KEY = bytes(range(32))
+
+
+def seal(data: bytes, segment_size: int = SEGMENT, chunk: int = 100, **options) -> bytes:
+    sink = io.BytesIO()
+    writer = SegmentWriter(sink, KEY, segment_size=segment_size, **options)
+    for offset in range(0, len(data), chunk):
+        writer.write(data[offset:offset + chunk])
+    writer.close()
+    return sink.getvalue()
+
+
+def open_all(container: bytes, key: bytes = KEY) -> bytes:
+    return b"".join(SegmentReader(io.BytesIO(container), key).iter_all())
+
+
+def segment_offsets(container: bytes) -> list[int]:
+    header = read_header(io.BytesIO(container))
+    stride = SEGMENT + TAG_SIZE
+    return list(range(header.data_offset, len(container), stride))
+
+
+@pytest.mark.parametrize("size", [0, 1, SEGMENT - 1, SEGMENT, SEGMENT + 1, 5 * SEGMENT, 5 * SEGMENT + 17])
+@pytest.mark.parametrize("cipher_id", [CIPHER_AES_256_GCM, CIPHER_CHACHA20_POLY1305])
+def test_round_trip(size, cipher_id):
+    data = os.urandom(size)
+    container = seal(data, cipher_id=cipher_id)
+
+    reader = SegmentReader(io.BytesIO(container), KEY)
+    assert reader.plaintext_size == size
+    assert reader.segment_count == max(1, -(-size // SEGMENT))
+    assert open_all(container) == data
+
+
+def test_round_trip_compressed_and_key_slot():
+    data = b"compressible " * 2000
+    slot = KeySlot(WRAP_AES_KW_HKDF, "master-1", os.urandom(40))
+    container = seal(data, codec=CODEC_ZLIB, key_slot=slot)
+
+    assert len(container) < len(data)
+    assert read_header(io.BytesIO(container)).key_slot == slot
+    reader = SegmentReader(io.BytesIO(container), KEY)
+    assert not reader.random_access
+    with pytest.raises(ContainerError):
+        reader.plaintext_size
+    assert open_all(container) == data
+
+
+def test_iter_range_decrypts_only_covering_segments():
+    data = os.urandom(10 * SEGMENT)
+    reader = SegmentReader(io.BytesIO(seal(data)), KEY)
+
+    for start, end in [(0, 1), (SEGMENT - 1, SEGMENT + 1), (3 * SEGMENT, 4 * SEGMENT), (700, 2000), (2500, None)]:
+        assert b"".join(reader.iter_range(start, end)) == data[start:end]
+    assert b"".join(reader.iter_range(len(data), None)) == b""
+
+
+def test_wrong_key_fails():
+    with pytest.raises(ContainerError):
+        open_all(seal(b"secret" * 100), key=bytes(32))
+
+
+def test_tampered_segment_fails():
+    container = bytearray(seal(os.urandom(4 * SEGMENT)))
+    offsets = segment_offsets(bytes(container))
+    container[offsets[2] + 5] ^= 0x01
+
+    reader = SegmentReader(io.BytesIO(bytes(container)), KEY)
+    assert reader.read_segment(1)
+    with pytest.raises(ContainerError, match="Segment 2"):
+        reader.read_segment(2)
+    with pytest.raises(ContainerError):
+        open_all(bytes(container))
+
+
+def test_tampered_header_fails_every_segment():
+    container = bytearray(seal(os.urandom(2 * SEGMENT)))
+    # The nonce prefix is part of every segment's associated data.
+    container[12] ^= 0x01
+    with pytest.raises(ContainerError):
+        SegmentReader(io.BytesIO(bytes(container)), KEY).read_segment(0)
+
+
+def test_truncated_container_fails():
+    data = os.urandom(4 * SEGMENT + 10)
+    container = seal(data)
+    offsets = segment_offsets(container)
+
+    # Dropping whole trailing segments leaves a final segment not sealed as last.
+    with pytest.raises(ContainerError):
+        open_all(container[:offsets[-1]])
+    # Cutting into a segment leaves a partial one.
+    with pytest.raises(ContainerError):
+        open_all(container[:-3])
+
+
+def test_reordered_segments_fail():
+    container = seal(os.urandom(4 * SEGMENT))
+    offsets = segment_offsets(container)
+    stride = SEGMENT + TAG_SIZE
+    first = container[offsets[0]:offsets[0] + stride]
+    second = container[offsets[1]:offsets[1] + stride]
+    swapped = container[:offsets[0]] + second + first + container[offsets[2]:]
+
+    assert len(swapped) == len(container)
+    with pytest.raises(ContainerError, match="Segment 0"):
+        open_all(swapped)
+
+
+def test_segment_moved_between_files_fails():
+    one = seal(os.urandom(2 * SEGMENT))
+    other = seal(os.urandom(2 * SEGMENT))
+    offset = segment_offsets(one)[0]
+    stride = SEGMENT + TAG_SIZE
+    spliced = one[:offset] + other[offset:offset + stride] + one[offset + stride:]
+    with pytest.raises(ContainerError):
+        open_all(spliced)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import os
+from email.utils import formatdate
+
+import pytest
+from fastapi import HTTPException
+
+from core.compression import CODEC_ZLIB
+from core.container import WRAP_RSA_OAEP_SHA256, KeySlot, SegmentWriter
+from core.crypto import data_key_cache
+from routes.files import _parse_range_header
+
+SIZE = 10_000
+SEGMENT = 1024
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", (0, 100)),
+        ("bytes=100-100", (100, 101)),
+        ("bytes=9990-20000", (9990, SIZE)),
+        ("bytes=9000-", (9000, SIZE)),
+        ("bytes=0-", (0, SIZE)),
+        ("bytes=-500", (SIZE - 500, SIZE)),
+        ("bytes=-20000", (0, SIZE)),
+        (" BYTES = 5-9", (5, 10)),
+    ],
+)
+def test_parse_range(header, expected):
+    assert _parse_range_header(header, SIZE) == expected
+
+
+@pytest.mark.parametrize(
+    "header",
+    ["items=0-10", "bytes=0-1,5-6", "bytes=abc", "bytes=10-5", "bytes=-0", "bytes=-", "bytes=--5"],
+)
+def test_parse_range_ignores_unsupported(header):
+    assert _parse_range_header(header, SIZE) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=10000-", "bytes=10000-10005", "bytes=50000-"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(HTTPException) as excinfo:
+        _parse_range_header(header, SIZE)
+    assert excinfo.value.status_code == 416
+    assert excinfo.value.headers == {"Content-Range": f"bytes */{SIZE}"}
+
+
+def store(api, name: str, data: bytes, codec: int | None = None) -> None:
+    """Encrypt ``data`` as ``name`` with its data key already in the key cache."""
+
+    aes_key = os.urandom(32)
+    slot = KeySlot(WRAP_RSA_OAEP_SHA256, "tests", os.urandom(256))
+    options = {"codec": codec} if codec is not None else {}
+    with (api.directory / f"{name}.enc").open("wb") as sink:
+        writer = SegmentWriter(sink, aes_key, segment_size=SEGMENT, key_slot=slot, **options)
+        writer.write(data)
+        writer.close()
+    data_key_cache.put(api.uid, name, slot.wrapped_key, aes_key)
+    api.repo.set(api.uid, name, {"uid": api.uid, "file_name": name, "size": len(data)})
+
+
+@pytest.fixture
+def clip(api):
+    data = os.urandom(SIZE)
+    store(api, "clip.bin", data)
+    yield data
+    data_key_cache.invalidate(api.uid, "clip.bin")
+
+
+def download(api, name: str, **headers: str):
+    return api.client.get(f"/download/decrypted/{name}", params={"stream": "true"}, headers=headers)
+
+
+def test_full_download_advertises_ranges(api, clip):
+    response = download(api, "clip.bin")
+    assert response.status_code == 200
+    assert response.content == clip
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == str(SIZE)
+    assert response.headers["etag"]
+    assert "content-range" not in response.headers
+    assert api.repo.get(api.uid, "clip.bin")["last_opemed_at"] is not None
+
+
+@pytest.mark.parametrize(
+    "header, start, end",
+    [
+        ("bytes=100-2999", 100, 3000),
+        ("bytes=-500", SIZE - 500, SIZE),
+        ("bytes=9000-", 9000, SIZE),
+        ("bytes=9990-20000", 9990, SIZE),
+        ("bytes=1024-2047", 1024, 2048),
+    ],
+)
+def test_partial_download(api, clip, header, start, end):
+    response = download(api, "clip.bin", Range=header)
+    assert response.status_code == 206
+    assert response.content == clip[start:end]
+    assert response.headers["content-range"] == f"bytes {start}-{end - 1}/{SIZE}"
+    assert response.headers["content-length"] == str(end - start)
+
+
+def test_unsatisfiable_range(api, clip):
+    response = download(api, "clip.bin", Range="bytes=10000-")
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{SIZE}"
+
+
+def test_unsupported_range_serves_whole_file(api, clip):
+    response = download(api, "clip.bin", Range="bytes=0-1,5-6")
+    assert response.status_code == 200
+    assert response.content == clip
+
+
+def test_if_range(api, clip):
+    etag = download(api, "clip.bin").headers["etag"]
+    stat = (api.directory / "clip.bin.enc").stat()
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+    matching = download(api, "clip.bin", Range="bytes=0-9", **{"If-Range": etag})
+    assert matching.status_code == 206
+    assert matching.content == clip[:10]
+
+    by_date = download(api, "clip.bin", Range="bytes=0-9", **{"If-Range": last_modified})
+    assert by_date.status_code == 206
+
+    stale = download(api, "clip.bin", Range="bytes=0-9", **{"If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == clip
+
+
+def test_compressed_container_ignores_range(api):
+    data = b"highly compressible text\n" * 2000
+    store(api, "notes.txt", data, codec=CODEC_ZLIB)
+    try:
+        response = download(api, "notes.txt", Range="bytes=0-9")
+        assert response.status_code == 200
+        assert response.content == data
+        assert "accept-ranges" not in response.headers
+        assert "content-range" not in response.headers
+    finally:
+        data_key_cache.invalidate(api.uid, "notes.txt")
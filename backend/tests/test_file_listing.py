@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from repositories.base import LIST_ORDER_FIELDS, Document, FileQuery, decode_cursor, encode_cursor, file_doc_id
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+DAY = timedelta(days=1)
+
+# Ties on every order field, a null and a missing value, and a name that only
+# sorts first byte-wise ("F" < "a").
+RECORDS = {
+    "a.txt": {"size": 30, "uploaded_at": T0, "expiry_time": T0 + 3 * DAY, "tag_id": "t1"},
+    "b.txt": {"size": 10, "uploaded_at": T0 + DAY, "expiry_time": T0 + DAY, "tag_id": "t2"},
+    "c.txt": {"size": 30, "uploaded_at": T0 + DAY, "expiry_time": None, "tag_id": "t1"},
+    "d.txt": {"size": None, "uploaded_at": T0 + 2 * DAY, "expiry_time": T0 + 2 * DAY},
+    "e.txt": {"uploaded_at": T0 + 3 * DAY, "tag_id": "t1"},
+    "F.txt": {"size": 20, "uploaded_at": T0 + 4 * DAY, "expiry_time": T0 + DAY, "aes_key": "secret"},
+}
+SIZE_CURSOR = encode_cursor("size", False, Document("alice:b.txt", {"size": 10}))
+COMBINATIONS = [(order_by, descending) for order_by in LIST_ORDER_FIELDS for descending in (False, True)]
+
+
+@pytest.fixture
+def repo(api):
+    records = {name: {"uid": api.uid, "file_name": name, **fields} for name, fields in RECORDS.items()}
+    api.repo.set_many(api.uid, records)
+    api.repo.set("bob", "b.txt", {"uid": "bob", "file_name": "b.txt", "size": 1, "uploaded_at": T0})
+    return api.repo
+
+
+def expected_ids(order_by: str, descending: bool, keep=lambda record: True) -> list[str]:
+    """Ids in storage order: records without the field are left out and nulls
+    sort first ascending (last descending), ties broken by id."""
+
+    rows = [
+        (file_doc_id("alice", name), {"file_name": name, **fields})
+        for name, fields in RECORDS.items()
+        if order_by in {"file_name", *fields} and keep(fields)
+    ]
+    rows.sort(key=lambda row: (row[1][order_by] is not None, row[1][order_by] or 0, row[0]))
+    ids = [doc_id for doc_id, _ in rows]
+    return ids[::-1] if descending else ids
+
+
+def pages(repo, query: FileQuery, page_size: int) -> list[list[str]]:
+    result = []
+    after = None
+    while True:
+        docs = repo.query(FileQuery(**{**query.__dict__, "limit": page_size, "after": after}))
+        if docs:
+            result.append([doc.id for doc in docs])
+        if len(docs) < page_size:
+            return result
+        order_by, descending, value, doc_id = decode_cursor(encode_cursor(query.order_by, query.descending, docs[-1]))
+        assert (order_by, descending) == (query.order_by, query.descending)
+        after = (value, doc_id)
+
+
+@pytest.mark.parametrize("order_by, descending", COMBINATIONS)
+def test_query_order(repo, order_by, descending):
+    docs = repo.query(FileQuery(uid="alice", order_by=order_by, descending=descending, limit=100))
+    assert [doc.id for doc in docs] == expected_ids(order_by, descending)
+
+
+@pytest.mark.parametrize("order_by, descending", COMBINATIONS)
+@pytest.mark.parametrize("page_size", [1, 2, 4])
+def test_query_cursor_continuation(repo, order_by, descending, page_size):
+    query = FileQuery(uid="alice", order_by=order_by, descending=descending)
+    result = pages(repo, query, page_size)
+
+    assert [doc_id for page in result for doc_id in page] == expected_ids(order_by, descending)
+    assert all(len(page) == page_size for page in result[:-1])
+
+
+def test_query_tag_and_range_filters(repo):
+    by_tag = repo.query(FileQuery(uid="alice", tag_id="t1", limit=100))
+    assert [doc.id for doc in by_tag] == expected_ids("file_name", False, lambda r: r.get("tag_id") == "t1")
+
+    by_size = repo.query(FileQuery(uid="alice", order_by="size", min_size=15, max_size=30, limit=100))
+    assert [doc.id for doc in by_size] == expected_ids("size", False, lambda r: r.get("size") and 15 <= r["size"] <= 30)
+
+    expiring = FileQuery(
+        uid="alice", order_by="expiry_time", descending=True, expires_after=T0 + DAY, expires_before=T0 + 3 * DAY
+    )
+    in_range = lambda r: r.get("expiry_time") is not None and T0 + DAY <= r["expiry_time"] < T0 + 3 * DAY
+    assert [doc_id for page in pages(repo, expiring, 1) for doc_id in page] == expected_ids(
+        "expiry_time", True, in_range
+    )
+
+
+def test_query_projection_keeps_order_field(repo):
+    docs = repo.query(FileQuery(uid="alice", order_by="size", fields=("file_name",), limit=1))
+    assert docs[0].data == {"file_name": "d.txt", "size": None}
+
+
+def test_list_without_parameters_returns_everything(api, repo):
+    response = api.client.get("/files")
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"files"}
+    assert [item["file_name"] for item in body["files"]] == ["a.txt", "b.txt", "c.txt", "d.txt", "e.txt", "F.txt"]
+
+
+@pytest.mark.parametrize("order_by, descending", COMBINATIONS)
+def test_list_pages(api, repo, order_by, descending):
+    params = {"limit": 2, "order_by": order_by, "direction": "desc" if descending else "asc"}
+    ids = []
+    cursor = None
+    for _ in range(len(RECORDS)):
+        response = api.client.get("/files", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.json()
+        ids.extend(item["id"] for item in body["files"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == expected_ids(order_by, descending)
+
+
+def test_list_page_fields(api, repo):
+    response = api.client.get("/files", params={"limit": 10})
+    assert response.status_code == 200
+    files = response.json()["files"]
+    assert files[0]["file_name"] == "F.txt"
+    assert files[0]["uploaded_at"]
+    assert "aes_key" not in files[0]
+
+    response = api.client.get("/files", params={"order_by": "size", "fields": "file_name"})
+    assert response.json()["files"][0] == {"id": file_doc_id("alice", "d.txt"), "file_name": "d.txt"}
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"cursor": "not-a-cursor"},
+        {"cursor": SIZE_CURSOR, "order_by": "file_name"},
+        {"cursor": SIZE_CURSOR, "order_by": "size", "direction": "desc"},
+        {"order_by": "aes_key"},
+        {"direction": "sideways"},
+        {"fields": "file_name,aes_key"},
+        {"fields": ","},
+        {"min_size": 1, "expires_after": T0.isoformat()},
+        {"min_size": 1, "order_by": "file_name"},
+    ],
+)
+def test_list_rejects_bad_parameters(api, repo, params):
+    assert api.client.get("/files", params=params).status_code == 400
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import io
+import os
+
+import pytest
+
+from core.container import TAG_SIZE, ContainerError, SegmentReader, read_header
+from decrypt_file import decrypt_file
+from encrypt_file import encrypt_stream
+
+SEGMENT = 512
+SEGMENTS = 40
+KEY = os.urandom(32)
+
+
+def encrypt(data: bytes, threads: int) -> bytes:
+    sink = io.BytesIO()
+    encrypt_stream(io.BytesIO(data), sink, KEY, chunk_size=1000, segment_size=SEGMENT, threads=threads, compression="off")
+    return sink.getvalue()
+
+
+def swap_segments(container: bytes, first: int, second: int) -> bytes:
+    header = read_header(io.BytesIO(container))
+    stride = SEGMENT + TAG_SIZE
+    segments = [
+        container[offset:offset + stride]
+        for offset in range(header.data_offset, len(container), stride)
+    ]
+    segments[first], segments[second] = segments[second], segments[first]
+    return container[:header.data_offset] + b"".join(segments)
+
+
+@pytest.mark.parametrize("threads", [2, 4, 8])
+def test_parallel_writer_matches_serial_reader(threads):
+    data = os.urandom(SEGMENTS * SEGMENT + 123)
+    container = encrypt(data, threads)
+
+    reader = SegmentReader(io.BytesIO(container), KEY)
+    assert reader.segment_count == SEGMENTS + 1
+    assert b"".join(reader.iter_all(threads=1)) == data
+
+
+@pytest.mark.parametrize("threads", [2, 4, 8])
+def test_parallel_reader_yields_segments_in_order(threads):
+    data = os.urandom(SEGMENTS * SEGMENT)
+    reader = SegmentReader(io.BytesIO(encrypt(data, 1)), KEY)
+
+    segments = list(reader.iter_segments(0, reader.segment_count - 1, threads=threads))
+    assert segments == [data[i:i + SEGMENT] for i in range(0, len(data), SEGMENT)]
+    assert b"".join(reader.iter_range(1000, 15000, threads=threads)) == data[1000:15000]
+
+
+def test_parallel_reader_rejects_tampered_segment():
+    container = bytearray(encrypt(os.urandom(SEGMENTS * SEGMENT), 4))
+    header = read_header(io.BytesIO(bytes(container)))
+    container[header.data_offset + 25 * (SEGMENT + TAG_SIZE) + 3] ^= 0x80
+
+    reader = SegmentReader(io.BytesIO(bytes(container)), KEY)
+    yielded = []
+    with pytest.raises(ContainerError, match="Segment 25"):
+        for segment in reader.iter_segments(0, reader.segment_count - 1, threads=4):
+            yielded.append(segment)
+    assert len(yielded) == 25
+
+
+def test_parallel_reader_rejects_reordered_segments():
+    container = swap_segments(encrypt(os.urandom(SEGMENTS * SEGMENT), 4), 10, 11)
+    reader = SegmentReader(io.BytesIO(container), KEY)
+    with pytest.raises(ContainerError, match="Segment 10"):
+        b"".join(reader.iter_all(threads=4))
+
+
+def test_decrypt_file_in_parallel(tmp_path):
+    data = os.urandom(SEGMENTS * SEGMENT + 7)
+    encrypted = tmp_path / "data.bin.enc"
+    encrypted.write_bytes(encrypt(data, 4))
+    output = tmp_path / "data.bin"
+
+    decrypt_file(encrypted, None, output, None, aes_key=KEY, threads=4)
+    assert output.read_bytes() == data
+
+
+def test_failed_decrypt_keeps_previous_output(tmp_path):
+    data = os.urandom(SEGMENTS * SEGMENT)
+    encrypted = tmp_path / "data.bin.enc"
+    encrypted.write_bytes(swap_segments(encrypt(data, 4), 30, 31))
+    output = tmp_path / "data.bin"
+    output.write_bytes(b"previous plaintext")
+
+    with pytest.raises(ContainerError):
+        decrypt_file(encrypted, None, output, None, aes_key=KEY, threads=4)
+    assert output.read_bytes() == b"previous plaintext"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["data.bin", "data.bin.enc"]
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from core.sessions import TOKEN_PREFIX, SessionTokens
+
+TTL = 900
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return SessionTokens(path=tmp_path / "session_keys.json", ttl_seconds=TTL, check_interval=0)
+
+
+def claims_of(token: str) -> dict:
+    payload = token[len(TOKEN_PREFIX):].rsplit(".", 1)[0]
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+
+
+def sign(claims: dict, secret: bytes) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+    signing_input = TOKEN_PREFIX + payload
+    signature = hmac.new(secret, signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode()}"
+
+
+def test_issue_and_verify(sessions):
+    token, expires_at = sessions.issue({"uid": "alice", "email": "alice@example.com", "name": None})
+
+    assert sessions.is_session_token(token)
+    claims = sessions.verify(token)
+    assert claims["uid"] == "alice"
+    assert claims["email"] == "alice@example.com"
+    assert "name" not in claims
+    assert claims["exp"] == expires_at
+    assert expires_at - TTL - 1 <= time.time() <= expires_at - TTL + 1
+
+
+def test_session_never_outlives_firebase_token(sessions):
+    firebase_exp = int(time.time()) + 60
+    _, expires_at = sessions.issue({"uid": "alice", "exp": firebase_exp})
+    assert expires_at == firebase_exp
+
+
+def test_expired_token_is_rejected(sessions, monkeypatch):
+    token, expires_at = sessions.issue({"uid": "alice"})
+    monkeypatch.setattr(time, "time", lambda: expires_at + 1)
+    with pytest.raises(ValueError, match="expired"):
+        sessions.verify(token)
+
+
+def test_expired_firebase_token_gives_expired_session(sessions):
+    token, _ = sessions.issue({"uid": "alice", "exp": int(time.time()) - 1})
+    with pytest.raises(ValueError, match="expired"):
+        sessions.verify(token)
+
+
+def test_bad_signature_is_rejected(sessions):
+    token, _ = sessions.issue({"uid": "alice"})
+    forged = sign({**claims_of(token), "uid": "mallory"}, b"not the key")
+    with pytest.raises(ValueError, match="signature"):
+        sessions.verify(forged)
+    assert sessions.stats()["rejected"] == 1
+
+
+def test_unknown_kid_is_rejected(sessions, tmp_path):
+    other = SessionTokens(path=tmp_path / "other_keys.json", ttl_seconds=TTL)
+    token, _ = other.issue({"uid": "alice"})
+    with pytest.raises(ValueError, match="Malformed"):
+        sessions.verify(token)
+
+    own, _ = sessions.issue({"uid": "alice"})
+    with pytest.raises(ValueError, match="Malformed"):
+        sessions.verify(sign({**claims_of(own), "kid": "00000000"}, b"any"))
+
+
+@pytest.mark.parametrize("token", ["cs1.", "cs1.abc", "cs1.e30.AAAA", "not-a-session"])
+def test_malformed_token_is_rejected(sessions, token):
+    with pytest.raises(ValueError):
+        sessions.verify(token)
+
+
+def test_revoke_user_rejects_earlier_sessions_only(sessions):
+    before, _ = sessions.issue({"uid": "alice"})
+    bob, _ = sessions.issue({"uid": "bob"})
+
+    sessions.revoke_user("alice")
+    time.sleep(0.002)
+    # Same-second logout then login works at millisecond precision.
+    after, _ = sessions.issue({"uid": "alice"})
+
+    with pytest.raises(ValueError, match="revoked"):
+        sessions.verify(before)
+    assert sessions.verify(after)["uid"] == "alice"
+    assert sessions.verify(bob)["uid"] == "bob"
+
+
+def test_issue_refuses_firebase_tokens_from_before_revocation(sessions):
+    other_process = SessionTokens(path=sessions.path, ttl_seconds=TTL, check_interval=3600)
+    other_process.check()
+    now = int(time.time())
+
+    sessions.revoke_user("alice")
+    time.sleep(0.002)
+
+    for issuer in (sessions, other_process):
+        for iat in (now - 60, now):
+            with pytest.raises(ValueError, match="revoked"):
+                issuer.issue({"uid": "alice", "iat": iat})
+        token, _ = issuer.issue({"uid": "alice", "iat": now + 1})
+        assert issuer.verify(token)["uid"] == "alice"
+
+
+def test_revoke_single_session(sessions):
+    first, _ = sessions.issue({"uid": "alice"})
+    second, _ = sessions.issue({"uid": "alice"})
+
+    sessions.revoke(first)
+    with pytest.raises(ValueError, match="revoked"):
+        sessions.verify(first)
+    assert sessions.verify(second)["uid"] == "alice"
+
+
+def test_revocations_are_shared_through_the_key_file(sessions):
+    token, _ = sessions.issue({"uid": "alice"})
+    other_process = SessionTokens(path=sessions.path, ttl_seconds=TTL, check_interval=0)
+    assert other_process.verify(token)["uid"] == "alice"
+
+    sessions.revoke_user("alice")
+    with pytest.raises(ValueError, match="revoked"):
+        other_process.verify(token)
+
+
+def test_token_signed_with_rotated_key(sessions):
+    old_token, _ = sessions.issue({"uid": "alice"})
+    old_kid = claims_of(old_token)["kid"]
+
+    new_kid = sessions.rotate()
+    new_token, _ = sessions.issue({"uid": "alice"})
+
+    assert new_kid != old_kid
+    assert claims_of(new_token)["kid"] == new_kid
+    # The retired key stays valid until the sessions signed with it expire.
+    assert sessions.verify(old_token)["kid"] == old_kid
+    assert sessions.verify(new_token)["kid"] == new_kid
+
+
+def test_rotated_key_is_dropped_after_its_sessions_expire(sessions):
+    old_token, _ = sessions.issue({"uid": "alice"})
+    old_kid = claims_of(old_token)["kid"]
+    sessions.rotate()
+
+    def _retire_long_ago(state):
+        state["keys"][old_kid]["retired_at"] = int(time.time()) - TTL - 1
+
+    state = sessions._update(_retire_long_ago)
+    assert old_kid not in state["keys"]
+    with pytest.raises(ValueError, match="Malformed"):
+        sessions.verify(old_token)
+
+
+def test_rotation_is_picked_up_by_other_processes(sessions):
+    other_process = SessionTokens(path=sessions.path, ttl_seconds=TTL, check_interval=3600)
+    other_process.check()
+
+    new_kid = sessions.rotate()
+    token, _ = sessions.issue({"uid": "alice"})
+
+    assert other_process.check() is True
+    assert other_process.verify(token)["kid"] == new_kid
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import time
+
+from core.security import TokenCache
+
+
+def test_revoke_rejects_tokens_from_the_same_second():
+    cache = TokenCache(max_entries=10)
+    now = int(time.time())
+    cache.put("before", {"uid": "alice", "iat": now, "exp": now + 3600})
+
+    cache.revoke("alice")
+
+    assert cache.get("before") is None
+    assert cache._is_revoked({"uid": "alice", "iat": now - 1})
+    assert cache._is_revoked({"uid": "alice", "iat": now})
+    assert not cache._is_revoked({"uid": "alice", "iat": now + 1})
+    assert not cache._is_revoked({"uid": "bob", "iat": now})
+
+
+def test_revoked_tokens_are_not_cached():
+    cache = TokenCache(max_entries=10)
+    cache.revoke("alice")
+    now = int(time.time())
+
+    cache.put("token", {"uid": "alice", "iat": now, "exp": now + 3600})
+    assert cache.get("token") is None
+    cache.put("later", {"uid": "alice", "iat": now + 1, "exp": now + 3600})
+    assert cache.get("later") is not None
@@ -73,21 +73,14 @@ export default function useFiles(idToken) {
       setBusy(true);
       setStatus('Decrypting file...');
       try {
-        const res = await authorizedFetch('/decrypt', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ file_name: displayName }),
-        });
-        if (!res.ok) {
-          throw new Error('Decryption failed.');
-        }
-        const result = await res.json();
-        decryptedNameRef.current = result.decrypted_filename;
-
-        const downloadRes = await authorizedFetch(`/download/decrypted/${result.decrypted_filename}`);
+        // Stream mode decrypts on the server straight into the response body.
+        const downloadRes = await authorizedFetch(
+          `/download/decrypted/${encodeURIComponent(displayName)}?stream=true`,
+        );
         if (!downloadRes.ok) {
-          throw new Error('Unable to load preview.');
+          throw new Error('Decryption failed.');
         }
+        decryptedNameRef.current = displayName;
         const blob = await downloadRes.blob();
         releasePreview();
         const url = URL.createObjectURL(blob);
@@ -105,7 +98,7 @@ export default function useFiles(idToken) {
           }
         }
 
-        return result.decrypted_filename;
+        return displayName;
       } catch (error) {
         setStatus(error.message || 'Unable to open file.');
         throw error;
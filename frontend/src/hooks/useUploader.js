@@ -173,7 +173,7 @@ export default function useUploader({ idToken, fetchFiles, setSelectedFile, setS
 
     setBusy(true);
     setUploadMessage('');
-    setStatus('Uploading files...');
+    setStatus('Uploading and encrypting files...');
     try {
       const formData = new FormData();
       pendingUploads.forEach((item) => {
@@ -186,7 +186,8 @@ export default function useUploader({ idToken, fetchFiles, setSelectedFile, setS
       }));
       formData.append('metadata', JSON.stringify(metadata));
 
-      const uploadRes = await authorizedFetch('/upload/multiple', {
+      // encrypt=true seals each file as it streams in; no plaintext is stored.
+      const uploadRes = await authorizedFetch('/upload/multiple?encrypt=true', {
         method: 'POST',
         body: formData,
       });
@@ -206,21 +207,6 @@ export default function useUploader({ idToken, fetchFiles, setSelectedFile, setS
         throw new Error('Upload response missing files.');
       }
 
-      for (const entry of uploadedFiles) {
-        const uploadedName = entry.file_name || entry.stored_filename;
-        if (!uploadedName) continue;
-        setStatus(`Encrypting ${uploadedName}...`);
-        const encryptRes = await authorizedFetch('/encrypt', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ file_name: uploadedName }),
-        });
-        if (!encryptRes.ok) {
-          throw new Error(`Encryption failed for ${uploadedName}.`);
-        }
-        await encryptRes.json();
-      }
-
       const updated = await fetchFiles();
       if (updated?.files?.length) {
         setSelectedFile(updated.files[0]);